@@ -0,0 +1,141 @@
+"""Awaitable versions of the db.py helpers for the PTB handlers.
+
+sqlite3 is blocking, so every call is shipped to a small dedicated thread
+pool instead of running on the event loop. Handlers `await` these exactly
+like the sync helpers they wrap; the sync versions in db.py stay available
+for code that already runs off-loop (Flask thread, scheduler thread).
+"""
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+from tracing import row_count, tracer
+
+# Keep this below DB_POOL_SIZE so executor threads never queue for a connection.
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "2"))
+
+_executor = ThreadPoolExecutor(
+    max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db-worker")
+
+
+def run_sync(fn, *args, **kwargs):
+    """Run a blocking callable on the DB executor and return an awaitable."""
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+def _offload(fn):
+    name = fn.__name__
+    submit = getattr(fn, "submit", None)
+    if submit is not None:
+        # Mutations go straight to db.py's writer queue; no executor hop.
+        @functools.wraps(fn)
+        async def write(*args, **kwargs):
+            with tracer.span("db", name) as span:
+                result = await asyncio.wrap_future(submit(*args, **kwargs))
+                span.rows = row_count(result)
+            return result
+        return write
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        with tracer.span("db", name) as span:
+            result = await run_sync(fn, *args, **kwargs)
+            span.rows = row_count(result)
+        return result
+    return wrapper
+
+
+def shutdown(wait: bool = True):
+    _executor.shutdown(wait=wait)
+
+
+# ───── Twitter Handle Helpers ────────────────────────────
+
+set_twitter_handle = _offload(db.set_twitter_handle)
+is_user_banned = _offload(db.is_user_banned)
+get_user_active_posts = _offload(db.get_user_active_posts)
+get_user_active_posts_page = _offload(db.get_user_active_posts_page)
+update_last_post_time = _offload(db.update_last_post_time)
+is_in_cooldown = _offload(db.is_in_cooldown)
+get_cooldown_remaining = _offload(db.get_cooldown_remaining)
+get_twitter_handle = _offload(db.get_twitter_handle)
+
+# ───── Users ─────────────────────────────────────────────
+
+add_user = _offload(db.add_user)
+save_tokens = _offload(db.save_tokens)
+get_user = _offload(db.get_user)
+get_user_slots = _offload(db.get_user_slots)
+create_follow_action = _offload(db.create_follow_action)
+confirm_follow_back = _offload(db.confirm_follow_back)
+ignore_follow = _offload(db.ignore_follow)
+get_pending_followers = _offload(db.get_pending_followers)
+add_task_slot = _offload(db.add_task_slot)
+
+# ───── Notification Outbox ───────────────────────────────
+
+enqueue_notification = _offload(db.enqueue_notification)
+claim_notifications = _offload(db.claim_notifications)
+mark_notifications_sent = _offload(db.mark_notifications_sent)
+retry_notification = _offload(db.retry_notification)
+fail_notification = _offload(db.fail_notification)
+prune_outbox = _offload(db.prune_outbox)
+outbox_stats = _offload(db.outbox_stats)
+
+# ───── Raid Completion ──────────────────────────────────
+
+has_completed_post = _offload(db.has_completed_post)
+mark_post_completed = _offload(db.mark_post_completed)
+
+# ───── Posts ─────────────────────────────────────────────
+
+save_post = _offload(db.save_post)
+get_post_link_by_id = _offload(db.get_post_link_by_id)
+get_pending_posts = _offload(db.get_pending_posts)
+get_pending_posts_page = _offload(db.get_pending_posts_page)
+transition_post = _offload(db.transition_post)
+approve_post = _offload(db.approve_post)
+reject_post = _offload(db.reject_post)
+join_follow_pool = _offload(db.join_follow_pool)
+leave_follow_pool = _offload(db.leave_follow_pool)
+is_in_follow_pool = _offload(db.is_in_follow_pool)
+get_follow_suggestions = _offload(db.get_follow_suggestions)
+get_follow_suggestions_page = _offload(db.get_follow_suggestions_page)
+get_follow_graph = _offload(db.get_follow_graph)
+get_follow_cards = _offload(db.get_follow_cards)
+get_recent_approved_posts = _offload(db.get_recent_approved_posts)
+get_active_raids_for_user = _offload(db.get_active_raids_for_user)
+get_active_raids_page = _offload(db.get_active_raids_page)
+get_follow_stats = _offload(db.get_follow_stats)
+count_followers = _offload(db.count_followers)
+count_follow_backs = _offload(db.count_follow_backs)
+get_post_owner_id = _offload(db.get_post_owner_id)
+create_verification = _offload(db.create_verification)
+close_verification = _offload(db.close_verification)
+confirm_raid = _offload(db.confirm_raid)
+reject_raid = _offload(db.reject_raid)
+auto_approve_stale_posts = _offload(db.auto_approve_stale_posts)
+ban_unresponsive_post_owners = _offload(db.ban_unresponsive_post_owners)
+
+# ───── Profile Stats ─────────────────────────────────────
+
+get_user_stats = _offload(db.get_user_stats)
+
+# ───── Expiration ────────────────────────────────────────
+
+expire_old_posts = _offload(db.expire_old_posts)
+expire_posts = _offload(db.expire_posts)
+get_raid_deadlines = _offload(db.get_raid_deadlines)
+update_verification_status = _offload(db.update_verification_status)
+get_expired_unconfirmed_verifications = _offload(
+    db.get_expired_unconfirmed_verifications)
+ban_user_from_posting = _offload(db.ban_user_from_posting)
+get_verifications_for_post = _offload(db.get_verifications_for_post)
+get_verifications_page = _offload(db.get_verifications_page)
+
+# ───── Admin Dashboard ───────────────────────────────────
+
+get_pending_count = _offload(db.get_pending_count)
@@ -4,10 +4,11 @@ import requests
 import secrets
 import base64
 import hashlib
-import sqlite3
 from dotenv import load_dotenv
 from telegram import Bot
 
+from db import save_tokens
+
 
 load_dotenv()
 app = Flask(__name__)
@@ -20,7 +21,6 @@ AUTH_URL = "https://twitter.com/i/oauth2/authorize"
 TOKEN_URL = "https://api.twitter.com/2/oauth2/token"
 SCOPE = "tweet.read tweet.write users.read offline.access like.write"
 CALLBACK_URL = "https://telegram-bot-production-d526.up.railway.app/twitter/callback"
-API_KEY = os.getenv("TELEGRAM_TOKEN")
 
 
 def generate_code_verifier_challenge():
@@ -32,29 +32,6 @@ def generate_code_verifier_challenge():
     return verifier, challenge
 
 
-def save_tokens(telegram_id, handle, twitter_id, access_token, refresh_token):
-    conn = sqlite3.connect("bot_data.db")
-    cur = conn.cursor()
-
-    cur.execute("SELECT 1 FROM users WHERE telegram_id = ?",
-                (str(telegram_id),))
-    exists = cur.fetchone()
-
-    if exists:
-        cur.execute("""
-            UPDATE users SET twitter_handle = ?, twitter_id = ?, access_token = ?, refresh_token = ?, last_updated = CURRENT_TIMESTAMP
-            WHERE telegram_id = ?
-        """, (handle, twitter_id, access_token, refresh_token, str(telegram_id)))
-    else:
-        cur.execute("""
-            INSERT INTO users (telegram_id, twitter_handle, twitter_id, access_token, refresh_token)
-            VALUES (?, ?, ?, ?, ?)
-        """, (str(telegram_id), handle, twitter_id, access_token, refresh_token))
-
-    conn.commit()
-    conn.close()
-
-
 @app.route('/twitter/connect')
 def connect():
     telegram_id = request.args.get("telegram_id")
@@ -123,21 +100,10 @@ def callback():
         if not twitter_handle:
             return "❌ Failed to retrieve user info", 500
 
-        # ✅ Save to DB
+        # ✅ Save to DB (queues the "connected" message in the same commit)
         save_tokens(telegram_id, twitter_handle, twitter_id,
                     access_token, refresh_token)
 
-        try:
-            message = f"✅ Your Twitter account (@{twitter_handle}) has been connected successfully!"
-            telegram_api_url = f"https://api.telegram.org/bot{API_KEY}/sendMessage"
-            payload = {
-                "chat_id": telegram_id,
-                "text": message
-            }
-            requests.post(telegram_api_url, data=payload)
-        except Exception as e:
-            print(f"❌ Failed to send Telegram message: {e}")
-
         return "✅ Twitter connected successfully, you can close this page!"
 
     except Exception as e:
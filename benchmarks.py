@@ -0,0 +1,847 @@
+"""Micro-benchmarks for the bot's database hot paths.
+
+Each benchmark builds a throwaway database in a temp directory, so the real
+bot_data.db is never touched.
+
+    python benchmarks.py              # run everything
+    python benchmarks.py async_db     # run one benchmark by name
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import db
+from migrations import run_migrations
+
+
+def _fresh_database() -> str:
+    """Point db.py at an empty database in a new temp dir and create the schema."""
+    workdir = tempfile.mkdtemp(prefix="bot-bench-")
+    os.chdir(workdir)
+    db.close_writer()
+    db.close_pool()
+    db.DB_FILE = os.path.join(workdir, "bot_data.db")
+    run_migrations()
+    return workdir
+
+
+def _report(title: str, rows: list[tuple[str, str]]):
+    print(f"\n── {title} " + "─" * max(0, 56 - len(title)))
+    width = max(len(label) for label, _ in rows)
+    for label, value in rows:
+        print(f"  {label.ljust(width)}  {value}")
+
+
+# ───── Async DB Facade ───────────────────────────────────
+
+
+def _seed_raids(users: int, raids: int):
+    for uid in range(1, users + 1):
+        db.add_user(uid, f"user{uid}")
+        db.set_twitter_handle(uid, f"handle{uid}")
+    for n in range(raids):
+        db.save_post(1 + n % users, f"https://x.com/u/status/{n}")
+    for post_id, *_ in db.get_pending_posts(limit=raids):
+        db.transition_post(post_id, "pending", "approved")
+
+
+async def _simulated_update(uid: int, post_id: int, dal, api_latency: float):
+    """One 'Done' tap: the DB calls handle_raid_participation makes plus a Bot API round trip."""
+    async def q(name, *args):
+        if dal is None:
+            return getattr(db, name)(*args)
+        return await getattr(dal, name)(*args)
+
+    await q("get_user", uid)
+    await q("has_completed_post", uid, post_id)
+    await q("get_post_link_by_id", post_id)
+    owner = await q("get_post_owner_id", post_id)
+    await q("mark_post_completed", uid, post_id)
+    await q("create_verification", post_id, uid, owner)
+    await q("get_verifications_for_post", post_id)
+    await asyncio.sleep(api_latency)  # send_message to the post owner
+
+
+async def _loop_lag_probe(stop: asyncio.Event, samples: list):
+    interval = 0.005
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - started - interval)
+
+
+async def _run_burst(users: int, raids: int, dal, api_latency: float):
+    stop = asyncio.Event()
+    lag: list[float] = []
+    probe = asyncio.create_task(_loop_lag_probe(stop, lag))
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        _simulated_update(uid, 1 + random.randrange(raids), dal, api_latency)
+        for uid in range(1, users + 1)
+    ))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+    return elapsed, lag
+
+
+def bench_async_db(users: int = 500, raids: int = 50, api_latency: float = 0.05):
+    """500 users tapping "Done" at once: sync helpers on the loop vs the async facade."""
+    import async_db
+
+    results = []
+    for label, dal in (("sync db (before)", None), ("async_db (after)", async_db)):
+        _fresh_database()
+        _seed_raids(users, raids)
+        elapsed, lag = asyncio.run(_run_burst(users, raids, dal, api_latency))
+        lag_ms = sorted(x * 1000 for x in lag) or [0.0]
+        results.append((
+            label,
+            f"{users / elapsed:8.1f} updates/s  "
+            f"loop lag p50 {statistics.median(lag_ms):6.1f} ms  "
+            f"max {lag_ms[-1]:7.1f} ms",
+        ))
+    _report(f"async_db: {users} concurrent users", results)
+
+
+# ───── Group Commit ──────────────────────────────────────
+
+
+def _burst(threads: int, per_thread: int, write):
+    """Run `write(uid, n)` from many threads at once; return (elapsed, read latencies)."""
+    read_latency = []
+    stop = threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            started = time.perf_counter()
+            db.get_recent_approved_posts(with_time=True)
+            read_latency.append(time.perf_counter() - started)
+
+    def writer(uid):
+        for n in range(per_thread):
+            write(uid, n)
+
+    probe = threading.Thread(target=reader)
+    workers = [threading.Thread(target=writer, args=(uid,))
+               for uid in range(1, threads + 1)]
+    probe.start()
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    probe.join()
+    return elapsed, read_latency
+
+
+def bench_group_commit(threads: int = 50, per_thread: int = 40):
+    """Raid burst: `threads` users each marking `per_thread` raids done."""
+    ops = threads * per_thread
+    rows = []
+
+    # Before: rollback journal, one transaction (and fsync) per write.
+    db.DB_PROFILE = "legacy"
+    _fresh_database()
+    _seed_raids(threads, per_thread)
+
+    def commit_per_write(uid, n):
+        with db._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO completions (telegram_id, post_id, created_at) VALUES (?, ?, ?)",
+                (uid, n + 1, db.now_ts()))
+
+    elapsed, reads = _burst(threads, per_thread, commit_per_write)
+    rows.append(("legacy, commit per write",
+                 f"{ops / elapsed:8.0f} writes/s  {ops / elapsed:8.0f} commits/s  "
+                 f"read p99 {_p99_ms(reads):7.1f} ms"))
+
+    # After: WAL + single writer batching queued mutations.
+    db.DB_PROFILE = "default"
+    _fresh_database()
+    _seed_raids(threads, per_thread)
+    before = db.writer_stats()["commits"]
+    elapsed, reads = _burst(
+        threads, per_thread, lambda uid, n: db.mark_post_completed(uid, n + 1))
+    commits = db.writer_stats()["commits"] - before
+    rows.append(("WAL, group commit",
+                 f"{ops / elapsed:8.0f} writes/s  {commits / elapsed:8.0f} commits/s  "
+                 f"read p99 {_p99_ms(reads):7.1f} ms  "
+                 f"(avg batch {ops / max(commits, 1):.1f})"))
+    _report(f"group commit: {threads} threads x {per_thread} writes", rows)
+
+
+def _p99_ms(samples: list[float]) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[int(len(samples) * 0.99) - 1] * 1000
+
+
+# ───── Raid Feed ─────────────────────────────────────────
+
+
+def _seed_bulk_raids(users: int, raids: int, viewer: int, done_every: int = 2):
+    """Insert `raids` approved posts directly; `viewer` has done every Nth one."""
+    now = db.now_ts()
+
+    def seed(conn):
+        conn.executemany(
+            "INSERT INTO users (telegram_id, name, twitter_handle) VALUES (?, ?, ?)",
+            [(uid, f"user{uid}", f"handle{uid}") for uid in range(1, users + 1)])
+        conn.executemany(
+            "INSERT INTO posts (telegram_id, post_link, status, submitted_at, approved_at, expires_at) "
+            "VALUES (?, ?, 'approved', ?, ?, ?)",
+            [(1 + n % users, f"https://x.com/u/status/{n}", now, now, now + db.RAID_DURATION)
+             for n in range(raids)])
+        conn.executemany(
+            "INSERT INTO completions (telegram_id, post_id, created_at) VALUES (?, ?, ?)",
+            [(viewer, post_id, now) for post_id in range(1, raids + 1, done_every)])
+
+    db._write(seed)
+
+
+def _time_it(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def bench_raid_feed(raids: int = 10_000, users: int = 200):
+    """One "🔥 Ongoing Raids" tap over `raids` active raids."""
+    _fresh_database()
+    viewer = 1
+    _seed_bulk_raids(users, raids, viewer)
+
+    def n_plus_one():
+        posts = db.get_recent_approved_posts(with_time=True)
+        return [(p, db.has_completed_post(viewer, p[0])) for p in posts]
+
+    def batched():
+        return db.get_active_raids_for_user(viewer)
+
+    assert sum(done for *_, done in batched()) == sum(done for _, done in n_plus_one())
+    before, after = _time_it(n_plus_one), _time_it(batched)
+    _report(f"raid feed: {raids} active raids", [
+        ("N+1 has_completed_post (before)", f"{before * 1000:8.1f} ms  {raids + 1} queries"),
+        ("get_active_raids_for_user (after)", f"{after * 1000:8.1f} ms  1 query"),
+    ])
+
+
+# ───── Ban Enforcement ───────────────────────────────────
+
+
+def _seed_ban_candidates(users: int, posts: int, per_post: int, pending_every: int):
+    """`posts` expired posts with `per_post` verifications each; every Nth is pending."""
+    long_ago = db.now_ts() - 6 * db.HOUR
+
+    def seed(conn):
+        conn.executemany(
+            "INSERT INTO users (telegram_id, name) VALUES (?, ?)",
+            [(uid, f"user{uid}") for uid in range(1, users + 1)])
+        conn.executemany(
+            "INSERT INTO posts (telegram_id, post_link, status, approved_at, expires_at) "
+            "VALUES (?, ?, 'expired', ?, ?)",
+            [(1 + n % users, f"https://x.com/u/status/{n}", long_ago, long_ago)
+             for n in range(posts)])
+        conn.executemany(
+            "INSERT INTO verifications (post_id, doer_id, owner_id, status) VALUES (?, ?, ?, ?)",
+            ((1 + n // per_post, 1 + n % users, 0,
+              "pending" if n % pending_every == 0 else "confirmed")
+             for n in range(posts * per_post)))
+
+    db._write(seed)
+
+
+def _legacy_ban_unresponsive(conn):
+    """The previous implementation: load every (owner, post) pair, one UPDATE each."""
+    c = conn.cursor()
+    cutoff = db.now_ts() - 4 * db.HOUR
+    rows = c.execute("""
+        SELECT p.telegram_id, p.id
+        FROM posts p
+        WHERE p.status = 'expired'
+        AND p.expires_at <= ?
+        AND EXISTS (
+            SELECT 1 FROM verifications v
+            WHERE v.post_id = p.id
+            AND v.status = 'pending'
+        )
+    """, (cutoff,)).fetchall()
+    for user_id, _post_id in rows:
+        banned_until = db.now_ts() + 48 * db.HOUR
+        c.execute("UPDATE users SET banned_until = ? WHERE telegram_id = ?",
+                  (banned_until, user_id))
+    return len(rows)
+
+
+def _drop_indexes(*names) -> list[str]:
+    """Drop indexes by name; returns their CREATE statements for _restore_indexes."""
+    def drop(conn):
+        marks = ", ".join("?" * len(names))
+        saved = [sql for (sql,) in conn.execute(
+            f"SELECT sql FROM sqlite_master WHERE type = 'index' AND name IN ({marks})", names)]
+        for name in names:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+        return saved
+    return db._write(drop)
+
+
+def _restore_indexes(statements: list[str]):
+    def restore(conn):
+        for sql in statements:
+            conn.execute(sql)
+    db._write(restore)
+
+
+def _reset_bans():
+    db._write(lambda conn: conn.execute(
+        "UPDATE users SET banned_until = NULL, post_ban_until = NULL"))
+
+
+def bench_bans(verifications: int = 1_000_000, per_post: int = 10,
+               users: int = 50_000, pending_every: int = 40):
+    """ban_unresponsive_post_owners over `verifications` rows on expired posts."""
+    posts = verifications // per_post
+    rows = []
+
+    # Legacy without the new indexes: every EXISTS probe scans verifications,
+    # so run it on a 1/100 slice or it would take minutes.
+    small = verifications // 100
+    _fresh_database()
+    _drop_indexes("idx_posts_status_expires", "idx_verifications_post_status")
+    _seed_ban_candidates(users, small // per_post, per_post, pending_every)
+    started = time.perf_counter()
+    banned = db._write(_legacy_ban_unresponsive)
+    rows.append((f"row-by-row, no indexes ({small:,} verifications)",
+                 f"{(time.perf_counter() - started) * 1000:9.1f} ms  {banned} UPDATEs"))
+
+    _fresh_database()
+    _seed_ban_candidates(users, posts, per_post, pending_every)
+    started = time.perf_counter()
+    banned = db._write(_legacy_ban_unresponsive)
+    rows.append((f"row-by-row, indexed ({verifications:,})",
+                 f"{(time.perf_counter() - started) * 1000:9.1f} ms  {banned} UPDATEs"))
+
+    _reset_bans()
+    started = time.perf_counter()
+    banned = db.ban_unresponsive_post_owners()
+    rows.append((f"set-based UPDATE ... RETURNING ({verifications:,})",
+                 f"{(time.perf_counter() - started) * 1000:9.1f} ms  "
+                 f"{len(banned)} users banned + notices queued"))
+    _report(f"bans: {verifications:,} verifications, {posts:,} expired posts", rows)
+
+
+# ───── Follow-for-Follow Suggestions ─────────────────────
+
+
+def _seed_follow_pool(members: int, follows_per_member: int):
+    """`members` pool members; each has followed the next N members in join order."""
+    start = db.now_ts() - 30 * 24 * db.HOUR
+
+    def seed(conn):
+        conn.executemany(
+            "INSERT INTO users (telegram_id, name, twitter_handle) VALUES (?, ?, ?)",
+            [(uid, f"user{uid}", f"handle{uid}") for uid in range(1, members + 1)])
+        conn.executemany(
+            "INSERT INTO follow_pool (telegram_id, twitter_handle, joined_at) VALUES (?, ?, ?)",
+            [(uid, f"handle{uid}", start + uid)
+             for uid in range(1, members + 1)])
+        conn.executemany(
+            "INSERT INTO follow_actions (follower_id, followed_id) VALUES (?, ?)",
+            ((uid, 1 + (uid + k) % members)
+             for uid in range(1, members + 1) for k in range(1, follows_per_member + 1)))
+
+    db._write(seed)
+
+
+def _legacy_follow_suggestions(telegram_id: int):
+    """The previous query: NOT IN anti-join, whole pool, no follow_actions index."""
+    with db._connect() as conn:
+        return conn.execute("""
+            SELECT u.telegram_id, u.name, u.twitter_handle
+            FROM follow_pool p
+            JOIN users u ON p.telegram_id = u.telegram_id
+            WHERE p.telegram_id != ?
+            AND p.telegram_id NOT IN (
+                SELECT followed_id FROM follow_actions WHERE follower_id = ?
+            )
+            ORDER BY p.joined_at
+        """, (telegram_id, telegram_id)).fetchall()
+
+
+def bench_follow_suggestions(sizes=(1_000, 10_000, 100_000), follows_per_member: int = 20):
+    """One F4F tap: the old unbounded list vs one keyset page, as the pool grows."""
+    rows = []
+    viewer = 1
+    for members in sizes:
+        _fresh_database()
+        _seed_follow_pool(members, follows_per_member)
+        dropped = _drop_indexes("idx_follow_actions_pair", "idx_follow_pool_joined")
+        before = _time_it(lambda: _legacy_follow_suggestions(viewer), repeat=3)
+
+        _restore_indexes(dropped)
+        first = db.get_follow_suggestions_page(viewer)
+        middle = db.get_follow_suggestions_page(viewer, after=members // 2)
+        assert len(first.rows) == len(middle.rows) == 8
+        page = _time_it(lambda: db.get_follow_suggestions_page(viewer))
+        deep = _time_it(lambda: db.get_follow_suggestions_page(viewer, after=members // 2))
+        rows.append((f"{members:>7,} members",
+                     f"unbounded NOT IN {before * 1000:8.1f} ms   "
+                     f"page 1 {page * 1000:6.2f} ms   mid-pool page {deep * 1000:6.2f} ms"))
+    _report(f"follow suggestions ({follows_per_member} follows each)", rows)
+
+
+# ───── Profile Stats ─────────────────────────────────────
+
+
+def _seed_profiles(users: int, posts: int, slot_logs: int):
+    rng = random.Random(3)
+    now = db.now_ts()
+
+    def seed(conn):
+        conn.executemany(
+            "INSERT INTO users (telegram_id, name) VALUES (?, ?)",
+            [(uid, f"user{uid}") for uid in range(1, users + 1)])
+        conn.executemany(
+            "INSERT INTO posts (telegram_id, post_link, status) VALUES (?, ?, ?)",
+            [(rng.randint(1, users), f"https://x.com/u/status/{n}",
+              rng.choice(("approved", "rejected", "expired", "pending")))
+             for n in range(posts)])
+        conn.executemany(
+            "INSERT INTO slot_logs (telegram_id, slots, reason, created_at) VALUES (?, ?, ?, ?)",
+            [(rng.randint(1, users), 0.1, rng.choice(("task", "referral", "admin")), now)
+             for _ in range(slot_logs)])
+
+    db._write(seed)
+
+
+def _legacy_user_stats(telegram_id: int):
+    """The previous Profile query: four correlated aggregates."""
+    with db._connect() as conn:
+        return conn.execute("""
+            SELECT
+                (SELECT COUNT(*) FROM posts WHERE telegram_id = ? AND status = 'approved'),
+                (SELECT COUNT(*) FROM posts WHERE telegram_id = ? AND status = 'rejected'),
+                (SELECT IFNULL(SUM(slots), 0) FROM slot_logs WHERE telegram_id = ? AND reason = 'task'),
+                (SELECT IFNULL(SUM(slots), 0) FROM slot_logs WHERE telegram_id = ? AND reason = 'referral')
+        """, (telegram_id,) * 4).fetchone()
+
+
+def bench_profile(users: int = 20_000, posts: int = 200_000, slot_logs: int = 500_000):
+    """One Profile tap: the four-subquery aggregate vs the user_stats row."""
+    _fresh_database()
+    _seed_profiles(users, posts, slot_logs)
+    viewer = users // 2
+    legacy = _legacy_user_stats(viewer)
+    assert all(abs(a - b) < 1e-6 for a, b in zip(legacy, db.get_user_stats(viewer)))
+
+    dropped = _drop_indexes("idx_slot_logs_user_reason")
+    unindexed = _time_it(lambda: _legacy_user_stats(viewer))
+    _restore_indexes(dropped)
+    indexed = _time_it(lambda: _legacy_user_stats(viewer))
+    cached = _time_it(lambda: db.get_user_stats(viewer), repeat=50)
+    rebuild = _time_it(db.rebuild_user_stats, repeat=1)
+    _report(f"profile stats ({posts:,} posts, {slot_logs:,} slot_logs)", [
+        ("4 subqueries, no slot_logs index", f"{unindexed * 1000:8.2f} ms"),
+        ("4 subqueries, indexed", f"{indexed * 1000:8.2f} ms"),
+        ("user_stats primary-key read", f"{cached * 1000:8.3f} ms"),
+        ("full rebuild (one-off)", f"{rebuild * 1000:8.1f} ms"),
+    ])
+
+
+# ───── Onboarding ────────────────────────────────────────
+
+
+def _legacy_add_user(conn, telegram_id, name, ref_by=None):
+    """The previous add_user: SELECT, then INSERT, then two referral writes."""
+    if conn.execute("SELECT 1 FROM users WHERE telegram_id = ?", (telegram_id,)).fetchone():
+        return False
+    conn.execute(
+        "INSERT INTO users (telegram_id, name, ref_by, slots, task_slots, ref_count_l1) VALUES (?, ?, ?, 2, 0, 0)",
+        (telegram_id, name, ref_by))
+    if ref_by:
+        conn.execute("""
+            UPDATE users SET slots = slots + 0.2, ref_count_l1 = ref_count_l1 + 1
+            WHERE telegram_id = ?
+        """, (ref_by,))
+        conn.execute("""
+            INSERT INTO slot_logs (telegram_id, slots, reason, created_at)
+            VALUES (?, ?, 'referral', ?)
+        """, (ref_by, 0.2, db.now_ts()))
+        db._invalidate_user(ref_by)
+    db._invalidate_user(telegram_id)
+    return True
+
+
+def _count_statements(fn):
+    """Run `fn()`; return its result and how many statements the writer
+    connection executed for it, leaving out transaction control.
+
+    The trace callback reports each trigger a statement fires as the
+    statement's own text again, so consecutive repeats count once.
+    """
+    statements = []
+    db._write(lambda conn: conn.set_trace_callback(statements.append))
+    try:
+        result = fn()
+    finally:
+        db._write(lambda conn: conn.set_trace_callback(None))
+    skip = ("SAVEPOINT", "RELEASE", "BEGIN", "COMMIT")
+    count = sum(1 for prev, sql in zip([None] + statements, statements)
+                if sql != prev and not sql.lstrip().upper().startswith(skip))
+    return result, count
+
+
+def bench_onboarding(threads: int = 50, per_thread: int = 100, repeats: int = 2):
+    """Referral-link surge: every signup uses user 1's link, and every user taps /start `repeats` times."""
+    signups = threads * per_thread
+    rows = []
+    for label, add in (("SELECT-then-INSERT (before)",
+                        lambda *a: db._write(lambda conn: _legacy_add_user(conn, *a))),
+                       ("UPSERT ... RETURNING (after)", db.add_user)):
+        _fresh_database()
+        db.add_user(1, "referrer")
+
+        def writer(uid, n):
+            for _ in range(repeats):
+                add(1000 + uid * per_thread + n, "user", 1)
+
+        elapsed, statements = _count_statements(
+            lambda: _burst(threads, per_thread, writer)[0])
+        referrer = db.get_user(1)
+        rows.append((label,
+                     f"{signups * repeats / elapsed:8.0f} /start taps/s  "
+                     f"{statements / signups:4.1f} statements per signup  "
+                     f"referrals credited {referrer['ref_count_l1']:,}"))
+    _report(f"onboarding: {signups:,} referral signups x {repeats} taps", rows)
+
+
+# ───── Matchmaking ───────────────────────────────────────
+
+
+def _synthetic_follow_graph(members: int, follows_per_member: int, seed: int = 7):
+    """Pool in join order plus edges drawn like today's board: every member
+    follows mostly early joiners. Each member has a hidden follow-back rate."""
+    rng = random.Random(seed)
+    follow_back = [rng.betavariate(2, 2) for _ in range(members + 1)]
+    edges = []
+    for follower in range(1, members + 1):
+        targets = {min(members, 1 + int(rng.expovariate(1 / 2_000)))
+                   for _ in range(follows_per_member)}
+        targets.discard(follower)
+        for target in targets:
+            roll = rng.random()
+            if roll < follow_back[target]:
+                state = db.FOLLOW_CONFIRMED
+            elif roll < follow_back[target] + (1 - follow_back[target]) / 2:
+                state = db.FOLLOW_IGNORED
+            else:
+                state = db.FOLLOW_PENDING
+            edges.append((follower, target, state))
+    return list(range(1, members + 1)), edges, follow_back
+
+
+def bench_matchmaking(members: int = 200_000, follows_per_member: int = 10,
+                      viewers: int = 2_000, page_size: int = 8, answer_after: int = 20):
+    """Suggestion latency, and follow-backs/fairness over `viewers` F4F taps vs join order."""
+    from matchmaking import FollowMatchmaker
+
+    pool, edges, follow_back = _synthetic_follow_graph(members, follows_per_member)
+    engine = FollowMatchmaker()
+    started = time.perf_counter()
+    engine.load(pool, edges)
+    build = time.perf_counter() - started
+
+    following = {}
+    for follower, target, _ in edges:
+        following.setdefault(follower, set()).add(target)
+
+    def join_order_page(viewer):
+        followed = following.get(viewer, ())
+        page = []
+        for member in pool:
+            if member != viewer and member not in followed:
+                page.append(member)
+                if len(page) == page_size:
+                    return page
+        return page
+
+    # Each viewer follows everyone on their first page, as the board asks, and
+    # the followed members answer a few taps later at their hidden rate.
+    rng = random.Random(11)
+    sample = rng.sample(pool, viewers)
+    latencies, engine_hits, legacy_hits = [], 0.0, 0.0
+    engine_received, legacy_received = {}, {}
+    answers = []
+    for n, viewer in enumerate(sample):
+        started = time.perf_counter()
+        page = engine.suggest(viewer, limit=page_size)
+        latencies.append(time.perf_counter() - started)
+        for member, in page.rows:
+            engine_hits += follow_back[member]
+            engine_received[member] = engine_received.get(member, 0) + 1
+            engine.apply("edge", viewer, member, db.FOLLOW_PENDING)
+            answers.append((n + answer_after, viewer, member))
+        while answers and answers[0][0] <= n:
+            _, follower, member = answers.pop(0)
+            roll = rng.random()
+            if roll < follow_back[member]:
+                engine.apply("edge", follower, member, db.FOLLOW_CONFIRMED)
+            elif roll < follow_back[member] + (1 - follow_back[member]) / 2:
+                engine.apply("edge", follower, member, db.FOLLOW_IGNORED)
+        for member in join_order_page(viewer):
+            legacy_hits += follow_back[member]
+            legacy_received[member] = legacy_received.get(member, 0) + 1
+            following.setdefault(viewer, set()).add(member)
+
+    deep = engine.suggest(sample[0], limit=page_size)
+    for _ in range(20):
+        deep = engine.suggest(sample[0], limit=page_size, after=deep.rows[-1][0])
+    deep_page = _time_it(
+        lambda: engine.suggest(sample[0], limit=page_size, after=deep.rows[-1][0]), repeat=50)
+
+    updates = []
+    for _ in range(5_000):
+        follower, target = rng.randint(1, members), rng.randint(1, members)
+        started = time.perf_counter()
+        engine.apply("edge", follower, target, db.FOLLOW_PENDING)
+        updates.append(time.perf_counter() - started)
+
+    latencies.sort()
+    updates.sort()
+    pages = viewers * page_size
+    _report(f"matchmaking ({members:,} members, {len(edges):,} follows)", [
+        ("build from snapshot", f"{build:8.2f} s"),
+        ("page 1 p50 / p99",
+         f"{statistics.median(latencies) * 1e6:6.1f} µs / {_p99_ms(latencies) * 1000:6.1f} µs"),
+        ("page 22", f"{deep_page * 1e6:6.1f} µs"),
+        ("follow event p50 / max",
+         f"{statistics.median(updates) * 1e6:6.1f} µs / {updates[-1] * 1e6:6.1f} µs"),
+        ("expected follow-backs / page",
+         f"join order {legacy_hits / viewers:4.2f}   matchmaking {engine_hits / viewers:4.2f}"),
+        ("members followed",
+         f"join order {len(legacy_received):,}   matchmaking {len(engine_received):,}"
+         f"   (of {pages:,} follows)"),
+        ("most follows to one member",
+         f"join order {max(legacy_received.values()):,}   "
+         f"matchmaking {max(engine_received.values()):,}"),
+    ])
+
+
+# ───── Post Indexes ──────────────────────────────────────
+
+
+def _seed_post_history(users: int, posts: int, groups: int):
+    """`posts` posts over 60 days: almost all expired, a day's worth approved,
+    a few dozen pending and rejected."""
+    now = db.now_ts()
+    span = 60 * 24 * db.HOUR
+
+    def status(n):
+        if n >= posts - 50:
+            return "pending"
+        if n % 40 == 0:
+            return "rejected"
+        return "approved" if n >= posts - posts // 60 else "expired"
+
+    def seed(conn):
+        conn.executemany(
+            "INSERT INTO users (telegram_id, name) VALUES (?, ?)",
+            [(uid, f"user{uid}") for uid in range(1, users + 1)])
+        rows = []
+        for n in range(posts):
+            at = now - span + span * n // posts
+            approved = status(n) in ("approved", "expired")
+            rows.append((1 + n % users, f"https://x.com/u/status/{n}", -1 - n % groups,
+                         status(n), at, at if approved else None,
+                         at + db.RAID_DURATION if approved else None))
+        conn.executemany(
+            "INSERT INTO posts (telegram_id, post_link, group_id, status, submitted_at, "
+            "approved_at, expires_at) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    db._write(seed)
+
+
+def bench_post_indexes(posts: int = 300_000, users: int = 5_000, groups: int = 20):
+    """Hot posts queries on the v1 single-column indexes vs the composite set."""
+    _fresh_database()
+    _seed_post_history(users, posts, groups)
+    viewer = 7
+    queries = [
+        ("get_pending_posts", lambda: db.get_pending_posts()),
+        ("get_recent_approved_posts(group)", lambda: db.get_recent_approved_posts(-1)),
+        ("get_user_active_posts", lambda: db.get_user_active_posts(viewer)),
+        ("get_expired_unconfirmed_verifications", db.get_expired_unconfirmed_verifications),
+    ]
+    after = [_time_it(fn) for _, fn in queries]
+
+    composite = _drop_indexes("idx_posts_status_submitted", "idx_posts_status_approved",
+                              "idx_posts_owner_status")
+    _restore_indexes(["CREATE INDEX idx_posts_status ON posts(status)",
+                      "CREATE INDEX idx_posts_telegram_id ON posts(telegram_id)"])
+    before = [_time_it(fn) for _, fn in queries]
+    _drop_indexes("idx_posts_status", "idx_posts_telegram_id")
+    _restore_indexes(composite)
+
+    _report(f"post indexes: {posts:,} posts, {posts // 60:,} active", [
+        (name, f"{b * 1000:8.2f} ms -> {a * 1000:7.2f} ms")
+        for (name, _), b, a in zip(queries, before, after)])
+
+
+# ───── Update Concurrency ────────────────────────────────
+
+
+def _tap(update_id: int, user_id: int):
+    from telegram import Update
+    return Update.de_json({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id), "chat_instance": "bench", "data": "board|next",
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+        },
+    }, None)
+
+
+async def _drive(processor, updates, handle, rate: float):
+    """Feed `updates` at `rate`/s the way Application's fetcher does: one task
+    per update when the processor allows concurrency, inline otherwise."""
+    await processor.initialize()
+    started = time.perf_counter()
+    tasks = []
+    for n, update in enumerate(updates):
+        delay = started + n / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if processor.max_concurrent_updates > 1:
+            tasks.append(asyncio.create_task(processor.process_update(update, handle(update))))
+        else:
+            await processor.process_update(update, handle(update))
+    await asyncio.gather(*tasks)
+    await processor.shutdown()
+
+
+def bench_update_concurrency(users: int = 100, updates: int = 2_000, rate: float = 200,
+                             bot_api_ms: float = 20, slow_user_ms: float = 1_000):
+    """Taps whose handlers wait on the Bot API, one of them a user with a
+    1 s F4F board, under one-at-a-time, plain concurrent and per-user keyed
+    processing."""
+    from telegram.ext import SimpleUpdateProcessor
+    from update_processor import KeyedUpdateProcessor
+
+    rng = random.Random(3)
+    slow_user = 1
+    stream = [_tap(n, rng.randint(1, users)) for n in range(updates)]
+    api_ms = {n: bot_api_ms * rng.uniform(0.5, 1.5) for n in range(updates)}
+
+    def run(processor):
+        seen = {}
+        latencies = []            # arrival -> handled, for everyone but slow_user
+        started = time.perf_counter()
+
+        async def handle(update):
+            uid = update.effective_user.id
+            ms = slow_user_ms if uid == slow_user else api_ms[update.update_id]
+            await asyncio.sleep(ms / 1000)
+            seen.setdefault(uid, []).append(update.update_id)
+            if uid != slow_user:
+                latencies.append(time.perf_counter() - started - update.update_id / rate)
+
+        asyncio.run(_drive(processor, stream, handle, rate))
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        out_of_order = sum(ids != sorted(ids) for ids in seen.values())
+        return elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)], out_of_order
+
+    keyed = KeyedUpdateProcessor(concurrency=16)
+    rows = []
+    for label, processor in (("one at a time", SimpleUpdateProcessor(1)),
+                             ("16 concurrent, no locks", SimpleUpdateProcessor(16)),
+                             ("16 concurrent, per-user locks", keyed)):
+        elapsed, p50, p99, out_of_order = run(processor)
+        rows.append((label, f"{elapsed:6.1f} s, latency p50 {p50 * 1000:7.1f} ms / "
+                            f"p99 {p99 * 1000:8.1f} ms, {out_of_order} user(s) out of order"))
+    stats = keyed.stats()
+    rows.append(("lock waits", f"{stats['contended']} of {stats['processed']} updates, "
+                               f"p50 {stats['lock_wait_p50'] * 1000:.1f} ms, "
+                               f"p99 {stats['lock_wait_p99'] * 1000:.1f} ms"))
+    _report(f"update concurrency: {updates:,} taps from {users} users at {rate:.0f}/s", rows)
+
+
+# ───── Metrics Overhead ──────────────────────────────────
+
+
+def bench_metrics(calls: int = 200_000):
+    """Cost of the metrics.py wrappers: a no-op function and a no-op handler,
+    bare and timed, and db.get_user (a user-cache hit) as the bot calls it."""
+    from metrics import Metrics
+
+    registry = Metrics()
+
+    def noop(x):
+        return x
+
+    async def handler(update, context):
+        return None
+
+    timed = registry.instrument_function(noop)
+    timed_handler = registry.instrument_handler(handler)
+
+    def per_call(fn) -> float:
+        started = time.perf_counter()
+        for n in range(calls):
+            fn(n)
+        return (time.perf_counter() - started) / calls
+
+    async def per_update(fn) -> float:
+        update = _tap(1, 1)
+        started = time.perf_counter()
+        for _ in range(calls):
+            await fn(update, None)
+        return (time.perf_counter() - started) / calls
+
+    _fresh_database()
+    db.add_user(1, "user1")
+    db.get_user(1)
+    raw_get_user = db.get_user.__wrapped__
+
+    rows = []
+    for label, bare, wrapped in (
+            ("function call", per_call(noop), per_call(timed)),
+            ("handler call", asyncio.run(per_update(handler)), asyncio.run(per_update(timed_handler))),
+            ("db.get_user (cached)", per_call(lambda n: raw_get_user(1)),
+             per_call(lambda n: db.get_user(1)))):
+        rows.append((label, f"{bare * 1e6:6.2f} us -> {wrapped * 1e6:6.2f} us "
+                            f"(+{(wrapped - bare) * 1e6:.2f} us)"))
+    _report(f"metrics overhead: {calls:,} calls each", rows)
+
+
+BENCHMARKS = {
+    "async_db": bench_async_db,
+    "group_commit": bench_group_commit,
+    "raid_feed": bench_raid_feed,
+    "bans": bench_bans,
+    "follow_suggestions": bench_follow_suggestions,
+    "profile": bench_profile,
+    "onboarding": bench_onboarding,
+    "matchmaking": bench_matchmaking,
+    "post_indexes": bench_post_indexes,
+    "update_concurrency": bench_update_concurrency,
+    "metrics": bench_metrics,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
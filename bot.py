@@ -1,13 +1,14 @@
 import os
 import re
+import asyncio
 import html
 import pytz
 import logging
+import tempfile
 import threading
 from auth_server import app as flask_app
 from pytz import timezone
-from datetime import datetime, timedelta, timezone as dt_timezone
-from functools import partial
+from datetime import datetime, time as dt_time
 
 # Telegram Core
 from telegram import (
@@ -24,25 +25,37 @@ from telegram.ext import (
 )
 
 # APScheduler
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.util import astimezone
 # Environment
 from dotenv import load_dotenv
 
 # Internal Database Methods
-from db import (
-    get_recent_approved_posts, get_user_stats, add_user, get_user, get_user_slots,
-    save_post, get_pending_posts, set_post_status, deduct_slot_by_admin, expire_old_posts,
+import db
+from db import backup_database, now_ts, format_duration
+from async_db import (
+    run_sync,
+    get_active_raids_page, get_user_active_posts_page, get_pending_posts_page,
+    get_verifications_page, get_user_stats, add_user, get_user, get_user_slots,
+    save_post, approve_post, reject_post,
     set_twitter_handle, get_post_link_by_id, has_completed_post, mark_post_completed,
-    add_task_slot, ban_unresponsive_post_owners, is_user_banned, create_verification,
-    get_post_owner_id, close_verification, auto_approve_stale_posts, is_in_cooldown,
-    get_user_active_posts, get_verifications_for_post, update_last_post_time,
-    is_in_follow_pool, join_follow_pool, leave_follow_pool, get_follow_suggestions,
+    is_user_banned, create_verification,
+    get_post_owner_id, confirm_raid, reject_raid, is_in_cooldown,
+    get_verifications_for_post, update_last_post_time,
+    is_in_follow_pool, join_follow_pool, leave_follow_pool, get_follow_cards,
     create_follow_action, get_twitter_handle, confirm_follow_back, ignore_follow,
-    count_follow_backs, count_followers
+    get_pending_followers
 )
+from dispatcher import outbound
+from outbox import outbox_worker
+from jobs import register_maintenance_jobs, job_stats
+from expiry import raid_expiry
+from matchmaking import matchmaker
+from migrations import run_migrations
+from webhook import webhook_blueprint, run_webhook, record_updates, ingress
+from update_processor import update_processor
+from metrics import metrics, metrics_blueprint
+from tracing import tracer, traces_blueprint, TracedRequest
+from profiler import profiler, PROFILE_MAX_SECONDS
 
 
 # Configure logging
@@ -62,51 +75,21 @@ SUPPORT_URL = "https://t.me/web3kaijun"
 ADMINS = [6229232611]  # Telegram IDs of admins
 GROUP_ID = -1002828603829
 OAUTH_URL = "https://telegram-bot-production-d526.up.railway.app/twitter/connect"
+BOT_MODE = os.getenv("BOT_MODE", "polling")  # "polling" or "webhook" (see webhook.py)
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL")  # e.g. replay_updates.py's stand-in
 
 
 # ──────────────────────── UTILITIES ─────────────────────────
 
 
-def run_background_jobs():
-    """Runs hourly jobs for expiring posts and banning unresponsive users."""
-    scheduler = BackgroundScheduler(timezone=pytz.utc)
+def schedule_jobs(app):
+    """Maintenance jobs (hourly expiry/bans, 10-min auto-approve) and the daily reminder."""
+    register_maintenance_jobs(app.job_queue)
 
-    scheduler.add_job(
-        func=expire_old_posts,
-        trigger="interval",
-        hours=1,
-        next_run_time=datetime.now(dt_timezone.utc) + timedelta(minutes=1)
-
-
-    )
-
-    scheduler.add_job(
-        func=ban_unresponsive_post_owners,
-        trigger="interval",
-        hours=1,
-        next_run_time=datetime.now(dt_timezone.utc) + timedelta(minutes=2)
-
-
-    )
-
-    scheduler.add_job(
-        partial(auto_approve_stale_posts),
-        "interval",
-        minutes=10,
-        next_run_time=datetime.now(dt_timezone.utc) + timedelta(minutes=3)
-    )
-
-    # DAILY REMINDER AT 10 AM
-    scheduler.add_job(
-        lambda: application.bot.send_message(
-            chat_id=GROUP_ID,
-            text="📢 Daily Reminder: Don’t forget to complete your raids and submit your posts!"
-        ),
-        trigger=CronTrigger(hour=10, minute=0, timezone='Africa/Lagos')
-    )
-
-    scheduler.start()
-    logger.info("🕒 Background jobs started.")
+    # DAILY REMINDER AT 10 AM (the job queue runs in Africa/Lagos time)
+    app.job_queue.run_daily(
+        send_daily_reminder, time=dt_time(hour=10, minute=0), name="daily_reminder")
+    logger.info("🕒 Background jobs scheduled.")
 
 
 def extract_tweet_id(url: str) -> str | None:
@@ -146,17 +129,229 @@ def cancel_kbd() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup([["🚫 Cancel"]], resize_keyboard=True)
 
 
+# Every reply-keyboard text handle_message_buttons answers; /metrics labels
+# these by name and all other text as "text".
+MENU_BUTTONS = frozenset({
+    "🔥 Ongoing Raids", "🎯 Slots", "📤 Post", "📨 Invite Friends", "🎧 Support",
+    "📱 Contacts", "👤 Profile", "📊 My Ongoing Raids", "🤝 Follow for Follow",
+    "🛠️ Review Posts", "📊 Stats", "🚫 Cancel", "✅ Join Now", "🚫 Leave Pool",
+    "🔙 Back to Menu", "📥 Pending Followers",
+})
+
+
 def escape_markdown(text):
     return re.sub(r'([*_`\[\]])', r'\\\1', text)
 
 
 async def send_daily_reminder(context: ContextTypes.DEFAULT_TYPE):
-    await context.bot.send_message(
+    outbound.send_message(
         chat_id=GROUP_ID,
         text="🔔 *Daily Reminder*\n\nDon't forget to complete your raids, submit your posts, and earn engagement slots today! 💰",
         parse_mode=ParseMode.MARKDOWN
     )
 
+# ────────────────────────── BOARDS ──────────────────────────
+# Listings (raids, my raids, responses, review queue, F4F suggestions) are a
+# single message: numbered rows, per-row inline buttons, and ⬅️/➡️ buttons that
+# edit the same message in place. Pages are keyset cursors over posts.id,
+# verifications.id or matchmaking.py's ranking of follow_pool members, so a
+# feed view costs one Bot API call however many rows exist.
+
+BOARD_PAGE_SIZE = 8
+BOARD_BUTTONS_PER_ROW = 4
+
+
+def board_cursor(direction: str, cursor: str) -> dict:
+    """Turn a board callback's direction/cursor into db page kwargs."""
+    if not cursor:
+        return {}
+    if direction == "next":
+        return {"after": int(cursor)}
+    if direction == "prev":
+        return {"before": int(cursor)}
+    return {"start": int(cursor)}
+
+
+def board_anchor(page) -> str:
+    """Cursor that re-renders this same page after a row action."""
+    return str(page.rows[0][0]) if page.has_prev else ""
+
+
+def board_keyboard(kind: str, page, buttons: list, arg="") -> InlineKeyboardMarkup | None:
+    rows = [buttons[i:i + BOARD_BUTTONS_PER_ROW]
+            for i in range(0, len(buttons), BOARD_BUTTONS_PER_ROW)]
+    nav = []
+    if page.has_prev:
+        nav.append(InlineKeyboardButton(
+            "⬅️ Prev", callback_data=f"board|{kind}|prev|{page.rows[0][0]}|{arg}"))
+    if page.has_next:
+        nav.append(InlineKeyboardButton(
+            "Next ➡️", callback_data=f"board|{kind}|next|{page.rows[-1][0]}|{arg}"))
+    if nav:
+        rows.append(nav)
+    return InlineKeyboardMarkup(rows) if rows else None
+
+
+def raid_time_left(expires_at: int | None) -> str | None:
+    """Human time left on a raid, or None if it has expired."""
+    if expires_at is None or expires_at <= now_ts():
+        return None
+    return format_duration(expires_at - now_ts())
+
+
+async def render_raid_board(user_id: int, chat, **cursor):
+    group_id = chat.id if chat.type in ("group", "supergroup") else None
+    page = await get_active_raids_page(
+        user_id, group_id=group_id, limit=BOARD_PAGE_SIZE, **cursor)
+    anchor = board_anchor(page) if page.rows else ""
+
+    lines, buttons = [], []
+    for n, (post_id, post_link, name, expires_at, completed) in enumerate(page.rows, 1):
+        time_left = raid_time_left(expires_at) or "0h 0m"
+        link = html.escape(post_link)
+        status = "✅ Joined" if completed else "❌ Not joined yet"
+        lines.append(
+            f"<b>{n}.</b> 🔥 Raid by <b>{html.escape(name or 'Unknown')}</b>\n"
+            f"🔗 <a href=\"{link}\">{link}</a>\n"
+            f"{status} · 🕒 {time_left} left"
+        )
+        if not completed:
+            buttons.append(InlineKeyboardButton(
+                f"✅ Done #{n}", callback_data=f"done|{post_id}|{anchor}"))
+
+    if not lines:
+        return "🚫 No active raids in the last 24 hours.", None
+    text = "🔥 <b>Ongoing Raids</b>\n\n" + "\n\n".join(lines)
+    return text, board_keyboard("raids", page, buttons)
+
+
+async def render_my_raids_board(user_id: int, **cursor):
+    page = await get_user_active_posts_page(user_id, limit=BOARD_PAGE_SIZE, **cursor)
+
+    lines, buttons = [], []
+    for n, (post_id, post_link, expires_at) in enumerate(page.rows, 1):
+        time_left = raid_time_left(expires_at) or "0h 0m"
+        lines.append(
+            f"<b>{n}.</b> 🧵 {html.escape(post_link)}\n⏳ Time left: {time_left}")
+        buttons.append(InlineKeyboardButton(
+            f"👥 Responses #{n}", callback_data=f"responses|{post_id}"))
+
+    if not lines:
+        return "📭 You don’t have any active raids at the moment.", None
+    text = "🧵 <b>Your Raids</b>\n\n" + "\n\n".join(lines)
+    return text, board_keyboard("myraids", page, buttons)
+
+
+async def render_responses_board(post_id: int, **cursor):
+    page = await get_verifications_page(post_id, limit=BOARD_PAGE_SIZE, **cursor)
+    anchor = board_anchor(page) if page.rows else ""
+
+    lines, buttons = [], []
+    for n, (_, doer_id, raider_name, raider_handle, status) in enumerate(page.rows, 1):
+        name = html.escape(raider_name) if raider_name else f"User {doer_id}"
+        handle = f" X: (@{html.escape(raider_handle)})" if raider_handle else ""
+        lines.append(f"<b>{n}.</b> {name}{handle} — Status: {status or 'Pending'}")
+
+        # Only show buttons if still pending
+        if status == "pending":
+            buttons += [
+                InlineKeyboardButton(
+                    f"✅ #{n}", callback_data=f"vconfirm|{post_id}|{doer_id}|{anchor}"),
+                InlineKeyboardButton(
+                    f"❌ #{n}", callback_data=f"vreject|{post_id}|{doer_id}|{anchor}"),
+            ]
+
+    if not lines:
+        return "📭 No responses for this raid yet.", None
+    text = "👥 <b>Raid Responses</b>\n\n" + "\n".join(lines)
+    return text, board_keyboard("responses", page, buttons, arg=post_id)
+
+
+async def render_review_board(**cursor):
+    page = await get_pending_posts_page(limit=BOARD_PAGE_SIZE, **cursor)
+    anchor = board_anchor(page) if page.rows else ""
+
+    lines, buttons = [], []
+    for n, (post_id, link, name, tg_id) in enumerate(page.rows, 1):
+        lines.append(
+            f"<b>{n}.</b> 👤 {html.escape(name or 'Unknown')}\n🔗 {html.escape(link)}")
+        buttons += [
+            InlineKeyboardButton(
+                f"✅ #{n}", callback_data=f"approve|{post_id}|{tg_id}|{anchor}"),
+            InlineKeyboardButton(
+                f"❌ #{n}", callback_data=f"reject|{post_id}|{tg_id}|{anchor}"),
+        ]
+
+    if not lines:
+        return "✅ No pending posts.", None
+    text = "🛠️ <b>Pending Posts</b>\n\n" + "\n\n".join(lines)
+    return text, board_keyboard("review", page, buttons)
+
+
+async def render_f4f_board(user_id: int, **cursor):
+    # matchmaking.py ranks the pool; the db fills in names and counters.
+    ranked = matchmaker.suggest(user_id, limit=BOARD_PAGE_SIZE, **cursor)
+    cards = await get_follow_cards([member for member, in ranked.rows])
+    page = ranked._replace(rows=cards)
+    anchor = board_anchor(page) if page.rows else ""
+
+    lines, buttons = [], []
+    for n, (target_id, name, handle, followers, follow_backs) in enumerate(page.rows, 1):
+        handle = html.escape(handle or "")
+        lines.append(
+            f"<b>{n}.</b> 👤 <b>{html.escape(name or 'Unknown')}</b>\n"
+            f"🔗 <a href=\"https://x.com/{handle}\">x.com/{handle}</a>\n"
+            f"📈 Followed by {followers} · 🔁 Followed back {follow_backs}"
+        )
+        buttons.append(InlineKeyboardButton(
+            f"✅ Done #{n}", callback_data=f"followdone|{target_id}|{anchor}"))
+
+    if not lines:
+        return "📭 No users available to follow at the moment. Try again later!", None
+    text = ("📋 <b>Users you can follow</b>\n"
+            "Follow each one on X, then tap its ✅ Done button.\n\n" + "\n\n".join(lines))
+    return text, board_keyboard("f4f", page, buttons)
+
+
+def send_board(message, board):
+    text, markup = board
+    outbound.reply_text(
+        message, text, parse_mode=ParseMode.HTML, reply_markup=markup,
+        disable_web_page_preview=True)
+
+
+def edit_board(query, board):
+    # The dispatcher treats "message is not modified" as delivered.
+    text, markup = board
+    outbound.edit_message_text(
+        query, text, parse_mode=ParseMode.HTML, reply_markup=markup,
+        disable_web_page_preview=True)
+
+
+async def handle_board_navigation(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """⬅️/➡️ on any board: re-render the requested page in place."""
+    query = update.callback_query
+    await query.answer()
+    _, kind, direction, cursor, arg = query.data.split("|")
+    cursor = board_cursor(direction, cursor)
+    user = query.from_user
+
+    if kind == "raids":
+        board = await render_raid_board(user.id, query.message.chat, **cursor)
+    elif kind == "myraids":
+        board = await render_my_raids_board(user.id, **cursor)
+    elif kind == "responses":
+        board = await render_responses_board(int(arg), **cursor)
+    elif kind == "review" and user.id in ADMINS:
+        board = await render_review_board(**cursor)
+    elif kind == "f4f":
+        board = await render_f4f_board(user.id, **cursor)
+    else:
+        return
+
+    edit_board(query, board)
+
+
 # ────────────────────────── COMMANDS ────────────────────────
 
 
@@ -176,7 +371,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
                                   url="https://t.me/telemtsa")],
             [InlineKeyboardButton("✅ Done", callback_data="check_join")]
         ])
-        await update.message.reply_text(
+        outbound.reply_text(
+            update.message,
             "🚀 *Welcome to the Beta Test of this bot*\n\n"
             "To start using this bot, please join our *beta testing group* first.",
             parse_mode=ParseMode.MARKDOWN,
@@ -185,7 +381,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # Register the user
-    added = add_user(user.id, user.full_name, ref_by)
+    added = await add_user(user.id, user.full_name, ref_by)
 
     # Welcome message
     welcome = (
@@ -205,9 +401,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     print(update.effective_chat.id)
 
-    await update.message.reply_text(welcome, parse_mode=ParseMode.MARKDOWN)
+    outbound.reply_text(update.message, welcome, parse_mode=ParseMode.MARKDOWN)
     if update.message.chat.type == ChatType.PRIVATE:
-        await update.message.reply_text("🔘 Choose an option:", reply_markup=main_kbd(user.id))
+        outbound.reply_text(update.message, "🔘 Choose an option:", reply_markup=main_kbd(user.id))
 
 
 # ──────────────────────── ADMIN COMMANDS ─────────────────────
@@ -216,44 +412,91 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def review_posts(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Admin post review handler"""
     if update.effective_user.id not in ADMINS:
-        await update.message.reply_text("⛔ You're not authorized.")
+        outbound.reply_text(update.message, "⛔ You're not authorized.")
         return
 
-    posts = get_pending_posts()
-    if not posts:
-        await update.message.reply_text("✅ No pending posts.")
-        return
-
-    for post_id, link, name, tg_id in posts:
-        kb = InlineKeyboardMarkup([[
-            InlineKeyboardButton(
-                "✅ Approve", callback_data=f"approve|{post_id}|{tg_id}"),
-            InlineKeyboardButton(
-                "❌ Reject", callback_data=f"reject|{post_id}|{tg_id}")
-        ]])
-        await update.message.reply_text(f"👤 {name}\n🔗 {link}", reply_markup=kb)
+    send_board(update.message, await render_review_board())
 
 
 async def admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle admin approval/rejection"""
+    """Handle admin approval/rejection from the review board"""
     query = update.callback_query
-    await query.answer()
 
-    action, post_id, user_id = query.data.split("|")
-    post_id, user_id = int(post_id), int(user_id)
+    # The owner id in the callback data is informational; the db reads it
+    # back from the post row it actually transitions. Buttons sent before the
+    # review board was paginated have no page anchor.
+    action, post_id, *rest = query.data.split("|")
+    post_id = int(post_id)
+    anchor = rest[1] if len(rest) > 1 else ""
 
     if action == "approve":
-        if deduct_slot_by_admin(user_id):
-            set_post_status(post_id, "approved")
-            await context.bot.send_message(user_id, "✅ Your post has been approved for raiding! 🚀")
-            await query.edit_message_text("✅ Post approved and 1 slot deducted.")
+        outcome = await approve_post(post_id)
+        if outcome == "approved":
+            notice = "✅ Post approved and 1 slot deducted."
+        elif outcome == "rejected":
+            notice = "❌ Rejected: user has no available slots."
         else:
-            set_post_status(post_id, "rejected")
-            await query.edit_message_text("❌ Rejected: user has no available slots.")
+            notice = "ℹ️ This post was already reviewed."
+    elif await reject_post(post_id):
+        notice = "❌ Post rejected."
     else:
-        set_post_status(post_id, "rejected")
-        await context.bot.send_message(user_id, "❌ Your post has been rejected.")
-        await query.edit_message_text("❌ Post rejected.")
+        notice = "ℹ️ This post was already reviewed."
+
+    await query.answer(notice)
+    edit_board(query, await render_review_board(**board_cursor("at", anchor)))
+
+
+async def handle_traces(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Send the kept update traces as a text file: /traces [count] [slowest]"""
+    if update.effective_user.id not in ADMINS:
+        outbound.reply_text(update.message, "⛔ You're not authorized.")
+        return
+
+    args = context.args or []
+    limit = next((int(a) for a in args if a.isdigit()), 20)
+    slowest = "slowest" in args
+    stats = tracer.stats()
+    outbound.reply_document(
+        update.message,
+        tracer.dump(limit, slowest).encode(),
+        filename="traces.txt",
+        caption=f"🧭 {min(limit, stats['buffered'])} of {stats['buffered']} kept trace(s), "
+                f"{'slowest' if slowest else 'newest'} first "
+                f"({stats['traced']} updates traced, {stats['kept_slow']} kept for being slow).",
+    )
+
+
+async def handle_profiler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Profile every thread for N seconds, then send the stacks: /profiler [seconds]"""
+    if update.effective_user.id not in ADMINS:
+        outbound.reply_text(update.message, "⛔ You're not authorized.")
+        return
+    if profiler.running:
+        outbound.reply_text(update.message, "⏳ A profile is already running.")
+        return
+
+    args = context.args or []
+    seconds = min(int(args[0]), PROFILE_MAX_SECONDS) if args and args[0].isdigit() else 30
+    outbound.reply_text(update.message, f"🔬 Profiling the bot for {seconds}s...")
+    # Runs in the background so this user's next updates are not held up.
+    context.application.create_task(send_profile(update.message, seconds), update=update)
+
+
+async def send_profile(message, seconds: int):
+    try:
+        collapsed, summary = await asyncio.to_thread(profiler.sample, max(seconds, 1))
+    except RuntimeError as e:
+        outbound.reply_text(message, f"⚠️ {e}")
+        return
+    outbound.reply_document(
+        message,
+        collapsed.encode(),
+        filename=f"profile-{now_ts()}.folded",
+        caption=f"🔬 {summary['samples']} samples over {summary['seconds']:.0f}s, "
+                f"{summary['stacks']} distinct stacks (sampler used "
+                f"{summary['overhead'] * 100:.1f}% of a core).\n"
+                "Open it in speedscope.app or feed it to flamegraph.pl.",
+    )
 
 
 async def connect_twitter(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -266,7 +509,8 @@ async def connect_twitter(update: Update, context: ContextTypes.DEFAULT_TYPE):
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
-    await update.message.reply_text(
+    outbound.reply_text(
+        update.message,
         "Click the button below to connect your Twitter account:",
         reply_markup=reply_markup
     )
@@ -284,22 +528,24 @@ async def handle_callback_buttons(update: Update, context: ContextTypes.DEFAULT_
 
     if data.startswith("confirm_twitter|"):
         handle = data.split("|")[1]
-        success = set_twitter_handle(user.id, handle)
+        success = await set_twitter_handle(user.id, handle)
 
         if success:
-            await query.edit_message_text(
+            outbound.edit_message_text(
+                query,
                 f"✅ Twitter handle @`{handle}` has been confirmed and saved.",
                 parse_mode=ParseMode.MARKDOWN
             )
             # Go back to main menu
-            await context.bot.send_message(
+            outbound.send_message(
                 chat_id=user.id,
                 text="🔘 You're now connected! Choose an option:",
                 reply_markup=main_kbd(user.id)
             )
             context.user_data.pop("awaiting_twitter", None)  # Clean up state
         else:
-            await query.edit_message_text(
+            outbound.edit_message_text(
+                query,
                 f"❌ The handle @`{handle}` is already in use by another user.\n"
                 "Please send a different Twitter handle.",
                 parse_mode=ParseMode.MARKDOWN
@@ -307,67 +553,57 @@ async def handle_callback_buttons(update: Update, context: ContextTypes.DEFAULT_
             context.user_data["awaiting_twitter"] = True
 
     elif data.startswith("vconfirm|"):
-        _, post_id_str, doer_id_str = data.split("|")
+        # Owner pings carry 3 fields; rows on the responses board add a page anchor.
+        _, post_id_str, doer_id_str, *anchor = data.split("|")
         post_id = int(post_id_str)
         doer_id = int(doer_id_str)
 
-        # Grant reward and close verification
-        add_task_slot(doer_id, 0.1)
-        close_verification(post_id, doer_id)
-        await context.bot.send_message(
-            chat_id=doer_id,
-            text="✅ Your raid was confirmed! You've earned 0.1 slots."
-        )
-        await query.edit_message_text("🟢 You confirmed the raid as successful.")
+        # Grant reward, close verification and queue the doer's notice
+        await confirm_raid(post_id, doer_id, reward=0.1)
+        if anchor:
+            edit_board(query, await render_responses_board(
+                post_id, **board_cursor("at", anchor[0])))
+        else:
+            outbound.edit_message_text(query, "🟢 You confirmed the raid as successful.")
 
     elif data.startswith("responses|"):
         await handle_view_responses(update, context)
 
     elif data.startswith("vreject|"):
-        _, post_id_str, doer_id_str = data.split("|")
+        _, post_id_str, doer_id_str, *anchor = data.split("|")
         post_id = int(post_id_str)
         doer_id = int(doer_id_str)
 
-        close_verification(post_id, doer_id)
-        await context.bot.send_message(
-            chat_id=doer_id,
-            text="❌ Your raid was rejected by the post owner. No slots awarded."
-        )
-        await query.edit_message_text("🔴 You rejected the raid.")
+        await reject_raid(post_id, doer_id)
+        if anchor:
+            edit_board(query, await render_responses_board(
+                post_id, **board_cursor("at", anchor[0])))
+        else:
+            outbound.edit_message_text(query, "🔴 You rejected the raid.")
 
     elif data == "check_join":
         try:
             member = await context.bot.get_chat_member(REQUIRED_GROUP, user.id)
             if member.status in ("member", "administrator", "creator"):
-                await query.edit_message_text("✅ You're in! Please click /start again to continue.")
+                outbound.edit_message_text(query, "✅ You're in! Please click /start again to continue.")
             else:
-                await query.edit_message_text("🚫 You haven't joined the group yet click /start to retry.")
+                outbound.edit_message_text(query, "🚫 You haven't joined the group yet click /start to retry.")
         except:
-            await query.edit_message_text("❌ Couldn't verify. Try again later.")
+            outbound.edit_message_text(query, "❌ Couldn't verify. Try again later.")
 
     elif data.startswith("followback|"):
         _, follower_id = data.split("|")
         follower_id = int(follower_id)
         followed_id = query.from_user.id
 
-        confirm_follow_back(followed_id, follower_id)
+        # Records the follow-back and queues the follower's notice
+        await confirm_follow_back(
+            followed_id, follower_id, followed_name=query.from_user.first_name)
 
         await query.answer("✅ Follow back recorded!")
 
-        # Notify the follower
-        followed_handle = get_twitter_handle(followed_id)
-        followed_name = query.from_user.first_name
-
-        await context.bot.send_message(
-            chat_id=follower_id,
-            text=(
-                f"🎉 {followed_name} followed you back!\n\n"
-                f"🔗 View their profile: https://x.com/{followed_handle}"
-            )
-        )
-
         # Confirm to the one who followed back
-        await context.bot.send_message(
+        outbound.send_message(
             chat_id=followed_id,
             text="✅ Thanks for following back!"
         )
@@ -376,13 +612,13 @@ async def handle_callback_buttons(update: Update, context: ContextTypes.DEFAULT_
         _, follower_id = data.split("|")
         followed_id = query.from_user.id
 
-        ignore_follow(followed_id, int(follower_id))
+        await ignore_follow(followed_id, int(follower_id))
 
         # Notify the follower
-        handle = get_twitter_handle(followed_id)
+        handle = await get_twitter_handle(followed_id)
         x_profile_url = f"https://x.com/{handle}"
 
-        await context.bot.send_message(
+        outbound.send_message(
             chat_id=int(follower_id),
             text=(
                 f"❌ {handle} ignored your follow request.\n\n"
@@ -393,10 +629,12 @@ async def handle_callback_buttons(update: Update, context: ContextTypes.DEFAULT_
         )
 
         await query.answer("Ignored.")
-        await query.edit_message_reply_markup(reply_markup=None)
+        outbound.edit_message_reply_markup(query)
 
     elif data.startswith("followdone|"):
-        followed_id = int(data.split("|")[1])
+        # Rows on the F4F board carry a page anchor after the user id.
+        _, followed_id, *anchor = data.split("|")
+        followed_id = int(followed_id)
         follower = query.from_user
         follower_id = follower.id
 
@@ -404,36 +642,40 @@ async def handle_callback_buttons(update: Update, context: ContextTypes.DEFAULT_
             await query.answer("You can't follow yourself!", show_alert=True)
             return
 
-        # Save follow action
-        create_follow_action(follower_id, followed_id)
+        # Save follow action; a repeated tap doesn't notify again
+        if not await create_follow_action(follower_id, followed_id):
+            return
 
         # Notify the followed user
-        handle = get_twitter_handle(follower_id)
+        handle = await get_twitter_handle(follower_id)
         name = follower.username or follower.first_name
-        try:
-            await context.bot.send_message(
-                chat_id=followed_id,
-                text=(
-                    f"👤 {name} says they followed you!\n\n"
-                    f"🔗 X Profile: https://x.com/{handle}"
-                ),
-                reply_markup=InlineKeyboardMarkup([
-                    [
-                        InlineKeyboardButton(
-                            "🔁 Follow Back", callback_data=f"followback|{follower_id}"),
-                        InlineKeyboardButton(
-                            "🚫 Ignore", callback_data=f"ignore_follow|{follower_id}")
-                    ]
-                ])
-            )
-        except Exception as e:
-            print(f"❌ Couldn't notify user {followed_id}: {e}")
+        outbound.send_message(
+            chat_id=followed_id,
+            text=(
+                f"👤 {name} says they followed you!\n\n"
+                f"🔗 X Profile: https://x.com/{handle}"
+            ),
+            reply_markup=InlineKeyboardMarkup([
+                [
+                    InlineKeyboardButton(
+                        "🔁 Follow Back", callback_data=f"followback|{follower_id}"),
+                    InlineKeyboardButton(
+                        "🚫 Ignore", callback_data=f"ignore_follow|{follower_id}")
+                ]
+            ])
+        )
+
+        if anchor:
+            edit_board(query, await render_f4f_board(
+                follower_id, **board_cursor("at", anchor[0])))
+            return
 
         # ✅ Edit original message to simple confirmation
-        followed_user = get_user(followed_id)
+        followed_user = await get_user(followed_id)
         followed_name = followed_user.get("name", "this user")
 
-        await query.edit_message_text(
+        outbound.edit_message_text(
+            query,
             text=f"✅ You followed {followed_name}!",
         )
 
@@ -442,67 +684,29 @@ async def handle_callback_buttons(update: Update, context: ContextTypes.DEFAULT_
 
 async def handle_follow_for_follow(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    user_data = get_user(user.id)
+    user_data = await get_user(user.id)
 
     if not user_data:
-        await update.message.reply_text("❗ Please start the bot using /start.")
+        outbound.reply_text(update.message, "❗ Please start the bot using /start.")
         return
 
     twitter_handle = user_data.get("twitter_handle")
     if not twitter_handle:
-        await update.message.reply_text(
+        outbound.reply_text(
+            update.message,
             "❗ You must set your Twitter handle before joining Follow for Follow.\n"
             "Please go to your profile to set it first."
         )
         return
 
-    if is_in_follow_pool(user.id):
-        suggestions = get_follow_suggestions(user.id)
-        if not suggestions:
-            await update.message.reply_text(
-                "📭 No users available to follow at the moment. Try again later!"
-            )
+    if await is_in_follow_pool(user.id):
+        board = await render_f4f_board(user.id)
+        send_board(update.message, board)
+        if board[1] is None:
             return
 
-        await update.message.reply_text(
-            "📋 *Here are users you can follow:*\n\n"
-            "✅ Follow each one and click Done under their name.",
-            parse_mode=ParseMode.MARKDOWN
-        )
-
-        for target in suggestions:
-            target_id = target["telegram_id"]
-            target_handle = target.get("twitter_handle", "")
-            target_name = target.get("name", "Unknown")
-
-            # Get stats
-            follow_count = count_followers(target_id)
-            confirmed_count = count_follow_backs(target_id)
-
-            # Escape dynamic values
-            target_name_safe = escape_markdown(str(target_name))
-            target_handle_safe = escape_markdown(str(target_handle))
-            follow_count_safe = escape_markdown(str(follow_count))
-            confirmed_count_safe = escape_markdown(str(confirmed_count))
-
-            msg = (
-                f"👤 *{target_name_safe}*\n\n"
-                f"🔗 X Profile: https://x.com/{target_handle_safe}\n\n"
-                f"📈 Followed by: *{follow_count_safe}* users\n"
-                f"🔁 Followed back: *{confirmed_count_safe}* users\n\n"
-                f"✅ Follow them and click Done below:"
-            )
-            await update.message.reply_text(
-                msg,
-                parse_mode=ParseMode.MARKDOWN,
-                disable_web_page_preview=False,
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton(
-                        "✅ Done", callback_data=f"followdone|{target_id}")
-                ]])
-            )
-
-        await update.message.reply_text(
+        outbound.reply_text(
+            update.message,
             "💡 When you're done, you can leave the pool or return to the menu:",
             reply_markup=ReplyKeyboardMarkup(
                 [["🚫 Leave Pool"], ["🔙 Back to Menu"]], resize_keyboard=True
@@ -511,7 +715,8 @@ async def handle_follow_for_follow(update: Update, context: ContextTypes.DEFAULT
 
     else:
         context.user_data["awaiting_f4f_join"] = True
-        await update.message.reply_text(
+        outbound.reply_text(
+            update.message,
             "🤝 Join Follow for Follow pool?\n\n"
             "You'll be shown Twitter handles of others who also want to grow. "
             "Follow them and they’ll follow back!\n\n"
@@ -524,84 +729,68 @@ async def handle_follow_for_follow(update: Update, context: ContextTypes.DEFAULT
 
 async def handle_my_ongoing_raids(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    approved_posts = get_user_active_posts(
-        user.id)  # You’ll create this in db.py
-
-    if not approved_posts:
-        await update.message.reply_text("📭 You don’t have any active raids at the moment.")
-        return
-
-    for post in approved_posts:
-        post_id, post_link, approved_at = post
-        expires_at = datetime.fromisoformat(approved_at) + timedelta(hours=24)
-        time_left = expires_at - datetime.utcnow()
-        hours, minutes = divmod(int(time_left.total_seconds() // 60), 60)
-
-        keyboard = InlineKeyboardMarkup([[
-            InlineKeyboardButton("👥 View Responses",
-                                 callback_data=f"responses|{post_id}")
-        ]])
-
-        await update.message.reply_text(
-            f"🧵 *Your Raid*\n🔗 {post_link}\n⏳ Time left: {hours}h {minutes}m",
-            parse_mode=ParseMode.MARKDOWN,
-            reply_markup=keyboard,
-            disable_web_page_preview=True
-        )
+    send_board(update.message, await render_my_raids_board(user.id))
 
 
 async def handle_raid_participation(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle raid completion and ask post owner for confirmation (no API check)"""
     query = update.callback_query
-    await query.answer()
     user = query.from_user
-    post_id = int(query.data.split("|")[1])
+    # Raid posts sent before the boards were paginated carry no page anchor;
+    # those re-render the first page.
+    _, post_id, *anchor = query.data.split("|")
+    post_id = int(post_id)
+    anchor = anchor[0] if anchor else ""
+
+    async def alert(text: str):
+        # Leave the raid board intact; problems are shown as a popup.
+        await query.answer(text, show_alert=True)
 
-    user_data = get_user(user.id)
+    user_data = await get_user(user.id)
     if not user_data:
-        await query.edit_message_text("❌ You need to /start first.")
+        await alert("❌ You need to /start first.")
         return
 
     if not user_data.get("twitter_handle"):
-        await query.edit_message_text("❌ You need to send your Twitter handle first.")
+        await alert("❌ You need to send your Twitter handle first.")
         return
 
-    if has_completed_post(user.id, post_id):
-        await query.edit_message_text("✅ You've already submitted this raid.")
+    if await has_completed_post(user.id, post_id):
+        await alert("✅ You've already submitted this raid.")
         return
 
-    tweet_link = get_post_link_by_id(post_id)
+    tweet_link = await get_post_link_by_id(post_id)
 
     if not tweet_link or not ("twitter.com" in tweet_link or "x.com" in tweet_link):
-        await query.edit_message_text("❌ Invalid tweet link. It must be from Twitter or X.")
+        await alert("❌ Invalid tweet link. It must be from Twitter or X.")
         return
 
     tweet_id = extract_tweet_id(tweet_link)
     if not tweet_id:
-        await query.edit_message_text("❌ Unable to extract tweet ID. Make sure it's a full link.")
+        await alert("❌ Unable to extract tweet ID. Make sure it's a full link.")
         return
 
-    post_owner = get_post_owner_id(post_id)
+    post_owner = await get_post_owner_id(post_id)
     if not post_owner:
-        await query.edit_message_text("⚠️ Could not find the post owner.")
+        await alert("⚠️ Could not find the post owner.")
         return
 
     if post_owner == user.id:
-        await query.edit_message_text("❌ You cannot participate in your own raid.")
+        await alert("❌ You cannot participate in your own raid.")
         return
 
     # Mark the post as completed (pending confirmation)
-    mark_post_completed(user.id, post_id)
+    await mark_post_completed(user.id, post_id)
 
     # Create a verification entry for manual confirmation
-    create_verification(post_id, user.id, post_owner)
+    await create_verification(post_id, user.id, post_owner)
     twitter_handle = user_data.get("twitter_handle", "N/A")
     timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
     naija_time = datetime.now(pytz.timezone(
         "Africa/Lagos")).strftime("%Y-%m-%d %I:%M %p")
     # Notify the post owner for approval
 
-    verifications = get_verifications_for_post(post_id)
+    verifications = await get_verifications_for_post(post_id)
     status = None
     for v in verifications:
         if v[0] == user.id:  # v[0] = doer_id
@@ -618,7 +807,7 @@ async def handle_raid_participation(update: Update, context: ContextTypes.DEFAUL
                 "❌ Reject", callback_data=f"vreject|{post_id}|{user.id}")
         ]]
 
-    await context.bot.send_message(
+    outbound.send_message(
         chat_id=post_owner,
         text=(
             f"📣 {user.username or user.full_name} says they've completed your raid:\n"
@@ -631,37 +820,16 @@ async def handle_raid_participation(update: Update, context: ContextTypes.DEFAUL
         reply_markup=InlineKeyboardMarkup(buttons) if buttons else None
     )
 
-    await query.edit_message_text("✅ Raid submitted. Waiting for the post owner to confirm.")
+    await query.answer("✅ Raid submitted. Waiting for the post owner to confirm.")
+    edit_board(query, await render_raid_board(
+        user.id, query.message.chat, **board_cursor("at", anchor)))
 
 
 async def handle_view_responses(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Already answered by handle_callback_buttons
     query = update.callback_query
-    await query.answer()
     post_id = int(query.data.split("|")[1])
-    verifications = get_verifications_for_post(post_id)  # define this in db.py
-
-    if not verifications:
-        await query.edit_message_text("📭 No responses for this raid yet.")
-        return
-
-    for v in verifications:
-        doer_id, raider_username, raider_handle, status = v
-        name = f"{raider_username}\n\n" if raider_username else f"User {doer_id}"
-        handle = f"X: (@{raider_handle})" if raider_handle else ""
-        label = f"{name} {handle} — Status: {status or 'Pending'}"
-
-        # Only show buttons if still pending
-        if status == "pending":
-            keyboard = InlineKeyboardMarkup([[
-                InlineKeyboardButton(
-                    "✅ Confirm", callback_data=f"vconfirm|{post_id}|{doer_id}"),
-                InlineKeyboardButton(
-                    "❌ Reject", callback_data=f"vreject|{post_id}|{doer_id}")
-            ]])
-        else:
-            keyboard = None  # No buttons for confirmed/rejected
-
-        await query.message.reply_text(label, reply_markup=keyboard)
+    send_board(query.message, await render_responses_board(post_id))
 
 
 # ────────────────────────── MESSAGE HANDLERS ─────────────────
@@ -679,9 +847,10 @@ async def handle_message_buttons(update: Update, context: ContextTypes.DEFAULT_T
         await handle_follow_for_follow(update, context)
 
     elif txt == "✅ Join Now":
-        user_data = get_user(user.id)
+        user_data = await get_user(user.id)
         if not user_data or not user_data.get("twitter_handle"):
-            await update.message.reply_text(
+            outbound.reply_text(
+                update.message,
                 "❗ You must connect your Twitter account before joining Follow for Follow.\n\n"
                 "🔗 Tap below to connect:",
                 reply_markup=InlineKeyboardMarkup([
@@ -691,29 +860,32 @@ async def handle_message_buttons(update: Update, context: ContextTypes.DEFAULT_T
             )
             return
 
-        join_follow_pool(user.id, user_data["twitter_handle"])
+        await join_follow_pool(user.id, user_data["twitter_handle"])
         context.user_data["awaiting_f4f_join"] = False
-        await update.message.reply_text(
+        outbound.reply_text(
+            update.message,
             "🎉 You’ve joined the Follow for Follow pool!",
             reply_markup=main_kbd(user.id)
         )
 
     elif txt == "🚫 Leave Pool":
-        leave_follow_pool(user.id)
-        await update.message.reply_text(
+        await leave_follow_pool(user.id)
+        outbound.reply_text(
+            update.message,
             "❌ You’ve left the Follow for Follow pool.",
             reply_markup=main_kbd(user.id)
         )
 
     elif txt == "🔙 Back to Menu":
-        await update.message.reply_text("🔙 Back to main menu.", reply_markup=main_kbd(user.id))
+        outbound.reply_text(update.message, "🔙 Back to main menu.", reply_markup=main_kbd(user.id))
 
     elif txt == "🎯 Slots":
         await handle_slots(update, context)
 
     elif txt == "📤 Post":
         context.user_data["awaiting_post"] = True
-        await update.message.reply_text(
+        outbound.reply_text(
+            update.message,
             "📤 *Submit your Twitter/X post link for review:*\n\n"
             "🔗 Please paste a *valid Twitter (twitter.com) or X (x.com) post link* below.\n"
             "Example: https://x.com/Web3Kaiju/status/1901622919777652813",
@@ -749,12 +921,13 @@ async def handle_message_buttons(update: Update, context: ContextTypes.DEFAULT_T
         await handle_my_ongoing_raids(update, context)
 
     elif txt == "📥 Pending Followers":
-        pending = get_pending_followers(user.id)
+        pending = await get_pending_followers(user.id)
         if not pending:
-            await update.message.reply_text("📭 No one has followed you recently.")
+            outbound.reply_text(update.message, "📭 No one has followed you recently.")
         else:
             for follower_id, name, handle in pending:
-                await update.message.reply_text(
+                outbound.reply_text(
+                    update.message,
                     f"👤 @{handle or name} followed you.\nClick below to respond.",
                     reply_markup=InlineKeyboardMarkup([[
                         InlineKeyboardButton(
@@ -766,7 +939,8 @@ async def handle_message_buttons(update: Update, context: ContextTypes.DEFAULT_T
 
     else:
         context.user_data["awaiting_post"] = False  # optional cleanup
-        await update.message.reply_text(
+        outbound.reply_text(
+            update.message,
             "❓ I didn't understand that. Choose an option:",
             reply_markup=main_kbd(user.id)
         )
@@ -778,11 +952,12 @@ async def handle_ongoing_raids(update: Update, context: ContextTypes.DEFAULT_TYP
     """Handle ongoing raids display"""
     user = update.effective_user
     chat = update.effective_chat
-    user_data = get_user(user.id)
+    user_data = await get_user(user.id)
 
     if not user_data:
         username = html.escape(user.username or user.first_name)
-        await update.message.reply_text(
+        outbound.reply_text(
+            update.message,
             f"👋 <b>@{username}</b>, please start the bot in private:<br>"
             f"<a href='https://t.me/{context.bot.username}?start={user.id}'>Click here</a>",
             parse_mode=ParseMode.HTML,
@@ -794,7 +969,8 @@ async def handle_ongoing_raids(update: Update, context: ContextTypes.DEFAULT_TYP
     if not user_data.get("twitter_handle"):
         if chat.type != "private":
             username = html.escape(user.username or user.first_name)
-            await update.message.reply_text(
+            outbound.reply_text(
+                update.message,
                 f"❗️<b>@{username}</b>, to join raids, please message the bot privately first:<br>"
                 f"👉 <a href='https://t.me/{context.bot.username}?start={user.id}'>Click here to set your Twitter handle</a><br><br>"
                 f"Then tap <b>🔥 Ongoing Raids</b> to continue.",
@@ -803,7 +979,8 @@ async def handle_ongoing_raids(update: Update, context: ContextTypes.DEFAULT_TYP
             )
             return
         else:
-            await update.message.reply_text(
+            outbound.reply_text(
+                update.message,
                 "🐦 To join raids, please connect your Twitter account first:",
                 reply_markup=InlineKeyboardMarkup([
                     [InlineKeyboardButton(
@@ -813,71 +990,26 @@ async def handle_ongoing_raids(update: Update, context: ContextTypes.DEFAULT_TYP
             return
 
     # Continue with showing raids
-    group_id = chat.id if chat.type in ("group", "supergroup") else None
-    posts = get_recent_approved_posts(group_id=group_id, with_time=True)
-
-    if not posts:
-        await update.message.reply_text("🚫 No active raids in the last 24 hours.")
-    else:
-        for post_id, post_link, name, approved_at_str in posts:
-            try:
-                approved_at = datetime.fromisoformat(approved_at_str)
-                if approved_at.tzinfo is None:
-                    approved_at = approved_at.replace(tzinfo=dt_timezone.utc)
-            except Exception:
-                await update.message.reply_text(f"⚠️ Skipping a post due to time error: {approved_at_str}")
-                continue
-
-            expires_at = approved_at + timedelta(hours=24)
-            now = datetime.now(dt_timezone.utc)
-            time_left = expires_at - now
-
-            if time_left.total_seconds() <= 0:
-                continue  # Skip expired
-
-            hours_left = int(time_left.total_seconds() // 3600)
-            minutes_left = int((time_left.total_seconds() % 3600) // 60)
-            time_left_str = f"{hours_left}h {minutes_left}m left"
-
-            if has_completed_post(user.id, post_id):
-                status = "✅ You’ve already joined this raid."
-                keyboard = None
-            else:
-                status = "❌ You haven’t joined this raid yet."
-                keyboard = InlineKeyboardMarkup([
-                    [InlineKeyboardButton(
-                        "✅ Done", callback_data=f"done|{post_id}")]
-                ])
-
-            escaped_name = html.escape(name)
-            escaped_link = html.escape(post_link)
-
-            await update.message.reply_text(
-                f"🔥 <b>New Raid by {name}</b>\n\n"
-                f"🔗 <a href=\"{post_link}\">{post_link}</a>\n\n"
-                f"{status}\n🕒 <b>Time Left:</b> {time_left_str}",
-                reply_markup=keyboard,
-                parse_mode="HTML",
-                disable_web_page_preview=True
-            )
+    send_board(update.message, await render_raid_board(user.id, chat))
 
 
 async def handle_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle profile display"""
     user = update.effective_user
-    user_data = get_user(user.id)
+    user_data = await get_user(user.id)
 
     if not user_data:
-        await update.message.reply_text("❗️User not found. Please start the bot using /start.")
+        outbound.reply_text(update.message, "❗️User not found. Please start the bot using /start.")
         return
 
-    stats = get_user_stats(user.id)
+    stats = await get_user_stats(user.id)
     approved, rejected, task_slots, ref_slots = stats
 
     twitter = user_data.get("twitter_handle")
     twitter_display = f"@{escape_markdown(twitter)}" if twitter else "❌ Not connected"
 
-    await update.message.reply_text(
+    outbound.reply_text(
+        update.message,
         f"👤 *Your Profile*\n\n"
         f"🐦 Twitter: {twitter_display}\n\n"
         f"✅ Approved Posts: {approved}\n"
@@ -889,7 +1021,8 @@ async def handle_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
     if not twitter:
-        await update.message.reply_text(
+        outbound.reply_text(
+            update.message,
             "🔗 You haven't connected your Twitter account yet.",
             reply_markup=InlineKeyboardMarkup([[
                 InlineKeyboardButton(
@@ -901,8 +1034,9 @@ async def handle_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def handle_slots(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle slots display"""
     user = update.effective_user
-    slots = get_user_slots(user.id)
-    await update.message.reply_text(
+    slots = await get_user_slots(user.id)
+    outbound.reply_text(
+        update.message,
         f"🎯 *Slot Info*\n\nHi {user.first_name}, you have *{slots}* engagement slot(s).\n\n"
         "📌 Earn more slots by participating in raids or referring others!",
         parse_mode=ParseMode.MARKDOWN
@@ -912,11 +1046,12 @@ async def handle_slots(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def handle_post_submission(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle post submission"""
     user = update.effective_user
-    user_data = get_user(user.id)
+    user_data = await get_user(user.id)
 
     # 🔒 Check if user is banned from posting
-    if is_user_banned(user.id):
-        await update.message.reply_text(
+    if await is_user_banned(user.id):
+        outbound.reply_text(
+            update.message,
             "⛔ You are temporarily banned from posting due to unverified raids.\n"
             "📆 You can post again after 48 hours.",
             parse_mode=ParseMode.MARKDOWN
@@ -928,7 +1063,8 @@ async def handle_post_submission(update: Update, context: ContextTypes.DEFAULT_T
 
     # 🔗 Validate tweet link
     if not is_valid_tweet_link(text):
-        await update.message.reply_text(
+        outbound.reply_text(
+            update.message,
             "❌ Invalid tweet link. Only links from *twitter.com* or *x.com* are allowed.\n"
             "Please send a valid Twitter/X post link:",
             parse_mode=ParseMode.MARKDOWN
@@ -937,9 +1073,10 @@ async def handle_post_submission(update: Update, context: ContextTypes.DEFAULT_T
 
     # ⏳ Check 12-hour cooldown
     cooldown_hours = 12
-    in_cooldown, remaining = is_in_cooldown(user.id, cooldown_hours)
+    in_cooldown, remaining = await is_in_cooldown(user.id, cooldown_hours)
     if in_cooldown:
-        await update.message.reply_text(
+        outbound.reply_text(
+            update.message,
             f"⏳ You can only submit one post every {cooldown_hours} hours.\n"
             f"🕒 Please wait {remaining} more before submitting again."
         )
@@ -949,13 +1086,14 @@ async def handle_post_submission(update: Update, context: ContextTypes.DEFAULT_T
     chat = update.effective_chat
     group_id = chat.id if chat.type in ("group", "supergroup") else None
     print("✅ About to save post")
-    save_post(user.id, text, group_id=group_id)
+    await save_post(user.id, text, group_id=group_id)
     print("✅ Post saved")
-    update_last_post_time(user.id)
+    await update_last_post_time(user.id)
     context.user_data["awaiting_post"] = False
 
     # ✅ Notify user
-    await update.message.reply_text(
+    outbound.reply_text(
+        update.message,
         "✅ Your post has been submitted for review. You'll be notified when it's approved.",
         reply_markup=main_kbd(user.id),
     )
@@ -963,22 +1101,20 @@ async def handle_post_submission(update: Update, context: ContextTypes.DEFAULT_T
     # 📢 Notify admins
     name = user.full_name
     for admin_id in ADMINS:
-        try:
-            await context.bot.send_message(
-                chat_id=admin_id,
-                text=f"📬 New post submitted by *{name}*:\n{text}",
-                parse_mode=ParseMode.MARKDOWN
-            )
-        except Exception as e:
-            print(f"[ADMIN NOTIFY ERROR] Admin ID: {admin_id} - {e}")
+        outbound.send_message(
+            chat_id=admin_id,
+            text=f"📬 New post submitted by *{name}*:\n{text}",
+            parse_mode=ParseMode.MARKDOWN
+        )
 
 
 async def post_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data["awaiting_post"] = True
-    await update.message.reply_text("📨 Please send the Twitter/X post link you'd like to submit.")
+    outbound.reply_text(update.message, "📨 Please send the Twitter/X post link you'd like to submit.")
 
     # First-time call to /post or menu button
-    await update.message.reply_text(
+    outbound.reply_text(
+        update.message,
         "📤 *Submit your Twitter/X post link for review:*\n\n"
         "🔗 Please paste a *valid Twitter (twitter.com) or X (x.com) post link* below.\n"
         "Example: https://x.com/Web3Kaiju/status/1901622919777652813",
@@ -997,28 +1133,38 @@ async def handle_stats_backup(update: Update, context: ContextTypes.DEFAULT_TYPE
     db_path = "bot_data.db"  # or your actual DB file path
 
     if not os.path.exists(db_path):
-        await update.message.reply_text("❌ Database file not found.")
+        outbound.reply_text(update.message, "❌ Database file not found.")
         return
 
-    await update.message.reply_document(
-        document=open(db_path, "rb"),
-        filename="bot_data_backup.db",
-        caption="📦 Here is the current bot_data.db backup.\nYou can restore it after redeploying.",
-    )
+    # The live file may be missing commits still sitting in the WAL, so send a
+    # snapshot taken through SQLite's backup API instead of the raw file.
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_path = os.path.join(tmp, "bot_data_backup.db")
+        await run_sync(backup_database, snapshot_path)
+        with open(snapshot_path, "rb") as snapshot:
+            # Bytes, not the file object: a retried send would re-read the
+            # handle from EOF and upload an empty file.
+            await outbound.reply_document(
+                update.message,
+                snapshot.read(),
+                filename="bot_data_backup.db",
+                caption="📦 Here is the current bot_data.db backup.\nYou can restore it after redeploying.",
+            )
 
 
 async def handle_referrals(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle referral program"""
     user = update.effective_user
-    user_data = get_user(user.id)
+    user_data = await get_user(user.id)
     if not user_data:
-        await update.message.reply_text("❗ You need to start the bot with /start first.")
+        outbound.reply_text(update.message, "❗ You need to start the bot with /start first.")
         return
 
     ref_link = f"https://t.me/{context.bot.username}?start={user.id}"
     ref1 = user_data["ref_count_l1"] if user_data else 0
 
-    await update.message.reply_text(
+    outbound.reply_text(
+        update.message,
         "📨 *Referral Program*\n\n"
         "🎯 Invite others and earn *0.2 engagement slot* per referral!\n\n"
         f"🔗 Your referral link:\n`{ref_link}`\n\n"
@@ -1029,7 +1175,8 @@ async def handle_referrals(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def handle_support(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle support request"""
-    await update.message.reply_text(
+    outbound.reply_text(
+        update.message,
         "🎧 *Need help with the Bot?*\n\n"
         "Tap the button below to chat with us:",
         parse_mode=ParseMode.MARKDOWN,
@@ -1041,7 +1188,8 @@ async def handle_support(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def handle_contacts(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle contact information"""
-    await update.message.reply_text(
+    outbound.reply_text(
+        update.message,
         "📩 *Contact Us:*\n\n"
         "📧 web3kaiju@gmail.com\n"
         "🔗 X: https://x.com/web3kaiju\n"
@@ -1073,63 +1221,111 @@ async def verify_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     telegram_id = query.from_user.id
 
     # Check if user already completed this post
-    if has_completed_post(telegram_id, post_id):
-        await query.edit_message_text("❗️You've already completed this raid.")
+    if await has_completed_post(telegram_id, post_id):
+        outbound.edit_message_text(query, "❗️You've already completed this raid.")
         return
 
     # Get post info
     post = get_post(post_id)
     if not post:
-        await query.edit_message_text("❗️This post no longer exists.")
+        outbound.edit_message_text(query, "❗️This post no longer exists.")
         return
 
     tweet_url = post[2]
     tweet_id = tweet_url.split("/")[-1]
 
     # Get user token from DB
-    user = get_user(telegram_id)
+    user = await get_user(telegram_id)
     access_token = user.get("access_token")
 
     if not access_token:
-        await query.edit_message_text("❗️Your Twitter account is not connected.")
+        outbound.edit_message_text(query, "❗️Your Twitter account is not connected.")
         return
 
 
 async def handle_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle cancel action"""
     context.user_data.pop("awaiting_post", None)
-    await update.message.reply_text("Back to main menu.", reply_markup=main_kbd(update.effective_user.id))
+    outbound.reply_text(update.message, "Back to main menu.", reply_markup=main_kbd(update.effective_user.id))
 
 
 def run_flask():
     flask_app.run(host="0.0.0.0", port=8080)
 
+
+async def post_init(app):
+    await outbound.start(app.bot)
+    await outbox_worker.start()
+    await raid_expiry.start()
+    await matchmaker.start()
+
+
+async def post_shutdown(app):
+    await raid_expiry.stop()
+    await outbox_worker.stop()
+    await outbound.stop()
+    for name, stats in job_stats().items():
+        logger.info("🕒 Job %s: %d run(s), %d failed, %d skipped, %d row(s) in total",
+                    name, stats["runs"], stats["failures"], stats["skipped"], stats["rows_total"])
+    stats = update_processor.stats()
+    logger.info("🔀 Updates: %d processed, %d waited on a user/post lock "
+                "(p99 %.1f ms, max %.1f ms)",
+                stats["processed"], stats["contended"],
+                stats["lock_wait_p99"] * 1000, stats["max_lock_wait"] * 1000)
+
 # ─────────────────────────── MAIN ────────────────────────────
 
 
 def main():
     """Start the bot"""
 
+    # Schema changes happen here, once, before anything touches the database.
+    run_migrations()
+
     # Set timezone using pytz and convert with astimezone (required by APScheduler)
     lagos_tz = pytz.timezone("Africa/Lagos")
 
     # Build the app first — don't pass job_queue manually
-    app = ApplicationBuilder().token(API_KEY).build()
+    builder = (
+        ApplicationBuilder().token(API_KEY)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        # Different users' updates run concurrently; one user's stay in order.
+        .concurrent_updates(update_processor)
+        # Same pool size as PTB's default request, plus a trace span per Bot API call.
+        .request(TracedRequest(connection_pool_size=256))
+    )
+    if TELEGRAM_API_BASE_URL:
+        builder = (builder.base_url(f"{TELEGRAM_API_BASE_URL}/bot")
+                   .base_file_url(f"{TELEGRAM_API_BASE_URL}/file/bot"))
+    if BOT_MODE == "webhook":
+        # Updates arrive through the Flask view, not an Updater.
+        builder = builder.updater(None)
+        flask_app.register_blueprint(webhook_blueprint)
+    app = builder.build()
 
     # Configure the job queue scheduler explicitly
     app.job_queue.scheduler.configure(timezone=astimezone(lagos_tz))
 
-    flask_thread = threading.Thread(target=run_flask)
+    # GET /metrics and /traces. Flask refuses new blueprints once it has served
+    # a request, so they are registered before its thread starts.
+    flask_app.register_blueprint(metrics_blueprint)
+    flask_app.register_blueprint(traces_blueprint)
+
+    # Daemon, so the process exits once the bot has shut down.
+    flask_thread = threading.Thread(target=run_flask, daemon=True)
     flask_thread.start()
 
     # Run background tasks
-    run_background_jobs()
+    schedule_jobs(app)
 
     # ─────────────── HANDLERS ───────────────
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("profile", handle_profile))
     app.add_handler(CommandHandler("slots", handle_slots))
     app.add_handler(CommandHandler("review", review_posts))
+    app.add_handler(CommandHandler("traces", handle_traces))
+    app.add_handler(CommandHandler("profiler", handle_profiler))
     app.add_handler(CommandHandler("post", handle_post_submission))
     app.add_handler(CommandHandler("referrals", handle_referrals))
     app.add_handler(CommandHandler("support", handle_support))
@@ -1144,6 +1340,8 @@ def main():
         handle_raid_participation, pattern=r"^done\|"))
     app.add_handler(CallbackQueryHandler(
         admin_callback, pattern=r"^(approve|reject)\|"))
+    app.add_handler(CallbackQueryHandler(
+        handle_board_navigation, pattern=r"^board\|"))
     app.add_handler(CallbackQueryHandler(handle_callback_buttons))
 
     app.add_handler(MessageHandler(
@@ -1151,8 +1349,25 @@ def main():
         handle_message_buttons
     ))
 
-    logger.info("🤖 Bot is running...")
-    app.run_polling()
+    # Every handler and job is timed, and every update traced, from here on.
+    metrics.instrument_application(app, buttons=MENU_BUTTONS)
+    tracer.instrument_application(app)
+    for prefix, stats in (("db_pool", db.pool_stats), ("db_writer", db.writer_stats),
+                          ("db_user_cache", db.user_cache_stats),
+                          ("updates", update_processor.stats), ("outbound", outbound.stats),
+                          ("outbox", outbox_worker.stats), ("raid_expiry", raid_expiry.stats),
+                          ("matchmaker", matchmaker.stats), ("webhook", ingress.stats),
+                          ("tracing", tracer.stats), ("profiler", profiler.stats),
+                          ("jobs", job_stats)):
+        metrics.add_gauges(prefix, stats)
+
+    record_updates(app)
+
+    logger.info("🤖 Bot is running (%s)...", BOT_MODE)
+    if BOT_MODE == "webhook":
+        asyncio.run(run_webhook(app))
+    else:
+        app.run_polling()
 
 
 if __name__ == "__main__":
@@ -1,31 +1,920 @@
+import atexit
+import functools
+import hashlib
+import os
+import queue
 import re
 import sqlite3
-from datetime import datetime, timedelta
+import threading
+import time
+import traceback
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from metrics import metrics
 
 DB_FILE = "bot_data.db"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_HEALTH_CHECK_INTERVAL", "30"))
+DB_PROFILE = os.getenv("DB_PROFILE", "default")
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "256"))
+DB_WRITE_BATCH_WINDOW = float(os.getenv("DB_WRITE_BATCH_WINDOW", "0"))
+
+# ───── Storage Profiles ──────────────────────────────────
+
+# PRAGMAs applied to every connection. journal_mode is persistent in the file;
+# the rest are per-connection. Pick one with DB_PROFILE.
+STORAGE_PROFILES = {
+    # WAL + NORMAL: readers never block on the writer, and a commit only
+    # fsyncs at checkpoints. A power cut can lose the last few commits but
+    # never corrupts the file.
+    "default": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 64 * 1024 * 1024,
+        "cache_size": -16000,      # KiB, i.e. ~16 MB per connection
+        "busy_timeout": 5000,      # ms
+        "temp_store": "MEMORY",
+    },
+    # WAL + FULL: every group commit is fsynced.
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "mmap_size": 64 * 1024 * 1024,
+        "cache_size": -16000,
+        "busy_timeout": 10000,
+        "temp_store": "MEMORY",
+    },
+    # The old behaviour: rollback journal, SQLite defaults.
+    "legacy": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+    },
+}
+
+
+def apply_storage_profile(conn: sqlite3.Connection, profile: str | None = None):
+    """Apply the PRAGMAs of a storage profile to a connection."""
+    pragmas = STORAGE_PROFILES[profile or DB_PROFILE]
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+_connection_hooks = []
+
+
+def add_connection_hook(fn):
+    """Call `fn(conn)` on every pool or writer connection opened from now on."""
+    _connection_hooks.append(fn)
+
+
+def _open_connection(db_file: str, timeout: float, **kwargs) -> sqlite3.Connection:
+    """Open a connection for the pool or the writer: profile PRAGMAs, then hooks."""
+    conn = sqlite3.connect(db_file, timeout=timeout, check_same_thread=False, **kwargs)
+    apply_storage_profile(conn)
+    for fn in _connection_hooks:
+        fn(conn)
+    return conn
+
+# ───── Connection Pool ───────────────────────────────────
+
+
+class ConnectionPool:
+    """Bounded pool of long-lived SQLite connections shared by every thread.
+
+    The PTB event loop, the Flask OAuth thread and the scheduler thread all
+    check connections out of the same pool. A thread that already holds a
+    connection gets the same one back on nested use, so helpers calling other
+    helpers never deadlock on an exhausted pool.
+    """
+
+    def __init__(self, db_file: str, size: int = DB_POOL_SIZE,
+                 timeout: float = DB_POOL_TIMEOUT,
+                 health_check_interval: float = DB_HEALTH_CHECK_INTERVAL):
+        self.db_file = db_file
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._idle = []          # [(conn, last_checked_at)]
+        self._open_count = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._closed = False
+        self._stats = {
+            "acquired": 0,
+            "created": 0,
+            "reused": 0,
+            "discarded": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "health_checks": 0,
+            "health_check_failures": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+        }
+
+    def _open(self) -> sqlite3.Connection:
+        conn = _open_connection(self.db_file, self.timeout)
+        self._stats["created"] += 1
+        return conn
+
+    def _is_healthy(self, conn: sqlite3.Connection) -> bool:
+        self._stats["health_checks"] += 1
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            self._stats["health_check_failures"] += 1
+            return False
+
+    def _discard(self, conn: sqlite3.Connection):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._cond:
+            self._open_count -= 1
+            self._stats["discarded"] += 1
+            self._cond.notify()
+
+    def acquire(self) -> sqlite3.Connection:
+        """Check out a connection, waiting up to `timeout` seconds for one."""
+        started = time.perf_counter()
+        deadline = started + self.timeout
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("Connection pool is closed")
+                if self._idle:
+                    conn, last_checked = self._idle.pop()
+                    break
+                if self._open_count < self.size:
+                    self._open_count += 1
+                    conn, last_checked = None, None
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise TimeoutError(
+                        f"No database connection free after {self.timeout}s "
+                        f"(pool size {self.size})")
+                waited = True
+                self._cond.wait(remaining)
+
+            wait_time = time.perf_counter() - started
+            self._stats["acquired"] += 1
+            if waited:
+                self._stats["waits"] += 1
+                self._stats["wait_time_total"] += wait_time
+                self._stats["wait_time_max"] = max(
+                    self._stats["wait_time_max"], wait_time)
+
+        if conn is None:
+            try:
+                return self._open()
+            except Exception:
+                with self._cond:
+                    self._open_count -= 1
+                    self._cond.notify()
+                raise
+
+        if time.monotonic() - last_checked > self.health_check_interval:
+            if not self._is_healthy(conn):
+                self._discard(conn)
+                return self.acquire()
+
+        self._stats["reused"] += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool, rolling back any open transaction."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = None
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+
+        with self._cond:
+            if self._closed:
+                self._open_count -= 1
+                conn.close()
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Yield a pooled connection; commit on success, roll back on error.
+
+        Re-entrant per thread: nested use returns the connection the thread
+        already holds and leaves commit/rollback to the outermost block.
+        """
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            yield held
+            return
+
+        conn = self.acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._local.conn = None
+            self.release(conn)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open_count -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            conn.close()
+
+    def stats(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(
+                size=self.size,
+                open=self._open_count,
+                idle=len(self._idle),
+                in_use=self._open_count - len(self._idle),
+            )
+        waits = stats["waits"]
+        stats["wait_time_avg"] = stats["wait_time_total"] / waits if waits else 0.0
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide pool, creating it for DB_FILE on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_FILE)
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def pool_stats() -> dict:
+    return get_pool().stats()
+
+
+def _connect():
+    return get_pool().connection()
+
+# ───── Single Writer ─────────────────────────────────────
+
+
+class WriteQueue:
+    """One writer thread that applies queued mutations in group commits.
+
+    Every mutation is a callable taking the writer's connection. The thread
+    drains whatever is queued (up to DB_WRITE_BATCH_SIZE), runs each callable
+    inside its own SAVEPOINT so one failure doesn't sink the batch, and then
+    commits the whole batch at once. Callers block on (or await) a Future that
+    resolves only after the commit.
+    """
+
+    def __init__(self, batch_size: int = DB_WRITE_BATCH_SIZE,
+                 batch_window: float = DB_WRITE_BATCH_WINDOW):
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._conn = None
+        self._lock = threading.Lock()
+        self._after_commit = []
+        self._stats = {
+            "submitted": 0,
+            "applied": 0,
+            "failed": 0,
+            "commits": 0,
+            "commit_failures": 0,
+            "max_batch": 0,
+            "commit_time_total": 0.0,
+        }
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._conn = _open_connection(DB_FILE, DB_POOL_TIMEOUT, isolation_level=None)
+                self._thread = threading.Thread(
+                    target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def on_writer_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def submit(self, fn) -> Future:
+        """Queue `fn(conn)` and return a Future for its result."""
+        future = Future()
+        if self.on_writer_thread():
+            # Mutation issued from inside another mutation: same transaction.
+            try:
+                future.set_result(fn(self._conn))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        self._ensure_started()
+        self._stats["submitted"] += 1
+        self._queue.put((fn, future))
+        return future
+
+    def run(self, fn):
+        """Queue `fn(conn)` and block until its batch has committed."""
+        return self.submit(fn).result()
+
+    def after_commit(self, fn):
+        """Call `fn()` once the current batch commits (immediately off the writer)."""
+        if self.on_writer_thread():
+            self._after_commit.append(fn)
+        else:
+            fn()
+
+    def _run_after_commit(self):
+        hooks, self._after_commit = self._after_commit, []
+        for fn in hooks:
+            try:
+                fn()
+            except Exception as e:
+                # Hooks invalidate caches and feed the expiry and matchmaking
+                # listeners; keep going, but leave the traceback behind.
+                print(f"❌ after-commit hook {getattr(fn, '__qualname__', fn)} failed: {e}")
+                traceback.print_exc()
+
+    def _collect_batch(self, first):
+        batch = [first]
+        deadline = time.perf_counter() + self.batch_window
+        while len(batch) < self.batch_size:
+            try:
+                remaining = deadline - time.perf_counter()
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)   # let the run loop see the stop marker
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        conn = self._conn
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = self._collect_batch(first)
+            results = []
 
-# ───── Twitter Handle Helpers ────────────────────────────
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+            except sqlite3.Error as e:
+                self._stats["commit_failures"] += 1
+                for _, future in batch:
+                    if future.set_running_or_notify_cancel():
+                        future.set_exception(e)
+                continue
+
+            for fn, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT op")
+                try:
+                    result = fn(conn)
+                    conn.execute("RELEASE op")
+                    results.append((future, result, None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO op")
+                    conn.execute("RELEASE op")
+                    results.append((future, None, e))
+
+            started = time.perf_counter()
+            try:
+                conn.execute("COMMIT")
+            except Exception as e:
+                self._stats["commit_failures"] += 1
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                self._run_after_commit()
+                for future, _, _ in results:
+                    future.set_exception(e)
+                continue
+
+            self._run_after_commit()
+            self._stats["commits"] += 1
+            self._stats["commit_time_total"] += time.perf_counter() - started
+            self._stats["max_batch"] = max(self._stats["max_batch"], len(batch))
+            for future, result, error in results:
+                if error is None:
+                    self._stats["applied"] += 1
+                    future.set_result(result)
+                else:
+                    self._stats["failed"] += 1
+                    future.set_exception(error)
+
+        conn.close()
+
+    def close(self):
+        """Flush everything queued so far and stop the writer thread."""
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._queue.put(None)
+            thread.join()
+            self._thread = None
+            self._conn = None
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        commits = stats["commits"]
+        stats["queue_depth"] = self._queue.qsize()
+        stats["avg_batch"] = (stats["applied"] + stats["failed"]) / commits if commits else 0.0
+        return stats
+
+
+_writer = WriteQueue()
+atexit.register(lambda: _writer.close())
+
+
+def writer_stats() -> dict:
+    return _writer.stats()
+
+
+def close_writer():
+    _writer.close()
+
+
+def backup_database(dest_path: str):
+    """Write a consistent snapshot of the live database (WAL included) to dest_path."""
+    dest = sqlite3.connect(dest_path)
+    try:
+        with _connect() as conn:
+            conn.backup(dest)
+    finally:
+        dest.close()
+
+
+def _write(fn):
+    """Run `fn(conn)` on the writer thread and return its result once committed."""
+    return _writer.run(fn)
+
+
+def _mutation(fn):
+    """Decorator for helpers whose first parameter is the writer's connection.
+
+    Callers use the helper without `conn`; `helper.submit(...)` queues it and
+    returns a Future instead of blocking.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return _writer.run(lambda conn: fn(conn, *args, **kwargs))
+
+    wrapper.submit = lambda *args, **kwargs: _writer.submit(
+        lambda conn: fn(conn, *args, **kwargs))
+    return wrapper
+
+# ───── User Cache ────────────────────────────────────────
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+
+
+class UserCache:
+    """LRU + TTL cache of `users` rows keyed by telegram_id.
+
+    Every mutator that touches a users row calls `_invalidate_user`, which runs
+    after the writer commits. Reads started before an invalidation are not
+    allowed to re-populate the cache with what they saw (see `generation`).
+    """
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()   # telegram_id -> (expires_at, row)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, telegram_id):
+        """Return (True, row) on a hit, (False, None) on a miss."""
+        with self._lock:
+            entry = self._data.get(telegram_id)
+            if entry is not None:
+                expires_at, row = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(telegram_id)
+                    self._stats["hits"] += 1
+                    return True, row
+                del self._data[telegram_id]
+                self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            return False, None
+
+    def put(self, telegram_id, row, generation: int):
+        with self._lock:
+            if generation != self._generation:
+                return   # a write landed while this row was being read
+            self._data[telegram_id] = (time.monotonic() + self.ttl, row)
+            self._data.move_to_end(telegram_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, telegram_id):
+        with self._lock:
+            self._generation += 1
+            self._stats["invalidations"] += 1
+            self._data.pop(telegram_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats, size=len(self._data), maxsize=self.maxsize)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+_user_cache = UserCache()
+
+
+def user_cache_stats() -> dict:
+    return _user_cache.stats()
+
+
+def _invalidate_user(telegram_id):
+    if telegram_id is None:
+        return
+    telegram_id = int(telegram_id)
+    _writer.after_commit(lambda: _user_cache.invalidate(telegram_id))
+
+
+def _cached_user(telegram_id) -> dict | None:
+    """Read-through lookup of a full users row."""
+    hit, row = _user_cache.get(telegram_id)
+    if hit:
+        return row
+
+    generation = _user_cache.generation
+    with _connect() as conn:
+        c = conn.cursor()
+        c.row_factory = sqlite3.Row
+        found = c.execute(
+            "SELECT * FROM users WHERE telegram_id = ?", (telegram_id,)
+        ).fetchone()
+    row = dict(found) if found else None
+    _user_cache.put(telegram_id, row, generation)
+    return row
+
+# ───── Timestamps ────────────────────────────────────────
+# Every time column holds integer Unix epoch seconds (UTC): range predicates
+# are plain integer comparisons an index can serve, and nothing parses
+# strings per row. migrations.py converts older text timestamps in place.
+
+HOUR = 3600
+
+
+def now_ts() -> int:
+    """The current time in the format of every time column."""
+    return int(time.time())
+
+
+def format_duration(seconds: int) -> str:
+    """Whole hours and minutes left, e.g. "3h 5m"."""
+    hours, minutes = divmod(max(0, int(seconds)) // 60, 60)
+    return f"{hours}h {minutes}m"
+
+
+# ───── Pagination ────────────────────────────────────────
+
+# rows: this page; has_prev/has_next: whether the board should offer buttons.
+Page = namedtuple("Page", "rows has_prev has_next")
+
+
+def _keyset_page(conn, query: str, params, key, limit: int,
+                 after=None, before=None, start=None, descending=False,
+                 cursor_sql: str = "?") -> Page:
+    """Fetch one page of `query` ordered by the integer column `key`.
+
+    `query` must end in a WHERE clause and select the cursor column first.
+    `after` continues past the last row of the current page, `before` returns
+    the page ending just ahead of the first row, and `start` re-renders a page
+    beginning at (and including) a given key. Only `limit + 1` rows are ever
+    read, so every page costs the same no matter how deep it is.
+
+    `key` may also be a tuple of columns, compared as a row value; then
+    `cursor_sql` turns the bound cursor (still the first selected column)
+    into a key, e.g. a subquery looking up the row's sort columns by id.
+    """
+    params = list(params)
+    backward = before is not None
+    walk_desc = descending != backward
+    cursor = before if backward else (after if after is not None else start)
+    columns = key if isinstance(key, tuple) else (key,)
+    key_sql = f"({', '.join(columns)})" if len(columns) > 1 else columns[0]
+
+    if cursor is not None:
+        op = "<" if walk_desc else ">"
+        if not backward and after is None:
+            op += "="
+        query += f" AND {key_sql} {op} {cursor_sql}"
+        params.append(cursor)
+    direction = "DESC" if walk_desc else "ASC"
+    query += f" ORDER BY {', '.join(f'{c} {direction}' for c in columns)} LIMIT ?"
+    params.append(limit + 1)
+
+    rows = conn.execute(query, params).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if backward:
+        rows.reverse()
+        return Page(rows, more, True)
+    return Page(rows, cursor is not None, more)
+
+
+# ───── Notification Outbox ───────────────────────────────
+# Notifications are rows in notification_outbox written inside the same
+# transaction as the state change they announce, so a crash can never commit
+# the change and lose the message (or send a message for a rolled-back change).
+# outbox.py drains the table; delivery is at-least-once and dedupe_key stops
+# the same event from being queued twice.
+
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+
+_outbox_listeners = []
+
+
+def add_outbox_listener(fn):
+    """Call `fn()` after every commit that queued a notification."""
+    _outbox_listeners.append(fn)
+
+
+def _notify_outbox_listeners():
+    for fn in list(_outbox_listeners):
+        fn()
+
+
+def _enqueue_notification(conn, chat_id: int, text: str, dedupe_key: str = None,
+                          parse_mode: str = None) -> bool:
+    """Queue a message inside the caller's transaction. False if deduped."""
+    now = int(time.time())
+    cur = conn.execute("""
+        INSERT OR IGNORE INTO notification_outbox
+            (chat_id, text, parse_mode, dedupe_key, created_at, next_attempt_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (int(chat_id), text, parse_mode, dedupe_key, now, now))
+    if cur.rowcount:
+        _writer.after_commit(_notify_outbox_listeners)
+    return bool(cur.rowcount)
 
 
-def set_twitter_handle(telegram_id: int, handle: str) -> bool:
-    """Sets a user's Twitter handle if not taken by another user"""
-    conn = sqlite3.connect(DB_FILE)
+@_mutation
+def enqueue_notification(conn, chat_id: int, text: str, dedupe_key: str = None,
+                         parse_mode: str = None) -> bool:
+    return _enqueue_notification(conn, chat_id, text, dedupe_key, parse_mode)
+
+
+@_mutation
+def claim_notifications(conn, limit: int = 50) -> list:
+    """Lease up to `limit` due notifications for delivery.
+
+    A claimed row is hidden for OUTBOX_LEASE_SECONDS; if the worker dies
+    before acknowledging it, the row becomes due again and is resent.
+    """
+    now = int(time.time())
     c = conn.cursor()
+    c.row_factory = sqlite3.Row
+    return c.execute("""
+        UPDATE notification_outbox
+        SET attempts = attempts + 1, next_attempt_at = ?
+        WHERE id IN (
+            SELECT id FROM notification_outbox
+            WHERE status = 'pending' AND next_attempt_at <= ?
+            ORDER BY next_attempt_at, id
+            LIMIT ?
+        )
+        RETURNING id, chat_id, text, parse_mode, attempts
+    """, (now + OUTBOX_LEASE_SECONDS, now, limit)).fetchall()
 
-    c.execute(
-        "SELECT 1 FROM users WHERE twitter_handle = ? AND telegram_id != ?",
-        (handle, telegram_id)
-    )
-    if c.fetchone():
-        conn.close()
-        return False
 
-    c.execute(
-        "UPDATE users SET twitter_handle = ?, last_updated = ? WHERE telegram_id = ?",
-        (handle, datetime.utcnow(), telegram_id)
-    )
-    conn.commit()
-    conn.close()
+@_mutation
+def mark_notifications_sent(conn, ids: list[int]):
+    conn.executemany("""
+        UPDATE notification_outbox
+        SET status = 'sent', sent_at = ?, last_error = NULL
+        WHERE id = ?
+    """, [(int(time.time()), i) for i in ids])
+
+
+@_mutation
+def retry_notification(conn, notification_id: int, error: str, delay: float):
+    """Reschedule a failed delivery, or give up after OUTBOX_MAX_ATTEMPTS."""
+    conn.execute("""
+        UPDATE notification_outbox
+        SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+            next_attempt_at = ?, last_error = ?
+        WHERE id = ?
+    """, (OUTBOX_MAX_ATTEMPTS, int(time.time() + delay), error, notification_id))
+
+
+@_mutation
+def fail_notification(conn, notification_id: int, error: str):
+    conn.execute("""
+        UPDATE notification_outbox
+        SET status = 'failed', last_error = ?
+        WHERE id = ?
+    """, (error, notification_id))
+
+
+@_mutation
+def prune_outbox(conn, days: int = 7) -> int:
+    """Delete delivered notifications older than `days`."""
+    return conn.execute("""
+        DELETE FROM notification_outbox
+        WHERE status = 'sent' AND sent_at < ?
+    """, (int(time.time()) - days * 86400,)).rowcount
+
+
+def outbox_stats() -> dict:
+    with _connect() as conn:
+        counts = dict(conn.execute("""
+            SELECT status, COUNT(*) FROM notification_outbox GROUP BY status
+        """).fetchall())
+        oldest = conn.execute("""
+            SELECT MIN(created_at) FROM notification_outbox WHERE status = 'pending'
+        """).fetchone()[0]
+    return {
+        "pending": counts.get("pending", 0),
+        "sent": counts.get("sent", 0),
+        "failed": counts.get("failed", 0),
+        "oldest_pending_age": int(time.time()) - oldest if oldest else 0,
+    }
+
+
+# ───── Raid Deadlines ─────────────────────────────────────
+# Approving a raid stamps posts.expires_at; listeners (expiry.py) hear about
+# each new deadline after the approval commits.
+
+RAID_DURATION = 24 * HOUR
+
+_expiry_listeners = []
+
+
+def add_expiry_listener(fn):
+    """Call `fn(post_id, expires_at)` after each approval commits."""
+    _expiry_listeners.append(fn)
+
+
+def _schedule_expiry(post_id: int, expires_at: int):
+    def notify():
+        for fn in list(_expiry_listeners):
+            fn(post_id, expires_at)
+    _writer.after_commit(notify)
+
+
+# ───── Post State Machine ────────────────────────────────
+# pending → approved | rejected, approved → expired. Each transition is one
+# UPDATE ... WHERE status = <from> RETURNING, so when two callers race for the
+# same post exactly one gets the row back; the other sees nothing and must do
+# nothing (no second slot charge, no second notification).
+
+POST_TRANSITIONS = {
+    ("pending", "approved"),
+    ("pending", "rejected"),
+    ("approved", "expired"),
+}
+
+
+def _transition_posts(conn, from_status: str, to_status: str, where: str,
+                      params=(), returning: str = "id") -> list:
+    """Move every `from_status` post matching `where` to `to_status`.
+
+    Returns the `returning` columns of the posts that actually moved;
+    approvals also stamp approved_at/expires_at and schedule the expiry
+    (`returning` must then start with id).
+    """
+    if (from_status, to_status) not in POST_TRANSITIONS:
+        raise ValueError(f"illegal post transition {from_status} → {to_status}")
+
+    stamps, stamp_params = "", ()
+    if to_status == "approved":
+        approved_at = now_ts()
+        expires_at = approved_at + RAID_DURATION
+        stamps, stamp_params = ", approved_at = ?, expires_at = ?", (approved_at, expires_at)
+
+    rows = conn.execute(f"""
+        UPDATE posts
+        SET status = ?{stamps}
+        WHERE status = ? AND ({where})
+        RETURNING {returning}
+    """, (to_status, *stamp_params, from_status, *params)).fetchall()
+
+    if to_status == "approved":
+        for row in rows:
+            _schedule_expiry(row[0], expires_at)
+    return rows
+
+
+@_mutation
+def transition_post(conn, post_id: int, from_status: str, to_status: str) -> bool:
+    """Move one post along the state machine; False if it wasn't in `from_status`."""
+    return bool(_transition_posts(conn, from_status, to_status, "id = ?", (post_id,)))
+
+
+# ───── Follow Graph Events ───────────────────────────────
+# Pool joins/leaves and follow_actions state changes are reported to listeners
+# (matchmaking.py) after they commit. An edge's state only ever moves forward,
+# pending → ignored → confirmed, so replaying an event is harmless.
+
+FOLLOW_PENDING, FOLLOW_IGNORED, FOLLOW_CONFIRMED = 0, 1, 2
+
+_follow_listeners = []
+
+
+def add_follow_listener(fn):
+    """Call `fn(event, *args)` after each follow-graph change commits.
+
+    Events: ("join", telegram_id), ("leave", telegram_id) and
+    ("edge", follower_id, followed_id, state).
+    """
+    _follow_listeners.append(fn)
+
+
+def _follow_event(event: str, *args):
+    def notify():
+        for fn in list(_follow_listeners):
+            fn(event, *args)
+    _writer.after_commit(notify)
+
+
+# ───── Twitter Handle Helpers ────────────────────────────
+
+
+@_mutation
+def set_twitter_handle(conn, telegram_id: int, handle: str) -> bool:
+    """Sets a user's Twitter handle if not taken by another user.
+
+    The UNIQUE index on twitter_handle is the check: a handle another user
+    holds makes the upsert fail, with no SELECT-then-UPDATE window.
+    """
+    try:
+        conn.execute("""
+            INSERT INTO users (telegram_id, twitter_handle, created_at, last_updated)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (telegram_id) DO UPDATE SET
+                twitter_handle = excluded.twitter_handle,
+                last_updated = excluded.last_updated
+        """, (telegram_id, handle, now_ts(), now_ts()))
+    except sqlite3.IntegrityError:
+        return False
+    _invalidate_user(telegram_id)
     return True
 
 
@@ -35,60 +924,47 @@ def is_valid_tweet_link(link: str) -> bool:
 
 
 def is_user_banned(telegram_id: int) -> bool:
-    conn = sqlite3.connect(DB_FILE)
-    row = conn.execute(
-        "SELECT post_ban_until FROM users WHERE telegram_id = ?",
-        (telegram_id,)
-    ).fetchone()
-    conn.close()
-
-    if row and row[0]:
-        ban_time = datetime.fromisoformat(row[0])
-        return datetime.utcnow() < ban_time
-    return False
+    user = _cached_user(telegram_id)
+    return bool(user and user["post_ban_until"] and now_ts() < user["post_ban_until"])
 
 
 def get_user_active_posts(telegram_id: int):
-    conn = sqlite3.connect(DB_FILE)
-    rows = conn.execute("""
-        SELECT id, post_link, approved_at
-        FROM posts
-        WHERE telegram_id = ? AND status = 'approved'
-        AND approved_at >= datetime('now', '-24 hours')
-    """, (telegram_id,)).fetchall()
-    conn.close()
-    return rows
-
-
-def update_last_post_time(user_id: int):
+    with _connect() as conn:
+        return conn.execute("""
+            SELECT id, post_link, expires_at
+            FROM posts
+            WHERE telegram_id = ? AND status = 'approved' AND expires_at > ?
+        """, (telegram_id, now_ts())).fetchall()
+
+
+def get_user_active_posts_page(telegram_id: int, limit: int = 8,
+                               after=None, before=None, start=None) -> Page:
+    """Newest-first page of get_user_active_posts, keyed on posts.id."""
+    with _connect() as conn:
+        return _keyset_page(conn, """
+            SELECT id, post_link, expires_at
+            FROM posts
+            WHERE telegram_id = ? AND status = 'approved' AND expires_at > ?
+        """, (telegram_id, now_ts()), "id", limit,
+            after=after, before=before, start=start, descending=True)
+
+
+@_mutation
+def update_last_post_time(conn, user_id: int):
     """Update the last post timestamp for a user"""
-    # Implementation depends on your database
-    # Example for SQLite:
-    conn = sqlite3.connect('bot_data.db')
-    c = conn.cursor()
-    c.execute("UPDATE users SET last_post_at = ? WHERE telegram_id = ?",
-              (datetime.utcnow().isoformat(), user_id))
-    conn.commit()
-    conn.close()
+    conn.execute("UPDATE users SET last_post_at = ? WHERE telegram_id = ?",
+                 (now_ts(), user_id))
+    _invalidate_user(user_id)
 
 
 def is_in_cooldown(telegram_id: int, cooldown_hours: int) -> tuple[bool, str | None]:
     """Returns True if user is in cooldown and how much time is left, otherwise False."""
-    conn = sqlite3.connect(DB_FILE)
-    row = conn.execute(
-        "SELECT last_post_at FROM users WHERE telegram_id = ?", (telegram_id,)
-    ).fetchone()
-    conn.close()
-
-    if row and row[0]:
-        last_post_at = datetime.fromisoformat(row[0])
-        time_since_last_post = datetime.utcnow() - last_post_at
-
-        if time_since_last_post.total_seconds() < cooldown_hours * 3600:
-            remaining = timedelta(hours=cooldown_hours) - time_since_last_post
-            hours, remainder = divmod(remaining.seconds, 3600)
-            minutes = remainder // 60
-            return True, f"{hours}h {minutes}m"
+    user = _cached_user(telegram_id)
+
+    if user and user["last_post_at"]:
+        remaining = user["last_post_at"] + cooldown_hours * HOUR - now_ts()
+        if remaining > 0:
+            return True, format_duration(remaining)
     return False, None
 
 
@@ -98,292 +974,398 @@ def get_cooldown_remaining(user_id: int, cooldown_hours: int) -> str:
     if not user_data or not user_data.get("last_post_at"):
         return "0 hours 0 minutes"
 
-    last_post_at = datetime.fromisoformat(user_data["last_post_at"])
-    time_since_last_post = datetime.utcnow() - last_post_at
-    remaining = timedelta(hours=cooldown_hours) - time_since_last_post
+    remaining = max(0, user_data["last_post_at"] + cooldown_hours * HOUR - now_ts())
 
     # Format as "X hours Y minutes"
-    hours = remaining.seconds // 3600
-    minutes = (remaining.seconds % 3600) // 60
+    hours, minutes = divmod(remaining // 60, 60)
     return f"{hours} hours {minutes} minutes"
 
 
 def get_twitter_handle(telegram_id: int) -> str | None:
     """Gets the user's saved Twitter handle"""
-    conn = sqlite3.connect(DB_FILE)
-    row = conn.execute(
-        "SELECT twitter_handle FROM users WHERE telegram_id = ?",
-        (telegram_id,)
-    ).fetchone()
-    conn.close()
-    return row[0] if row and row[0] else None
+    user = _cached_user(telegram_id)
+    return user["twitter_handle"] if user and user["twitter_handle"] else None
 
 # ───── Users ─────────────────────────────────────────────
 
 
-def add_user(telegram_id, name, ref_by=None):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-
-    if c.execute("SELECT 1 FROM users WHERE telegram_id = ?", (telegram_id,)).fetchone():
-        conn.close()
+@_mutation
+def add_user(conn, telegram_id, name, ref_by=None) -> bool:
+    """Register a user; True if this call registered them.
+
+    A row created earlier by save_tokens/set_twitter_handle (no name yet)
+    counts as unregistered, so /start after connecting X still welcomes the
+    user and credits their referrer. The referrer is credited at most once,
+    in the same transaction, and only if they exist.
+    """
+    registered = conn.execute("""
+        INSERT INTO users (telegram_id, name, ref_by, slots, task_slots, ref_count_l1,
+                           created_at, last_updated)
+        VALUES (?, ?, ?, 2, 0, 0, ?, ?)
+        ON CONFLICT (telegram_id) DO UPDATE SET
+            name = excluded.name,
+            ref_by = excluded.ref_by
+        WHERE users.name IS NULL
+        RETURNING ref_by
+    """, (telegram_id, name, ref_by, now_ts(), now_ts())).fetchone()
+    if registered is None:
         return False
+    _invalidate_user(telegram_id)
 
-    c.execute(
-        "INSERT INTO users (telegram_id, name, ref_by, slots, task_slots, ref_count_l1) VALUES (?, ?, ?, 2, 0, 0)",
-        (telegram_id, name, ref_by)
-    )
-
-    if ref_by:
-        c.execute("""
+    if ref_by and ref_by != telegram_id:
+        credited = conn.execute("""
             UPDATE users
             SET slots = slots + 0.2,
                 ref_count_l1 = ref_count_l1 + 1
             WHERE telegram_id = ?
-        """, (ref_by,))
+            RETURNING telegram_id
+        """, (ref_by,)).fetchone()
+        if credited:
+            conn.execute("""
+                INSERT INTO slot_logs (telegram_id, slots, reason, created_at)
+                VALUES (?, ?, 'referral', ?)
+            """, (ref_by, 0.2, now_ts()))
+            _invalidate_user(ref_by)
+    return True
 
-        c.execute("""
-            INSERT INTO slot_logs (telegram_id, slots, reason, created_at)
-            VALUES (?, ?, 'referral', ?)
-        """, (ref_by, 0.2, datetime.utcnow()))
 
-    conn.commit()
-    conn.close()
-    return True
+@_mutation
+def save_tokens(conn, telegram_id, handle, twitter_id, access_token, refresh_token) -> bool:
+    """Store the user's X tokens; True if this created the user row."""
+    telegram_id = int(telegram_id)
+
+    # SQLite's RETURNING can't tell an upsert's insert from its update, so
+    # "new" is an INSERT ... DO NOTHING and the update runs only on conflict.
+    created = conn.execute("""
+        INSERT INTO users (telegram_id, twitter_handle, twitter_id, access_token, refresh_token,
+                           created_at, last_updated)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (telegram_id) DO NOTHING
+        RETURNING telegram_id
+    """, (telegram_id, handle, twitter_id, access_token, refresh_token,
+          now_ts(), now_ts())).fetchone()
+    if created is None:
+        conn.execute("""
+            UPDATE users
+            SET twitter_handle = ?, twitter_id = ?, access_token = ?, refresh_token = ?,
+                last_updated = ?
+            WHERE telegram_id = ?
+        """, (handle, twitter_id, access_token, refresh_token, now_ts(), telegram_id))
+    _invalidate_user(telegram_id)
+
+    # Keyed on the token so a replayed OAuth callback doesn't notify twice.
+    token_key = hashlib.sha256(access_token.encode()).hexdigest()[:16]
+    _enqueue_notification(
+        conn, telegram_id,
+        f"✅ Your Twitter account (@{handle}) has been connected successfully!",
+        dedupe_key=f"twitter-connected:{telegram_id}:{token_key}")
+    return created is not None
 
 
 def get_user(telegram_id):
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    user = conn.execute(
-        "SELECT * FROM users WHERE telegram_id = ?", (telegram_id,)
-    ).fetchone()
-    conn.close()
+    user = _cached_user(telegram_id)
     return dict(user) if user else None
 
 
 def get_user_slots(telegram_id: int) -> int:
-    conn = sqlite3.connect(DB_FILE)
-    row = conn.execute(
-        "SELECT slots FROM users WHERE telegram_id = ?", (telegram_id,)
-    ).fetchone()
-    conn.close()
-    return row[0] if row else 0
-
-
-def deduct_slot_by_admin(telegram_id: int) -> bool:
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    row = c.execute("SELECT slots FROM users WHERE telegram_id = ?",
-                    (telegram_id,)).fetchone()
-    if row and row[0] > 0:
-        c.execute(
-            "UPDATE users SET slots = slots - 1 WHERE telegram_id = ?",
-            (telegram_id,)
-        )
-        conn.commit()
-        conn.close()
-        return True
-    conn.close()
-    return False
-
+    user = _cached_user(telegram_id)
+    return user["slots"] if user else 0
 
-def create_follow_action(follower_id: int, followed_id: int):
-    """Log a follow action between users."""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("""
-        INSERT INTO follow_actions (follower_id, followed_id)
-        VALUES (?, ?)
-    """, (follower_id, followed_id))
-    conn.commit()
-    conn.close()
 
+@_mutation
+def create_follow_action(conn, follower_id: int, followed_id: int) -> bool:
+    """Log a follow action between users. False if it was already logged."""
+    created = bool(conn.execute("""
+        INSERT OR IGNORE INTO follow_actions (follower_id, followed_id, created_at)
+        VALUES (?, ?, ?)
+    """, (follower_id, followed_id, now_ts())).rowcount)
+    if created:
+        _follow_event("edge", follower_id, followed_id, FOLLOW_PENDING)
+    return created
+
+
+@_mutation
+def confirm_follow_back(conn, followed_id: int, follower_id: int,
+                        followed_name: str = None) -> bool:
+    """Mark the follow as confirmed (mutual) and tell the follower."""
+    latest = conn.execute("""
+        SELECT MAX(id) FROM follow_actions
+        WHERE follower_id = ? AND followed_id = ? AND confirmed = 0
+    """, (follower_id, followed_id)).fetchone()[0]
+    if latest is None:
+        return False
 
-def confirm_follow_back(followed_id: int, follower_id: int):
-    """Mark the follow as confirmed (mutual)"""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("""
+    conn.execute("""
         UPDATE follow_actions
         SET confirmed = 1
         WHERE follower_id = ? AND followed_id = ?
     """, (follower_id, followed_id))
-    conn.commit()
-    conn.close()
 
+    row = conn.execute(
+        "SELECT twitter_handle FROM users WHERE telegram_id = ?",
+        (followed_id,)).fetchone()
+    handle = row[0] if row else None
+    _enqueue_notification(
+        conn, follower_id,
+        f"🎉 {followed_name or handle} followed you back!\n\n"
+        f"🔗 View their profile: https://x.com/{handle}",
+        dedupe_key=f"followback:{latest}")
+    _follow_event("edge", follower_id, followed_id, FOLLOW_CONFIRMED)
+    return True
 
-def ignore_follow(followed_id: int, follower_id: int):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("""
+
+@_mutation
+def ignore_follow(conn, followed_id: int, follower_id: int):
+    ignored = conn.execute("""
         UPDATE follow_actions
         SET responded = 1
-        WHERE follower_id = ? AND followed_id = ?
-    """, (follower_id, followed_id))
-    conn.commit()
-    conn.close()
+        WHERE follower_id = ? AND followed_id = ? AND responded = 0
+        RETURNING confirmed
+    """, (follower_id, followed_id)).fetchall()
+    if any(not confirmed for confirmed, in ignored):
+        _follow_event("edge", follower_id, followed_id, FOLLOW_IGNORED)
 
 
 def get_pending_followers(user_id: int):
-    conn = sqlite3.connect(DB_FILE)
-    rows = conn.execute("""
-        SELECT f.follower_id, u.name, u.twitter_handle
-        FROM follow_actions f
-        JOIN users u ON f.follower_id = u.telegram_id
-        WHERE f.followed_id = ? AND f.responded = 0
-    """, (user_id,)).fetchall()
-    conn.close()
-    return rows
+    with _connect() as conn:
+        return conn.execute("""
+            SELECT f.follower_id, u.name, u.twitter_handle
+            FROM follow_actions f
+            JOIN users u ON f.follower_id = u.telegram_id
+            WHERE f.followed_id = ? AND f.responded = 0
+        """, (user_id,)).fetchall()
 
 
-def add_task_slot(telegram_id: int, amount: float):
-    conn = sqlite3.connect(DB_FILE)
+@_mutation
+def add_task_slot(conn, telegram_id: int, amount: float):
     c = conn.cursor()
     c.execute("""
         UPDATE users
         SET task_slots = task_slots + ?, slots = slots + ?, last_updated = ?
         WHERE telegram_id = ?
-    """, (amount, amount, datetime.utcnow(), telegram_id))
+    """, (amount, amount, now_ts(), telegram_id))
 
     c.execute("""
         INSERT INTO slot_logs (telegram_id, slots, reason, created_at)
         VALUES (?, ?, 'task', ?)
-    """, (telegram_id, amount, datetime.utcnow()))
-    conn.commit()
-    conn.close()
+    """, (telegram_id, amount, now_ts()))
+    _invalidate_user(telegram_id)
 
 # ───── Raid Completion ──────────────────────────────────
 
 
 def has_completed_post(telegram_id: int, post_id: int) -> bool:
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute(
-        "SELECT 1 FROM completions WHERE telegram_id = ? AND post_id = ?",
-        (telegram_id, post_id)
-    )
-    result = c.fetchone()
-    conn.close()
+    with _connect() as conn:
+        result = conn.execute(
+            "SELECT 1 FROM completions WHERE telegram_id = ? AND post_id = ?",
+            (telegram_id, post_id)
+        ).fetchone()
     return result is not None
 
 
-def mark_post_completed(telegram_id: int, post_id: int):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("""
+@_mutation
+def mark_post_completed(conn, telegram_id: int, post_id: int):
+    conn.execute("""
         INSERT OR IGNORE INTO completions (telegram_id, post_id, created_at)
         VALUES (?, ?, ?)
-    """, (telegram_id, post_id, datetime.utcnow()))
-    conn.commit()
-    conn.close()
+    """, (telegram_id, post_id, now_ts()))
 
 # ───── Posts ─────────────────────────────────────────────
 
 
-def save_post(telegram_id: int, post_link: str, group_id: int = None):
-    conn = sqlite3.connect(DB_FILE)
+@_mutation
+def save_post(conn, telegram_id: int, post_link: str, group_id: int = None):
     c = conn.cursor()
+    now = now_ts()
     c.execute(
-        "INSERT INTO posts (telegram_id, post_link, group_id, status) VALUES (?, ?, ?, ?)",
-        (telegram_id, post_link, group_id, "pending")
+        "INSERT INTO posts (telegram_id, post_link, group_id, status, submitted_at) VALUES (?, ?, ?, ?, ?)",
+        (telegram_id, post_link, group_id, "pending", now)
     )
     c.execute(
         "UPDATE users SET last_post_at = ? WHERE telegram_id = ?",
-        (datetime.utcnow(), telegram_id)
+        (now, telegram_id)
     )
-    conn.commit()
-    conn.close()
+    _invalidate_user(telegram_id)
 
 
 def get_post_link_by_id(post_id):
-    conn = sqlite3.connect(DB_FILE)
-    row = conn.execute(
-        "SELECT post_link FROM posts WHERE id = ?", (post_id,)
-    ).fetchone()
-    conn.close()
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT post_link FROM posts WHERE id = ?", (post_id,)
+        ).fetchone()
     return row[0] if row else None
 
 
 def get_pending_posts(limit: int = 5):
-    conn = sqlite3.connect(DB_FILE)
-    rows = conn.execute("""
-        SELECT p.id, p.post_link, u.name, p.telegram_id
-        FROM posts p
-        JOIN users u ON u.telegram_id = p.telegram_id
-        WHERE p.status = 'pending'
-        ORDER BY p.submitted_at ASC
-        LIMIT ?
-    """, (limit,)).fetchall()
-    conn.close()
-    return rows
-
-
-def set_post_status(post_id: int, status: str):
-    conn = sqlite3.connect(DB_FILE)
-    if status == "approved":
-        conn.execute("""
-            UPDATE posts
-            SET status = ?, approved_at = ?
-            WHERE id = ?
-        """, (status, datetime.utcnow(), post_id))
-    else:
-        conn.execute(
-            "UPDATE posts SET status = ? WHERE id = ?",
-            (status, post_id)
+    with _connect() as conn:
+        return conn.execute("""
+            SELECT p.id, p.post_link, u.name, p.telegram_id
+            FROM posts p
+            JOIN users u ON u.telegram_id = p.telegram_id
+            WHERE p.status = 'pending'
+            ORDER BY p.submitted_at ASC
+            LIMIT ?
+        """, (limit,)).fetchall()
+
+
+def get_pending_posts_page(limit: int = 8, after=None, before=None, start=None) -> Page:
+    """Oldest-first page of pending posts, keyed on posts.id."""
+    with _connect() as conn:
+        return _keyset_page(conn, """
+            SELECT p.id, p.post_link, u.name, p.telegram_id
+            FROM posts p
+            JOIN users u ON u.telegram_id = p.telegram_id
+            WHERE p.status = 'pending'
+        """, (), "p.id", limit, after=after, before=before, start=start)
+
+
+@_mutation
+def approve_post(conn, post_id: int) -> str | None:
+    """Approve a pending post and charge its owner one slot.
+
+    Returns "approved", "rejected" when the owner has no slot left, or None
+    when the post was no longer pending (another admin or the auto-approve
+    job got there first).
+    """
+    approved = _transition_posts(conn, "pending", "approved", """
+        id = ? AND EXISTS (
+            SELECT 1 FROM users u WHERE u.telegram_id = posts.telegram_id AND u.slots > 0
         )
-    conn.commit()
-    conn.close()
+    """, (post_id,), returning="id, telegram_id")
+    if approved:
+        owner_id = approved[0][1]
+        conn.execute("UPDATE users SET slots = slots - 1 WHERE telegram_id = ?", (owner_id,))
+        _invalidate_user(owner_id)
+        _enqueue_notification(
+            conn, owner_id, "✅ Your post has been approved for raiding! 🚀",
+            dedupe_key=f"post-approved:{post_id}")
+        return "approved"
+
+    if _transition_posts(conn, "pending", "rejected", "id = ?", (post_id,)):
+        return "rejected"
+    return None
+
+
+@_mutation
+def reject_post(conn, post_id: int) -> bool:
+    """Reject a pending post; False if it was no longer pending."""
+    rejected = _transition_posts(conn, "pending", "rejected", "id = ?", (post_id,),
+                                 returning="telegram_id")
+    if not rejected:
+        return False
+    _enqueue_notification(
+        conn, rejected[0][0], "❌ Your post has been rejected.",
+        dedupe_key=f"post-rejected:{post_id}")
+    return True
 
 
-def join_follow_pool(telegram_id: int, handle: str):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("""
+@_mutation
+def join_follow_pool(conn, telegram_id: int, handle: str):
+    conn.execute("""
         INSERT OR REPLACE INTO follow_pool (telegram_id, twitter_handle, joined_at)
         VALUES (?, ?, ?)
-    """, (telegram_id, handle, datetime.utcnow()))
-    conn.commit()
-    conn.close()
+    """, (telegram_id, handle, now_ts()))
+    _follow_event("join", telegram_id)
 
 
-def leave_follow_pool(telegram_id: int):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("DELETE FROM follow_pool WHERE telegram_id = ?", (telegram_id,))
-    conn.commit()
-    conn.close()
+@_mutation
+def leave_follow_pool(conn, telegram_id: int):
+    if conn.execute("DELETE FROM follow_pool WHERE telegram_id = ?", (telegram_id,)).rowcount:
+        _follow_event("leave", telegram_id)
 
 
 def is_in_follow_pool(telegram_id: int) -> bool:
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT 1 FROM follow_pool WHERE telegram_id = ?", (telegram_id,))
-    result = c.fetchone()
-    conn.close()
+    with _connect() as conn:
+        result = conn.execute(
+            "SELECT 1 FROM follow_pool WHERE telegram_id = ?", (telegram_id,)
+        ).fetchone()
     return bool(result)
 
 
 def get_follow_suggestions(telegram_id: int):
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    rows = conn.execute("""
-        SELECT u.telegram_id, u.name, u.twitter_handle
-        FROM follow_pool p
-        JOIN users u ON p.telegram_id = u.telegram_id
-        WHERE p.telegram_id != ?
-        AND p.telegram_id NOT IN (
-            SELECT followed_id FROM follow_actions WHERE follower_id = ?
-        )
-        ORDER BY p.joined_at
-    """, (telegram_id, telegram_id)).fetchall()
-    conn.close()
+    """Pool members `telegram_id` hasn't followed yet, with their follow counters."""
+    with _connect() as conn:
+        c = conn.cursor()
+        c.row_factory = sqlite3.Row
+        rows = c.execute("""
+            SELECT u.telegram_id, u.name, u.twitter_handle,
+                   COALESCE(s.followers, 0) AS followers,
+                   COALESCE(s.follow_backs, 0) AS follow_backs
+            FROM follow_pool p
+            JOIN users u ON p.telegram_id = u.telegram_id
+            LEFT JOIN follow_stats s ON s.telegram_id = p.telegram_id
+            WHERE p.telegram_id != ?
+            AND NOT EXISTS (
+                SELECT 1 FROM follow_actions f
+                WHERE f.follower_id = ? AND f.followed_id = p.telegram_id
+            )
+            ORDER BY p.joined_at, p.telegram_id
+        """, (telegram_id, telegram_id)).fetchall()
     return [dict(row) for row in rows]
 
 
+def get_follow_suggestions_page(telegram_id: int, limit: int = 8,
+                                after=None, before=None, start=None) -> Page:
+    """Page of get_follow_suggestions in join order.
+
+    Keyed on (joined_at, telegram_id) via idx_follow_pool_joined; the cursor
+    is a member's telegram_id. The NOT EXISTS probe hits the unique
+    follow_actions(follower_id, followed_id) index, so a page reads about
+    `limit` pool rows plus the ones the user already followed.
+    Rows are (telegram_id, name, twitter_handle, followers, follow_backs).
+    """
+    with _connect() as conn:
+        return _keyset_page(conn, """
+            SELECT p.telegram_id, u.name, u.twitter_handle,
+                   COALESCE(s.followers, 0), COALESCE(s.follow_backs, 0)
+            FROM follow_pool p
+            JOIN users u ON p.telegram_id = u.telegram_id
+            LEFT JOIN follow_stats s ON s.telegram_id = p.telegram_id
+            WHERE p.telegram_id != ?
+            AND NOT EXISTS (
+                SELECT 1 FROM follow_actions f
+                WHERE f.follower_id = ? AND f.followed_id = p.telegram_id
+            )
+        """, (telegram_id, telegram_id), ("p.joined_at", "p.telegram_id"), limit,
+            after=after, before=before, start=start,
+            cursor_sql="(SELECT joined_at, telegram_id FROM follow_pool WHERE telegram_id = ?)")
+
+
+def get_follow_graph():
+    """Snapshot for matchmaking.py: pool members in join order, and every
+    follow_actions edge as (follower_id, followed_id, state)."""
+    with _connect() as conn:
+        pool = [uid for uid, in conn.execute(
+            "SELECT telegram_id FROM follow_pool ORDER BY joined_at, telegram_id")]
+        edges = conn.execute("""
+            SELECT follower_id, followed_id,
+                   CASE WHEN confirmed = 1 THEN ? WHEN responded = 1 THEN ? ELSE ? END
+            FROM follow_actions
+        """, (FOLLOW_CONFIRMED, FOLLOW_IGNORED, FOLLOW_PENDING)).fetchall()
+    return pool, edges
+
+
+def get_follow_cards(user_ids: list[int]) -> list[tuple]:
+    """(telegram_id, name, twitter_handle, followers, follow_backs) for the
+    given pool members, in the order given; members who left are skipped."""
+    if not user_ids:
+        return []
+    placeholders = ",".join("?" * len(user_ids))
+    with _connect() as conn:
+        rows = conn.execute(f"""
+            SELECT p.telegram_id, u.name, u.twitter_handle,
+                   COALESCE(s.followers, 0), COALESCE(s.follow_backs, 0)
+            FROM follow_pool p
+            JOIN users u ON p.telegram_id = u.telegram_id
+            LEFT JOIN follow_stats s ON s.telegram_id = p.telegram_id
+            WHERE p.telegram_id IN ({placeholders})
+        """, user_ids).fetchall()
+    by_id = {row[0]: row for row in rows}
+    return [by_id[uid] for uid in user_ids if uid in by_id]
+
+
 def get_recent_approved_posts(group_id=None, hours: int = 24, with_time=False):
-    since = datetime.utcnow() - timedelta(hours=hours)
-    conn = sqlite3.connect(DB_FILE)
+    since = now_ts() - hours * HOUR
 
     if with_time:
         query = """
@@ -408,232 +1390,369 @@ def get_recent_approved_posts(group_id=None, hours: int = 24, with_time=False):
 
     query += " ORDER BY p.submitted_at DESC"
 
-    rows = conn.execute(query, params).fetchall()
-    conn.close()
-    return rows
+    with _connect() as conn:
+        return conn.execute(query, params).fetchall()
+
+
+def get_active_raids_for_user(telegram_id: int, group_id=None):
+    """Active raids with the poster's name and whether `telegram_id` already did each one.
+
+    One round trip for the whole feed: the completion check is an EXISTS probe
+    on completions' UNIQUE(telegram_id, post_id) index instead of one
+    has_completed_post call per raid. Rows are
+    (post_id, post_link, poster_name, expires_at, completed).
+    """
+    query, params = _active_raids_query(telegram_id, group_id)
+    query += " ORDER BY p.id DESC"
+
+    with _connect() as conn:
+        return conn.execute(query, params).fetchall()
+
+
+def get_active_raids_page(telegram_id: int, group_id=None,
+                          limit: int = 8, after=None, before=None, start=None) -> Page:
+    """Newest-first page of get_active_raids_for_user, keyed on posts.id."""
+    query, params = _active_raids_query(telegram_id, group_id)
+    with _connect() as conn:
+        return _keyset_page(conn, query, params, "p.id", limit,
+                            after=after, before=before, start=start, descending=True)
+
+
+def _active_raids_query(telegram_id: int, group_id):
+    query = """
+        SELECT p.id, p.post_link, u.name, p.expires_at,
+               EXISTS (
+                   SELECT 1 FROM completions c
+                   WHERE c.telegram_id = ? AND c.post_id = p.id
+               ) AS completed
+        FROM posts p
+        JOIN users u ON p.telegram_id = u.telegram_id
+        WHERE p.status = 'approved' AND +p.expires_at > ?
+    """
+    # Approved posts are the live raids (raid_expiry moves them on at their
+    # deadline), so expires_at only catches stragglers. The unary + keeps it a
+    # row filter, and the feed walks idx_posts_status_id in id order unsorted.
+    params = [telegram_id, now_ts()]
+
+    if group_id:
+        query += " AND p.group_id = ?"
+        params.append(group_id)
+    return query, params
+
+
+def get_follow_stats(user_id: int) -> dict:
+    """followers / follow_backs / pending counters, maintained by triggers on follow_actions."""
+    with _connect() as conn:
+        row = conn.execute("""
+            SELECT followers, follow_backs, pending FROM follow_stats WHERE telegram_id = ?
+        """, (user_id,)).fetchone()
+    followers, follow_backs, pending = row or (0, 0, 0)
+    return {"followers": followers, "follow_backs": follow_backs, "pending": pending}
 
 
 def count_followers(user_id: int):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute(
-        "SELECT COUNT(*) FROM follow_actions WHERE followed_id = ?", (user_id,))
-    count = c.fetchone()[0]
-    conn.close()
-    return count
+    return get_follow_stats(user_id)["followers"]
 
 
 def count_follow_backs(user_id: int):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute(
-        "SELECT COUNT(*) FROM follow_actions WHERE followed_id = ? AND confirmed = 1", (user_id,))
-    count = c.fetchone()[0]
-    conn.close()
-    return count
+    return get_follow_stats(user_id)["follow_backs"]
 
 
 def get_post_owner_id(post_id: int) -> int | None:
-    conn = sqlite3.connect(DB_FILE)
-    row = conn.execute(
-        "SELECT telegram_id FROM posts WHERE id = ?", (post_id,)).fetchone()
-    conn.close()
+    with _connect() as conn:
+        row = conn.execute(
+            "SELECT telegram_id FROM posts WHERE id = ?", (post_id,)).fetchone()
     return row[0] if row else None
 
 
-def create_verification(post_id: int, doer_id: int, owner_id: int):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS verifications (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            post_id INTEGER,
-            doer_id INTEGER,
-            owner_id INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            confirmed INTEGER DEFAULT 0,
-            responded INTEGER DEFAULT 0
-        )
-    """)
-    c.execute("""
-        INSERT INTO verifications (post_id, doer_id, owner_id)
-        VALUES (?, ?, ?)
-    """, (post_id, doer_id, owner_id))
-    conn.commit()
-    conn.close()
+@_mutation
+def create_verification(conn, post_id: int, doer_id: int, owner_id: int):
+    conn.execute("""
+        INSERT INTO verifications (post_id, doer_id, owner_id, created_at)
+        VALUES (?, ?, ?, ?)
+    """, (post_id, doer_id, owner_id, now_ts()))
 
 
-def close_verification(post_id: int, doer_id: int):
-    conn = sqlite3.connect(DB_FILE)
+@_mutation
+def close_verification(conn, post_id: int, doer_id: int):
     conn.execute("""
         UPDATE verifications
-        SET status = 'confirmed', updated_at = CURRENT_TIMESTAMP
+        SET status = 'confirmed', updated_at = ?
         WHERE post_id = ? AND doer_id = ?
-    """, (post_id, doer_id))
-    conn.commit()
-    conn.close()
+    """, (now_ts(), post_id, doer_id))
 
 
-def auto_approve_stale_posts(context=None):
-    """Automatically approve posts still pending after 1 hour and notify users."""
-    cutoff = datetime.utcnow() - timedelta(hours=1)
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
+@_mutation
+def confirm_raid(conn, post_id: int, doer_id: int, reward: float = 0.1) -> bool:
+    """Owner confirmed a raid: credit the doer and notify them, once."""
+    cur = conn.execute("""
+        UPDATE verifications
+        SET status = 'confirmed', updated_at = ?
+        WHERE post_id = ? AND doer_id = ? AND status = 'pending'
+    """, (now_ts(), post_id, doer_id))
+    if not cur.rowcount:
+        return False
+    add_task_slot(doer_id, reward)
+    _enqueue_notification(
+        conn, doer_id, f"✅ Your raid was confirmed! You've earned {reward:g} slots.",
+        dedupe_key=f"raid-confirmed:{post_id}:{doer_id}")
+    return True
 
-    # Fetch posts to approve
-    posts = c.execute("""
-        SELECT id, telegram_id, post_link
-        FROM posts
-        WHERE status = 'pending' AND submitted_at <= ?
-    """, (cutoff,)).fetchall()
 
-    # Approve them
-    c.execute("""
-        UPDATE posts
-        SET status = 'approved', approved_at = ?
-        WHERE status = 'pending' AND submitted_at <= ?
-    """, (datetime.utcnow(), cutoff))
+@_mutation
+def reject_raid(conn, post_id: int, doer_id: int) -> bool:
+    cur = conn.execute("""
+        UPDATE verifications
+        SET status = 'rejected', updated_at = ?
+        WHERE post_id = ? AND doer_id = ? AND status = 'pending'
+    """, (now_ts(), post_id, doer_id))
+    if not cur.rowcount:
+        return False
+    _enqueue_notification(
+        conn, doer_id, "❌ Your raid was rejected by the post owner. No slots awarded.",
+        dedupe_key=f"raid-rejected:{post_id}:{doer_id}")
+    return True
 
-    conn.commit()
-    conn.close()
 
-    if posts and context:
-        for post in posts:
-            try:
-                context.bot.send_message(
-                    telegram_id=post["telegram_id"],
-                    text=f"✅ Your post has been automatically approved:\n🔗 {post['post_link']}"
-                )
-            except Exception as e:
-                print(f"❌ Failed to notify user {post['telegram_id']}: {e}")
+def auto_approve_stale_posts() -> int:
+    """Automatically approve posts still pending after 1 hour and notify users."""
+    cutoff = now_ts() - HOUR
+
+    def approve(conn):
+        posts = _transition_posts(conn, "pending", "approved", "submitted_at <= ?",
+                                  (cutoff,), returning="id, telegram_id, post_link")
+        for post_id, owner_id, post_link in posts:
+            _enqueue_notification(
+                conn, owner_id,
+                f"✅ Your post has been automatically approved:\n🔗 {post_link}",
+                dedupe_key=f"post-approved:{post_id}")
+        return posts
+
+    posts = _write(approve)
 
     if posts:
         print(f"✅ Auto-approved {len(posts)} stale pending post(s).")
+    return len(posts)
 
 
-def ban_unresponsive_post_owners():
-    """Ban users whose approved posts expired 4+ hours ago without confirming/rejecting raids."""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
+@_mutation
+def ban_unresponsive_post_owners(conn) -> list[int]:
+    """Ban (48h) from posting the owners of posts expired 4+ hours ago with
+    raids still awaiting review. Sets post_ban_until, which is_user_banned reads.
 
-    # Find expired posts older than 4 hours where no confirmation has been made
-    cutoff = datetime.utcnow() - timedelta(hours=4)
-    rows = c.execute("""
-        SELECT p.telegram_id, p.id
-        FROM posts p
-        WHERE p.status = 'expired'
-        AND p.expires_at <= ?
-        AND EXISTS (
-            SELECT 1 FROM verifications v
-            WHERE v.post_id = p.id
-            AND v.status = 'pending'
+    One UPDATE over the set of offending owners, driven by
+    idx_posts_status_expires and idx_verifications_post_status. Owners who
+    are already banned are left alone. Returns the newly banned ids; each
+    gets a notice queued in the same transaction.
+    """
+    now = now_ts()
+    cutoff = now - 4 * HOUR
+    banned_until = now + 48 * HOUR
+
+    banned = [row[0] for row in conn.execute("""
+        UPDATE users
+        SET post_ban_until = ?
+        WHERE telegram_id IN (
+            SELECT p.telegram_id
+            FROM posts p
+            WHERE p.status = 'expired'
+            AND p.expires_at <= ?
+            AND EXISTS (
+                SELECT 1 FROM verifications v
+                WHERE v.post_id = p.id
+                AND v.status = 'pending'
+            )
         )
-    """, (cutoff,)).fetchall()
+        AND (post_ban_until IS NULL OR post_ban_until < ?)
+        RETURNING telegram_id
+    """, (banned_until, cutoff, now)).fetchall()]
+
+    for user_id in banned:
+        _invalidate_user(user_id)
+        _enqueue_notification(
+            conn, user_id,
+            "🚫 You've been banned for 48 hours: raids on your expired posts "
+            "were never confirmed or rejected.",
+            dedupe_key=f"ban:{user_id}:{banned_until}")
+    if banned:
+        print(f"🚫 Banned {len(banned)} user(s) for 48h due to unreviewed raids.")
+    return banned
 
-    for user_id, post_id in rows:
-        # Ban user for 48 hours
-        banned_until = datetime.utcnow() + timedelta(hours=48)
-        c.execute("""
-            UPDATE users
-            SET banned_until = ?
-            WHERE telegram_id = ?
-        """, (banned_until.isoformat(), user_id))
-        print(
-            f"🚫 Banned user {user_id} for 48h due to inactivity on post {post_id}")
+# ───── Profile Stats ─────────────────────────────────────
 
-    conn.commit()
-    conn.close()
 
-# ───── Profile Stats ─────────────────────────────────────
+# user_stats caches this aggregate; triggers (see migrations.py) keep it equal
+# to it in the same transaction as every users/posts/slot_logs write.
+USER_STATS_QUERY = """
+    SELECT telegram_id, SUM(approved), SUM(rejected), SUM(task), SUM(referral)
+    FROM (
+        SELECT telegram_id, 0 AS approved, 0 AS rejected, 0 AS task, 0 AS referral
+        FROM users
+        UNION ALL
+        SELECT telegram_id, status = 'approved', status = 'rejected', 0, 0
+        FROM posts
+        UNION ALL
+        SELECT telegram_id, 0, 0,
+               IIF(reason = 'task', IFNULL(slots, 0), 0),
+               IIF(reason = 'referral', IFNULL(slots, 0), 0)
+        FROM slot_logs
+        WHERE reason IN ('task', 'referral')
+    )
+    WHERE telegram_id IS NOT NULL
+    GROUP BY telegram_id
+"""
 
 
 def get_user_stats(telegram_id: int):
-    conn = sqlite3.connect(DB_FILE)
-    approved, rejected, task_slots, ref_slots = conn.execute("""
-        SELECT
-            (SELECT COUNT(*) FROM posts WHERE telegram_id = ? AND status = 'approved'),
-            (SELECT COUNT(*) FROM posts WHERE telegram_id = ? AND status = 'rejected'),
-            (SELECT IFNULL(SUM(slots), 0) FROM slot_logs WHERE telegram_id = ? AND reason = 'task'),
-            (SELECT IFNULL(SUM(slots), 0) FROM slot_logs WHERE telegram_id = ? AND reason = 'referral')
-    """, (telegram_id, telegram_id, telegram_id, telegram_id)).fetchone()
-    conn.close()
-    return approved, rejected, task_slots, ref_slots
+    """(approved, rejected, task_slots, ref_slots) from user_stats."""
+    with _connect() as conn:
+        row = conn.execute("""
+            SELECT approved_posts, rejected_posts, task_slots, referral_slots
+            FROM user_stats WHERE telegram_id = ?
+        """, (telegram_id,)).fetchone()
+    return tuple(row) if row else (0, 0, 0, 0)
+
+
+@_mutation
+def rebuild_user_stats(conn) -> int:
+    """Recompute every user_stats row from posts and slot_logs."""
+    conn.execute("DELETE FROM user_stats")
+    return conn.execute(f"""
+        INSERT INTO user_stats
+            (telegram_id, approved_posts, rejected_posts, task_slots, referral_slots)
+        {USER_STATS_QUERY}
+    """).rowcount
+
+
+def find_user_stats_drift(tolerance: float = 1e-6) -> list[tuple]:
+    """(telegram_id, stored, actual) for every user_stats row that disagrees
+    with USER_STATS_QUERY; a missing row reads as zeros."""
+    with _connect() as conn:
+        stored = {row[0]: row[1:] for row in conn.execute("""
+            SELECT telegram_id, approved_posts, rejected_posts, task_slots, referral_slots
+            FROM user_stats
+        """)}
+        actual = {row[0]: row[1:] for row in conn.execute(USER_STATS_QUERY)}
+
+    zeros = (0, 0, 0, 0)
+    drift = []
+    for telegram_id in sorted(stored.keys() | actual.keys()):
+        have = stored.get(telegram_id, zeros)
+        want = actual.get(telegram_id, zeros)
+        if any(abs(a - b) > tolerance for a, b in zip(have, want)):
+            drift.append((telegram_id, have, want))
+    return drift
 
 # ───── Expiration ────────────────────────────────────────
 
 
-def expire_old_posts():
-    cutoff = datetime.utcnow() - timedelta(hours=24)
-    conn = sqlite3.connect(DB_FILE)
-    conn.execute("""
-        UPDATE posts
-        SET status = 'expired'
-        WHERE status = 'approved' AND approved_at IS NOT NULL AND approved_at <= ?
-    """, (cutoff,))
-    conn.commit()
-    conn.close()
-    print("🕒 Expired old approved posts.")
+def expire_old_posts() -> int:
+    """Expire every approved raid past its deadline.
 
+    expiry.py expires raids on time; this hourly sweep is the safety net for
+    anything it missed (e.g. deadlines that passed while the bot was down).
+    """
+    return _write(lambda conn: len(_transition_posts(
+        conn, "approved", "expired", "expires_at <= ?", (now_ts(),))))
 
-def update_verification_status(post_id: int, doer_id: int, status: str):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("""
+
+@_mutation
+def expire_posts(conn, post_ids: list[int]) -> int:
+    """Expire the given raids if they are still approved and past their deadline."""
+    placeholders = ",".join("?" * len(post_ids))
+    return len(_transition_posts(
+        conn, "approved", "expired", f"id IN ({placeholders}) AND expires_at <= ?",
+        (*post_ids, now_ts())))
+
+
+def get_raid_deadlines():
+    """(post_id, expires_at) for every approved raid."""
+    with _connect() as conn:
+        return conn.execute("""
+            SELECT id, expires_at FROM posts
+            WHERE status = 'approved' AND expires_at IS NOT NULL
+        """).fetchall()
+
+
+@_mutation
+def update_verification_status(conn, post_id: int, doer_id: int, status: str):
+    conn.execute("""
         UPDATE verifications
-        SET confirmed = ?, responded = 1, updated_at = CURRENT_TIMESTAMP
+        SET confirmed = ?, responded = 1, updated_at = ?
         WHERE post_id = ? AND doer_id = ?
-    """, (1 if status == "confirmed" else 0, post_id, doer_id))
-    conn.commit()
-    conn.close()
+    """, (1 if status == "confirmed" else 0, now_ts(), post_id, doer_id))
 
 
 def get_expired_unconfirmed_verifications():
-    cutoff = datetime.utcnow() - timedelta(hours=28)
-    conn = sqlite3.connect(DB_FILE)
-    rows = conn.execute("""
-        SELECT DISTINCT v.owner_id
-        FROM verifications v
-        JOIN posts p ON v.post_id = p.id
-        WHERE v.responded = 0
-        AND p.status = 'expired'
-        AND p.approved_at <= ?
-    """, (cutoff,)).fetchall()
-    conn.close()
+    cutoff = now_ts() - 28 * HOUR
+    with _connect() as conn:
+        rows = conn.execute("""
+            SELECT DISTINCT v.owner_id
+            FROM verifications v
+            JOIN posts p ON v.post_id = p.id
+            WHERE v.responded = 0
+            AND p.status = 'expired'
+            AND p.approved_at <= ?
+        """, (cutoff,)).fetchall()
     return [row[0] for row in rows]
 
 
-def ban_user_from_posting(telegram_id: int):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("""
+@_mutation
+def ban_user_from_posting(conn, telegram_id: int):
+    conn.execute("""
         UPDATE users
-        SET post_ban_until = datetime('now', '+48 hours')
+        SET post_ban_until = ?
         WHERE telegram_id = ?
-    """, (telegram_id,))
-    conn.commit()
-    conn.close()
+    """, (now_ts() + 48 * HOUR, telegram_id))
+    _invalidate_user(telegram_id)
 
 
 def get_verifications_for_post(post_id: int):
-    conn = sqlite3.connect(DB_FILE)
-    rows = conn.execute("""
-        SELECT v.doer_id, u.name, u.twitter_handle, v.status
-        FROM verifications v
-        JOIN users u ON u.telegram_id = v.doer_id
-        WHERE v.post_id = ?
-    """, (post_id,)).fetchall()
-    conn.close()
-    return rows
+    with _connect() as conn:
+        return conn.execute("""
+            SELECT v.doer_id, u.name, u.twitter_handle, v.status
+            FROM verifications v
+            JOIN users u ON u.telegram_id = v.doer_id
+            WHERE v.post_id = ?
+        """, (post_id,)).fetchall()
+
+
+def get_verifications_page(post_id: int, limit: int = 8,
+                           after=None, before=None, start=None) -> Page:
+    """Page of a post's verifications in submission order, keyed on verifications.id.
+
+    Rows are (verification_id, doer_id, name, twitter_handle, status).
+    """
+    with _connect() as conn:
+        return _keyset_page(conn, """
+            SELECT v.id, v.doer_id, u.name, u.twitter_handle, v.status
+            FROM verifications v
+            JOIN users u ON u.telegram_id = v.doer_id
+            WHERE v.post_id = ?
+        """, (post_id,), "v.id", limit, after=after, before=before, start=start)
 
 
 # ───── Admin Dashboard ───────────────────────────────────
 
 
 def get_pending_count():
-    conn = sqlite3.connect(DB_FILE)
-    count = conn.execute(
-        "SELECT COUNT(*) FROM posts WHERE status = 'pending'"
-    ).fetchone()[0]
-    conn.close()
-    return count
+    with _connect() as conn:
+        return conn.execute(
+            "SELECT COUNT(*) FROM posts WHERE status = 'pending'"
+        ).fetchone()[0]
+
+
+# ───── Instrumentation ───────────────────────────────────
+
+# Public helpers that run no query: query_plans.py does not expect them in its
+# tour, and metrics.py does not time them.
+_NOT_QUERIES = {
+    "apply_storage_profile", "add_connection_hook", "get_pool", "close_pool",
+    "pool_stats", "writer_stats", "close_writer", "user_cache_stats", "now_ts",
+    "format_duration", "is_valid_tweet_link", "add_outbox_listener",
+    "add_expiry_listener", "add_follow_listener",
+}
+
+# Everything above that runs a query is timed by metrics.py. This goes last so
+# that the names other modules import are the timed wrappers.
+metrics.instrument_module(globals(), skip=_NOT_QUERIES)
@@ -0,0 +1,336 @@
+"""Rate-limited outbound queue for everything the bot sends or edits.
+
+Handlers hand messages to `outbound` and return immediately. A single
+scheduler task releases them within Telegram's limits:
+
+    • ~30 messages/s across the whole bot
+    • 1 message/s per chat (short bursts allowed in private chats)
+    • 20 messages/min per group
+
+Messages to the same chat are delivered in the order they were queued. A
+RetryAfter (flood wait) pauses all sending for the time Telegram asks, and
+network errors are retried with backoff.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from datetime import timedelta
+
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))
+OUTBOUND_MAX_IN_FLIGHT = int(os.getenv("OUTBOUND_MAX_IN_FLIGHT", "8"))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))
+
+# (rate per second, burst) buckets applied to every chat of that kind
+PRIVATE_CHAT_LIMITS = [(1.0, 3)]
+GROUP_CHAT_LIMITS = [(1.0, 1), (20 / 60, 20)]
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _Job:
+    __slots__ = ("fn", "args", "kwargs", "future", "enqueued_at", "attempts",
+                 "trace", "traced_at")
+
+    def __init__(self, fn, args, kwargs, future):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+        # The update being handled when this was queued, if it is traced.
+        self.trace = tracer.current()
+        self.traced_at = time.perf_counter() if self.trace else None
+
+
+class _ChatLane:
+    """Pending jobs and rate buckets for one chat."""
+    __slots__ = ("jobs", "buckets", "busy", "scheduled", "not_before")
+
+    def __init__(self, chat_id: int):
+        limits = GROUP_CHAT_LIMITS if chat_id < 0 else PRIVATE_CHAT_LIMITS
+        self.jobs = deque()
+        self.buckets = [TokenBucket(rate, burst) for rate, burst in limits]
+        self.busy = False
+        self.scheduled = False
+        self.not_before = 0.0
+
+    def wait_time(self, now: float) -> float:
+        return max([self.not_before - now] + [b.wait_time(now) for b in self.buckets])
+
+    def is_idle(self, now: float) -> bool:
+        return (not self.jobs and not self.busy
+                and all(b.is_full(now) for b in self.buckets))
+
+
+def _seconds(retry_after) -> float:
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+def _mark_retrieved(future: asyncio.Future):
+    # Failures are logged here; nobody is required to await the future.
+    if not future.cancelled():
+        future.exception()
+
+
+class OutboundDispatcher:
+    def __init__(self, global_rate: float = OUTBOUND_GLOBAL_RATE,
+                 max_in_flight: int = OUTBOUND_MAX_IN_FLIGHT,
+                 max_retries: int = OUTBOUND_MAX_RETRIES):
+        self.bot = None
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_rate)
+        self._lanes = {}              # chat_id -> _ChatLane
+        self._ready = []              # heap of (ready_at, seq, chat_id)
+        self._seq = itertools.count()
+        self._pause_until = 0.0
+        self._pending = 0
+        self._in_flight = 0
+        self._wakeup = None
+        self._slots = None
+        self._task = None
+        self._latencies = deque(maxlen=1000)
+        self._stats = {
+            "enqueued": 0,
+            "sent": 0,
+            "failed": 0,
+            "retries": 0,
+            "retry_after": 0,
+        }
+
+    # ───── Lifecycle ─────
+
+    async def start(self, bot):
+        self.bot = bot
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._task = asyncio.create_task(self._run(), name="outbound-dispatcher")
+        # Jobs queued before start() (e.g. from post_init) are waiting already.
+        for chat_id, lane in self._lanes.items():
+            if lane.jobs and not lane.scheduled:
+                self._schedule(chat_id, lane)
+
+    async def stop(self, timeout: float = 10.0):
+        """Give queued messages up to `timeout` seconds to drain, then stop."""
+        if self._task is None:
+            return
+        deadline = time.monotonic() + timeout
+        while (self._pending or self._in_flight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    # ───── Enqueueing ─────
+
+    def submit(self, chat_id: int, fn, /, *args, **kwargs) -> asyncio.Future:
+        """Queue `await fn(*args, **kwargs)` behind chat_id's earlier messages."""
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_mark_retrieved)
+        lane = self._lanes.get(chat_id)
+        if lane is None:
+            lane = self._lanes[chat_id] = _ChatLane(chat_id)
+        lane.jobs.append(_Job(fn, args, kwargs, future))
+        self._pending += 1
+        self._stats["enqueued"] += 1
+        if self._task is not None and not lane.busy and not lane.scheduled:
+            self._schedule(chat_id, lane)
+        return future
+
+    def send_message(self, chat_id: int, text: str, **kwargs) -> asyncio.Future:
+        return self.submit(chat_id, self._bot_call, "send_message",
+                           chat_id=chat_id, text=text, **kwargs)
+
+    def reply_text(self, message, text: str, **kwargs) -> asyncio.Future:
+        return self.submit(message.chat_id, message.reply_text, text, **kwargs)
+
+    def reply_document(self, message, document, **kwargs) -> asyncio.Future:
+        return self.submit(message.chat_id, message.reply_document, document, **kwargs)
+
+    def edit_message_text(self, query, text: str, **kwargs) -> asyncio.Future:
+        return self.submit(query.message.chat_id, query.edit_message_text, text, **kwargs)
+
+    def edit_message_reply_markup(self, query, reply_markup=None) -> asyncio.Future:
+        return self.submit(query.message.chat_id, query.edit_message_reply_markup,
+                           reply_markup=reply_markup)
+
+    async def _bot_call(self, method: str, **kwargs):
+        return await getattr(self.bot, method)(**kwargs)
+
+    # ───── Scheduling ─────
+
+    def _schedule(self, chat_id: int, lane: _ChatLane, delay: float = 0.0):
+        now = time.monotonic()
+        ready_at = now + max(delay, lane.wait_time(now))
+        lane.scheduled = True
+        heapq.heappush(self._ready, (ready_at, next(self._seq), chat_id))
+        self._wakeup.set()
+
+    async def _sleep_until_woken(self, timeout: float | None):
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self):
+        last_prune = time.monotonic()
+        while True:
+            await self._slots.acquire()
+            if not self._ready:
+                self._slots.release()
+                await self._sleep_until_woken(None)
+                continue
+
+            now = time.monotonic()
+            ready_at, _, chat_id = self._ready[0]
+            wait = max(ready_at - now, self._pause_until - now,
+                       self._global.wait_time(now))
+            if wait > 0:
+                self._slots.release()
+                await self._sleep_until_woken(wait)
+                continue
+
+            heapq.heappop(self._ready)
+            lane = self._lanes[chat_id]
+            lane.scheduled = False
+            now = time.monotonic()
+            # A RetryAfter or backoff may have landed after this lane was queued.
+            if lane.wait_time(now) > 0:
+                self._slots.release()
+                self._schedule(chat_id, lane)
+                continue
+
+            job = lane.jobs.popleft()
+            self._global.take(now)
+            for bucket in lane.buckets:
+                bucket.take(now)
+            lane.busy = True
+            self._in_flight += 1
+            asyncio.create_task(self._deliver(chat_id, lane, job))
+
+            if now - last_prune > 60:
+                self._prune(now)
+                last_prune = now
+
+    def _prune(self, now: float):
+        for chat_id in [c for c, lane in self._lanes.items() if lane.is_idle(now)]:
+            del self._lanes[chat_id]
+
+    async def _deliver(self, chat_id: int, lane: _ChatLane, job: _Job):
+        retry_in = 0.0
+        tracer.record(job.trace, "queue", f"chat {chat_id}", job.traced_at)
+        token = tracer.activate(job.trace)
+        try:
+            result = await job.fn(*job.args, **job.kwargs)
+        except RetryAfter as e:
+            retry_in = _seconds(e.retry_after)
+            self._stats["retry_after"] += 1
+            self._pause_until = max(self._pause_until, time.monotonic() + retry_in)
+            logger.warning("Flood control on chat %s: pausing sends for %.0fs",
+                           chat_id, retry_in)
+            lane.jobs.appendleft(job)
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                self._finish(job, result=None)
+            else:
+                self._fail(chat_id, job, e)
+        except NetworkError as e:
+            job.attempts += 1
+            if job.attempts > self.max_retries:
+                self._fail(chat_id, job, e)
+            else:
+                retry_in = 2 ** job.attempts
+                self._stats["retries"] += 1
+                lane.jobs.appendleft(job)
+        except Exception as e:
+            self._fail(chat_id, job, e)
+        else:
+            self._finish(job, result=result)
+        finally:
+            tracer.deactivate(token)
+            if job.trace:
+                job.traced_at = time.perf_counter()     # a retry queues again
+            self._in_flight -= 1
+            self._slots.release()
+            lane.busy = False
+            lane.not_before = time.monotonic() + retry_in
+            if lane.jobs:
+                self._schedule(chat_id, lane)
+
+    def _finish(self, job: _Job, result):
+        self._pending -= 1
+        self._stats["sent"] += 1
+        self._latencies.append(time.monotonic() - job.enqueued_at)
+        if not job.future.done():
+            job.future.set_result(result)
+
+    def _fail(self, chat_id: int, job: _Job, error: Exception):
+        self._pending -= 1
+        self._stats["failed"] += 1
+        logger.warning("Outbound message to %s failed: %s", chat_id, error)
+        if not job.future.done():
+            job.future.set_exception(error)
+
+    # ───── Metrics ─────
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else 0.0
+
+        return dict(
+            self._stats,
+            queue_depth=self._pending - self._in_flight,
+            in_flight=self._in_flight,
+            chats=len(self._lanes),
+            paused_for=max(0.0, self._pause_until - time.monotonic()),
+            latency_p50=pct(0.50),
+            latency_p95=pct(0.95),
+            latency_max=latencies[-1] if latencies else 0.0,
+        )
+
+
+outbound = OutboundDispatcher()
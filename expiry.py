@@ -0,0 +1,99 @@
+"""Expires each raid at its exact deadline.
+
+On start the scheduler loads every approved raid's expires_at into a min-heap;
+afterwards db.py reports each new approval right after it commits. A single
+task sleeps until the earliest deadline and expires everything due at that
+point, EXPIRE_BATCH ids per UPDATE, so the work per wake-up is proportional
+to the raids expiring, not to the size of the posts table.
+"""
+import asyncio
+import heapq
+import logging
+import time
+
+import db
+from async_db import expire_posts, get_raid_deadlines
+
+logger = logging.getLogger(__name__)
+
+# Ids per expire_posts() call. After downtime every overdue raid is due at
+# once; one IN (...) list for all of them could pass SQLite's bound-variable
+# limit (999 before 3.32) and fail the whole wake-up.
+EXPIRE_BATCH = 500
+
+
+def _now() -> float:
+    return time.time()
+
+
+class RaidExpiryScheduler:
+    def __init__(self):
+        self._heap = []               # (expires_at, post_id)
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+        self._stats = {"scheduled": 0, "expired": 0, "wakeups": 0, "max_lag": 0.0}
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        db.add_expiry_listener(self._on_approved)
+        for post_id, expires_at in await get_raid_deadlines():
+            self.add(post_id, expires_at)
+        self._task = asyncio.create_task(self._run(), name="raid-expiry")
+        logger.info("⏳ Tracking %d raid deadline(s).", len(self._heap))
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def _on_approved(self, post_id: int, expires_at: int):
+        # Runs on the db writer thread right after the approval commits.
+        self._loop.call_soon_threadsafe(self.add, post_id, expires_at)
+
+    def add(self, post_id: int, expires_at: int):
+        heapq.heappush(self._heap, (expires_at, post_id))
+        self._stats["scheduled"] += 1
+        if self._heap[0] == (expires_at, post_id):
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            timeout = self._heap[0][0] - _now() if self._heap else None
+            if timeout is None or timeout > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = _now()
+            due = []
+            while self._heap and self._heap[0][0] <= now and len(due) < EXPIRE_BATCH:
+                deadline, post_id = heapq.heappop(self._heap)
+                self._stats["max_lag"] = max(self._stats["max_lag"], now - deadline)
+                due.append(post_id)
+
+            self._stats["wakeups"] += 1
+            try:
+                expired = await expire_posts(due)
+            except Exception:
+                logger.exception("Expiring %d raid(s) failed; the hourly sweep will retry", len(due))
+                continue
+            self._stats["expired"] += expired
+            if expired:
+                logger.info("⌛ Expired %d raid(s) at their deadline.", expired)
+
+    def stats(self) -> dict:
+        return dict(self._stats, pending=len(self._heap),
+                    next_deadline_in=max(0.0, self._heap[0][0] - _now()) if self._heap else None)
+
+
+raid_expiry = RaidExpiryScheduler()
@@ -0,0 +1,84 @@
+"""Periodic maintenance jobs, run on PTB's JobQueue.
+
+Every job body is a blocking db.py function executed on the DB executor, so
+the event loop keeps serving updates while it runs. Each run is timed and
+logged with the number of rows it touched, and a job that is still running
+when its next tick arrives is skipped rather than started twice.
+"""
+import logging
+import time
+from datetime import timedelta
+
+import db
+from async_db import run_sync
+
+logger = logging.getLogger(__name__)
+
+# (db function, interval, delay before the first run)
+MAINTENANCE_JOBS = [
+    (db.expire_old_posts, timedelta(hours=1), timedelta(minutes=1)),
+    (db.ban_unresponsive_post_owners, timedelta(hours=1), timedelta(minutes=2)),
+    (db.auto_approve_stale_posts, timedelta(minutes=10), timedelta(minutes=3)),
+]
+
+_running = set()
+_stats = {}
+
+
+def maintenance_job(fn):
+    """Wrap a blocking `fn()` as a non-overlapping async job.
+
+    `fn` returns the number of rows it affected, or the list of affected ids.
+    """
+    name = fn.__name__
+    stats = _stats[name] = {
+        "runs": 0,
+        "failures": 0,
+        "skipped": 0,
+        "rows_total": 0,
+        "last_rows": None,
+        "last_duration": None,
+        "max_duration": 0.0,
+    }
+
+    async def job(context):
+        if name in _running:
+            stats["skipped"] += 1
+            logger.warning("Job %s is still running; skipping this tick", name)
+            return
+
+        _running.add(name)
+        started = time.perf_counter()
+        try:
+            rows = await run_sync(fn)
+        except Exception:
+            stats["failures"] += 1
+            logger.exception("Job %s failed", name)
+            return
+        finally:
+            _running.discard(name)
+            duration = time.perf_counter() - started
+            stats["runs"] += 1
+            stats["last_duration"] = duration
+            stats["max_duration"] = max(stats["max_duration"], duration)
+
+        if isinstance(rows, list):
+            rows = len(rows)
+        rows = rows or 0
+        stats["last_rows"] = rows
+        stats["rows_total"] += rows
+        logger.info("Job %s: %d row(s) in %.1f ms", name, rows, duration * 1000)
+
+    job.__name__ = name
+    return job
+
+
+def register_maintenance_jobs(job_queue):
+    for fn, interval, first in MAINTENANCE_JOBS:
+        job_queue.run_repeating(
+            maintenance_job(fn), interval=interval, first=first, name=fn.__name__,
+            job_kwargs={"max_instances": 1, "coalesce": True})
+
+
+def job_stats() -> dict:
+    return {name: dict(stats) for name, stats in _stats.items()}
@@ -0,0 +1,195 @@
+"""Follow-for-Follow matchmaking.
+
+The follow graph (pool members plus every follow_actions edge) is held in
+memory and kept current from db.py's follow-graph events, so a suggestion
+page is a walk down a presorted ranking rather than a query.
+
+Pool members are ranked by the follow-back a follower can expect from them,
+damped by how much attention they already get:
+
+* reciprocity — follow-backs over answered follows, with a Beta(1, 1) prior
+  so newcomers start at an even chance;
+* backlog — follows still waiting on an answer push a member down until they
+  catch up, so nobody is handed more follows than they deal with;
+* exposure — total follows received, so early joiners stop collecting the
+  bulk of every new member's taps.
+
+Only the member whose history changed is re-ranked when an event arrives.
+"""
+import asyncio
+import logging
+import math
+from bisect import bisect_left, insort
+
+import db
+from async_db import get_follow_graph
+
+logger = logging.getLogger(__name__)
+
+BACKLOG_SOFT_CAP = 5        # unanswered follows that halve a member's score
+EXPOSURE_SCALE = 20         # follows received before exposure starts to bite
+
+
+def follow_score(confirmed: int, ignored: int, pending: int) -> float:
+    reciprocity = (confirmed + 1) / (confirmed + ignored + 2)
+    backlog = 1 + pending / BACKLOG_SOFT_CAP
+    exposure = math.sqrt(1 + (confirmed + ignored + pending) / EXPOSURE_SCALE)
+    return reciprocity / (backlog * exposure)
+
+
+class FollowMatchmaker:
+    def __init__(self):
+        self._following = {}      # follower -> {followed: state}
+        self._history = {}        # member -> [confirmed, ignored, pending] as a follow target
+        self._seq = {}            # pool member -> join sequence, the tie-break
+        self._key = {}            # pool member -> its entry in _ranked
+        self._ranked = []         # sorted (-score, seq, member) for pool members
+        self._next_seq = 0
+        self._loop = None
+        self._buffer = None
+        self._stats = {"events": 0, "reranks": 0, "pages": 0}
+
+    async def start(self):
+        # Events that commit while the snapshot loads are buffered and replayed
+        # on top of it; joins/leaves replay in commit order and edge states are
+        # monotonic, so an event already in the snapshot changes nothing.
+        self._loop = asyncio.get_running_loop()
+        self._buffer = []
+        db.add_follow_listener(self._on_event)
+        pool, edges = await get_follow_graph()
+        self.load(pool, edges)
+        buffered, self._buffer = self._buffer, None
+        for event in buffered:
+            self.apply(*event)
+        logger.info("🤝 Matchmaking over %d pool member(s), %d follow(s).",
+                    len(self._ranked), len(edges))
+
+    def _on_event(self, event: str, *args):
+        # Runs on the db writer thread right after the change commits.
+        self._loop.call_soon_threadsafe(self._receive, event, *args)
+
+    def _receive(self, event: str, *args):
+        if self._buffer is not None:
+            self._buffer.append((event, *args))
+        else:
+            self.apply(event, *args)
+
+    def load(self, pool, edges):
+        """Rebuild from a snapshot: member ids in join order and
+        (follower_id, followed_id, state) edges."""
+        self._following, self._history = {}, {}
+        self._seq, self._key, self._next_seq = {}, {}, 0
+        for follower_id, followed_id, state in edges:
+            self._following.setdefault(follower_id, {})[followed_id] = state
+            self._count(followed_id, state, +1)
+        for member in pool:
+            self._seq[member] = self._next_seq
+            self._next_seq += 1
+            self._key[member] = self._rank_key(member)
+        self._ranked = sorted(self._key.values())
+
+    # ── incremental updates ──
+
+    def apply(self, event: str, *args):
+        self._stats["events"] += 1
+        if event == "edge":
+            self._edge(*args)
+        elif event == "join":
+            self._join(*args)
+        elif event == "leave":
+            self._leave(*args)
+
+    def _edge(self, follower_id: int, followed_id: int, state: int):
+        following = self._following.setdefault(follower_id, {})
+        old = following.get(followed_id)
+        if old is not None and old >= state:
+            return
+        following[followed_id] = state
+        if old is not None:
+            self._count(followed_id, old, -1)
+        self._count(followed_id, state, +1)
+        self._rerank(followed_id)
+
+    def _join(self, member: int):
+        # A rejoin moves the member to the back of the join order, as in follow_pool.
+        self._unrank(member)
+        self._seq[member] = self._next_seq
+        self._next_seq += 1
+        self._key[member] = self._rank_key(member)
+        insort(self._ranked, self._key[member])
+
+    def _leave(self, member: int):
+        self._unrank(member)
+        self._seq.pop(member, None)
+
+    def _count(self, member: int, state: int, delta: int):
+        history = self._history.setdefault(member, [0, 0, 0])
+        history[(2, 1, 0)[state]] += delta
+
+    def _rank_key(self, member: int):
+        confirmed, ignored, pending = self._history.get(member, (0, 0, 0))
+        return (-follow_score(confirmed, ignored, pending), self._seq[member], member)
+
+    def _unrank(self, member: int):
+        key = self._key.pop(member, None)
+        if key is not None:
+            del self._ranked[bisect_left(self._ranked, key)]
+
+    def _rerank(self, member: int):
+        if member not in self._key:
+            return
+        self._unrank(member)
+        self._key[member] = self._rank_key(member)
+        insort(self._ranked, self._key[member])
+        self._stats["reranks"] += 1
+
+    # ── serving ──
+
+    def suggest(self, user_id: int, limit: int = 8,
+                after=None, before=None, start=None) -> db.Page:
+        """Page of pool members for `user_id` to follow, best match first.
+
+        Rows are 1-tuples of member ids; the cursors are member ids, with the
+        same meaning as db._keyset_page's. A cursor member who has since left
+        the pool restarts the walk from the top.
+        """
+        self._stats["pages"] += 1
+        followed = self._following.get(user_id, {})
+        ranked = self._ranked
+        cursor = before if before is not None else (after if after is not None else start)
+        key = self._key.get(cursor)
+        if key is None:
+            cursor = after = before = None
+            pos = 0
+        else:
+            pos = bisect_left(ranked, key)
+
+        if before is not None:
+            indexes = range(pos - 1, -1, -1)
+        else:
+            indexes = range(pos + 1 if after is not None else pos, len(ranked))
+
+        rows = []
+        for i in indexes:
+            member = ranked[i][2]
+            if member == user_id or member in followed:
+                continue
+            if len(rows) == limit:
+                more = True
+                break
+            rows.append((member,))
+        else:
+            more = False
+
+        if before is not None:
+            rows.reverse()
+            return db.Page(rows, more, True)
+        return db.Page(rows, cursor is not None, more)
+
+    def stats(self) -> dict:
+        return dict(self._stats, members=len(self._ranked),
+                    followers=len(self._following),
+                    edges=sum(len(f) for f in self._following.values()))
+
+
+matchmaker = FollowMatchmaker()
@@ -0,0 +1,268 @@
+"""In-process latency metrics, exposed in the Prometheus text format.
+
+Three families are timed, each as a histogram with an error counter and an
+in-flight gauge:
+
+* bot_handler  every PTB handler callback, labelled by handler and route
+               (the command, the callback action before "|", or the menu
+               button that was tapped);
+* bot_job      every JobQueue job, by job name;
+* bot_db_query every public db.py function, by function name. Mutations are
+               timed from the call to their commit, writer queueing included.
+
+GET /metrics on the Flask app renders them, together with the stats() of the
+subsystems registered through add_gauges(). It answers only when METRICS_TOKEN
+is set and sent as a bearer token, and is a 404 otherwise. A timed call costs two
+perf_counter() reads and two uncontended lock round trips, one to three
+microseconds; `python benchmarks.py metrics` measures it.
+"""
+import functools
+import hmac
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Blueprint, Response, abort, request
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop
+
+# Upper bounds in seconds, from a cache hit to a Bot API timeout.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+HELP = {
+    "bot_handler": "Telegram handler callbacks",
+    "bot_job": "JobQueue jobs",
+    "bot_db_query": "db.py query functions",
+}
+
+
+class Timer:
+    """Histogram, error count and in-flight gauge for one label set."""
+    __slots__ = ("buckets", "sum", "count", "errors", "in_flight", "_lock")
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)       # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.errors = 0
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def start(self) -> float:
+        with self._lock:
+            self.in_flight += 1
+        return time.perf_counter()
+
+    def finish(self, started: float, failed: bool = False):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.in_flight -= 1
+            self.buckets[bisect_left(BUCKETS, elapsed)] += 1
+            self.sum += elapsed
+            self.count += 1
+            self.errors += failed
+
+
+class Metrics:
+    def __init__(self):
+        self._timers = {}             # (family, ((label, value), ...)) -> Timer
+        self._gauges = {}             # prefix -> stats() callable
+        self._buttons = frozenset()   # menu button texts that get their own route
+        self._lock = threading.Lock()
+
+    def timer(self, family: str, **labels) -> Timer:
+        key = (family, tuple(sorted(labels.items())))
+        timer = self._timers.get(key)
+        if timer is None:
+            with self._lock:
+                timer = self._timers.setdefault(key, Timer())
+        return timer
+
+    def add_gauges(self, prefix: str, stats):
+        """Export the numeric values of `stats()` as gauges named prefix_<key>.
+
+        A value that is itself a dict ({item: {stat: value}}) becomes the
+        series prefix_<stat>{name="<item>"}.
+        """
+        self._gauges[prefix] = stats
+
+    # ───── Wrappers ─────
+
+    def instrument_function(self, fn, family: str = "bot_db_query"):
+        """Time a blocking function; a db.py mutation's .submit is timed too."""
+        timer = self.timer(family, query=fn.__name__)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = timer.start()
+            failed = True
+            try:
+                result = fn(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                timer.finish(started, failed)
+
+        submit = getattr(fn, "submit", None)
+        if submit is not None:
+            def timed_submit(*args, **kwargs):
+                started = timer.start()
+                future = submit(*args, **kwargs)
+                future.add_done_callback(
+                    lambda f: timer.finish(started, f.cancelled() or f.exception() is not None))
+                return future
+            wrapper.submit = timed_submit
+        return wrapper
+
+    def instrument_module(self, namespace: dict, skip=()):
+        """Replace every public function defined in `namespace` with its timed wrapper."""
+        module = namespace["__name__"]
+        for name, fn in list(namespace.items()):
+            if (callable(fn) and not isinstance(fn, type) and not name.startswith("_")
+                    and getattr(fn, "__module__", None) == module and name not in skip):
+                namespace[name] = self.instrument_function(fn)
+
+    def instrument_handler(self, callback):
+        name = callback.__name__
+        timers = {}                   # route -> Timer
+
+        @functools.wraps(callback)
+        async def handler(update, context):
+            route = self.route(update)
+            timer = timers.get(route)
+            if timer is None:
+                timer = timers[route] = self.timer("bot_handler", handler=name, route=route)
+            started = timer.start()
+            failed = False
+            try:
+                return await callback(update, context)
+            except ApplicationHandlerStop:
+                raise
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                timer.finish(started, failed)
+        return handler
+
+    def instrument_job(self, name: str, callback):
+        timer = self.timer("bot_job", job=name)
+
+        @functools.wraps(callback)
+        async def job(context):
+            started = timer.start()
+            failed = True
+            try:
+                result = await callback(context)
+                failed = False
+                return result
+            finally:
+                timer.finish(started, failed)
+        return job
+
+    def instrument_application(self, app, buttons=()):
+        """Time every handler registered on `app` and every job already scheduled.
+
+        `buttons` are the reply-keyboard texts labelled as routes of their own;
+        any other text message is "text", so users cannot add label values.
+        """
+        self._buttons = frozenset(buttons)
+        for handlers in app.handlers.values():
+            for handler in handlers:
+                handler.callback = self.instrument_handler(handler.callback)
+        for job in app.job_queue.jobs():
+            job.callback = self.instrument_job(job.name, job.callback)
+
+    def route(self, update) -> str:
+        if not isinstance(update, Update):
+            return "other"
+        query = update.callback_query
+        if query is not None:
+            return (query.data or "").split("|", 1)[0][:32] or "none"
+        message = update.effective_message
+        text = (message.text or "") if message else ""
+        if text.startswith("/"):
+            return text.split(maxsplit=1)[0].split("@", 1)[0][:32]
+        if text in self._buttons:
+            return text
+        return "text" if text else "message"
+
+    # ───── Exposition ─────
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        by_family = {}
+        for (family, labels), timer in list(self._timers.items()):
+            by_family.setdefault(family, []).append((labels, timer))
+
+        lines = []
+        for family, series in sorted(by_family.items()):
+            help_text = HELP.get(family, family)
+            lines += [f"# HELP {family}_seconds Latency of {help_text}.",
+                      f"# TYPE {family}_seconds histogram"]
+            for labels, timer in series:
+                with timer._lock:
+                    buckets, total, count = list(timer.buckets), timer.sum, timer.count
+                cumulative = 0
+                for bound, n in zip(BUCKETS + (float("inf"),), buckets):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{family}_seconds_bucket{_labels(labels, le=le)} {cumulative}")
+                lines.append(f"{family}_seconds_sum{_labels(labels)} {total:.6f}")
+                lines.append(f"{family}_seconds_count{_labels(labels)} {count}")
+            for suffix, kind, attr in (("errors_total", "counter", "errors"),
+                                       ("in_flight", "gauge", "in_flight")):
+                lines += [f"# HELP {family}_{suffix} {help_text}: {attr.replace('_', '-')}.",
+                          f"# TYPE {family}_{suffix} {kind}"]
+                lines += [f"{family}_{suffix}{_labels(labels)} {getattr(timer, attr)}"
+                          for labels, timer in series]
+
+        gauges = {}                   # metric name -> [sample line, ...]
+        for prefix, stats in sorted(self._gauges.items()):
+            try:
+                values = stats()
+            except Exception:
+                # Read from the Flask thread while the owner mutates it;
+                # the next scrape will get it.
+                continue
+            for key, value in sorted(values.items()):
+                if isinstance(value, dict):
+                    # Per-item stats such as job_stats(): one series per item.
+                    for stat, item_value in sorted(value.items()):
+                        if _is_number(item_value):
+                            name = f"{prefix}_{stat}"
+                            gauges.setdefault(name, []).append(
+                                f"{name}{_labels((('name', key),))} {item_value}")
+                elif _is_number(value):
+                    gauges.setdefault(f"{prefix}_{key}", []).append(f"{prefix}_{key} {value}")
+        for name, samples in sorted(gauges.items()):
+            lines += [f"# TYPE {name} gauge", *samples]
+        return "\n".join(lines) + "\n"
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _labels(labels: tuple, **extra) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+               for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+metrics = Metrics()
+metrics_blueprint = Blueprint("metrics", __name__)
+
+
+@metrics_blueprint.route("/metrics")
+def render_metrics():
+    token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    if not METRICS_TOKEN or not hmac.compare_digest(token, METRICS_TOKEN):
+        abort(404)
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
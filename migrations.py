@@ -0,0 +1,528 @@
+"""Versioned schema migrations, applied once at startup.
+
+Each migration is a function of a cursor registered in MIGRATIONS under the
+next version number. run_migrations() applies the ones newer than the
+database's PRAGMA user_version in order, each in its own transaction that
+also records it in schema_version and bumps user_version, so a failed step
+leaves the database at the previous version. An up-to-date database costs a
+single PRAGMA read.
+
+db.py never runs DDL: its functions assume the latest schema. To change the
+schema (a new index, a new column) append a migration; never edit one that
+has shipped.
+"""
+import logging
+import sqlite3
+import time
+
+import db
+from db import USER_STATS_QUERY, RAID_DURATION
+
+logger = logging.getLogger(__name__)
+
+# Every time column; all hold integer epoch seconds.
+TIMESTAMP_COLUMNS = {
+    "users": ("token_expiry", "created_at", "last_updated",
+              "banned_until", "post_ban_until", "last_post_at"),
+    "posts": ("submitted_at", "approved_at", "expires_at"),
+    "slot_logs": ("created_at",),
+    "completions": ("created_at",),
+    "verifications": ("created_at", "updated_at"),
+    "follow_actions": ("created_at",),
+    "follow_pool": ("joined_at",),
+}
+
+
+def _baseline(c: sqlite3.Cursor):
+    """Every table, trigger and index up to this runner; converts older
+    databases created by db_setup.create_database() in place."""
+    # ───── users table ─────
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            telegram_id          INTEGER PRIMARY KEY,
+            name                 TEXT,
+            ref_by               INTEGER,
+            slots                REAL DEFAULT 2,
+            task_slots           REAL DEFAULT 0,
+            ref_count_l1         INTEGER DEFAULT 0,
+            twitter_handle       TEXT UNIQUE,
+            twitter_id           TEXT,                       -- ✅ optional for v2 endpoints
+            access_token         TEXT,                       -- ✅ required
+            refresh_token        TEXT,                       -- ✅ required
+            token_expiry         INTEGER,                    -- ✅ required
+            access_token_secret  TEXT,                       -- optional (only used for OAuth1)
+            created_at           INTEGER DEFAULT (strftime('%s', 'now')),
+            last_updated         INTEGER DEFAULT (strftime('%s', 'now')),
+            banned_until         INTEGER,
+            post_ban_until       INTEGER,
+            last_post_at         INTEGER
+        )
+
+    """)
+
+    # ───── posts table ─────
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS posts (
+            id            INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id   INTEGER REFERENCES users(telegram_id),
+            post_link     TEXT,
+            group_id      INTEGER,
+            status        TEXT DEFAULT 'pending',
+            submitted_at  INTEGER DEFAULT (strftime('%s', 'now')),
+            approved_at   INTEGER,
+            expires_at    INTEGER,
+            FOREIGN KEY (telegram_id) REFERENCES users(telegram_id)
+        )
+    """)
+
+    # ───── slot_logs table ─────
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS slot_logs (
+            id           INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id  INTEGER REFERENCES users(telegram_id),
+            slots        REAL,
+            reason       TEXT,
+            note         TEXT,
+            created_at   INTEGER DEFAULT (strftime('%s', 'now')),
+            FOREIGN KEY (telegram_id) REFERENCES users(telegram_id)
+        )
+    """)
+
+    # ───── completions table ─────
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS completions (
+            id           INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id  INTEGER REFERENCES users(telegram_id),
+            post_id      INTEGER REFERENCES posts(id),
+            created_at   INTEGER DEFAULT (strftime('%s', 'now')),
+            UNIQUE(telegram_id, post_id),
+            FOREIGN KEY (telegram_id) REFERENCES users(telegram_id),
+            FOREIGN KEY (post_id) REFERENCES posts(id)
+        )
+    """)
+
+    # ───── verifications table ─────
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS verifications (
+            id           INTEGER PRIMARY KEY AUTOINCREMENT,
+            post_id      INTEGER,
+            doer_id      INTEGER,
+            owner_id     INTEGER,
+            status       TEXT DEFAULT 'pending', -- 'confirmed', 'rejected'
+            created_at   INTEGER DEFAULT (strftime('%s', 'now')),
+            updated_at   INTEGER,
+            confirmed    INTEGER DEFAULT 0,
+            responded    INTEGER DEFAULT 0
+        )
+    """)
+
+    # ───── follow_actions table ─────
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS follow_actions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            follower_id INTEGER,
+            followed_id INTEGER,
+            confirmed INTEGER DEFAULT 0,
+            responded INTEGER DEFAULT 0,
+            created_at INTEGER DEFAULT (strftime('%s', 'now')),
+            FOREIGN KEY (follower_id) REFERENCES users(telegram_id),
+            FOREIGN KEY (followed_id) REFERENCES users(telegram_id)
+        )
+    """)
+
+    # ───── follow_pool table ─────
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS follow_pool (
+            telegram_id INTEGER PRIMARY KEY,
+            twitter_handle TEXT,
+            joined_at INTEGER DEFAULT (strftime('%s', 'now'))
+        )
+    """)
+
+    # ───── follow_stats table ─────
+    # Per-user counters over follow_actions, kept current by the triggers
+    # below in the same transaction as every follow_actions write.
+    had_follow_stats = c.execute("""
+        SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'follow_stats'
+    """).fetchone()
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS follow_stats (
+            telegram_id   INTEGER PRIMARY KEY,
+            followers     INTEGER NOT NULL DEFAULT 0,  -- follow_actions rows targeting the user
+            follow_backs  INTEGER NOT NULL DEFAULT 0,  -- ... that the user confirmed
+            pending       INTEGER NOT NULL DEFAULT 0   -- ... not yet responded to
+        )
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS follow_stats_insert
+        AFTER INSERT ON follow_actions
+        BEGIN
+            INSERT INTO follow_stats (telegram_id, followers, follow_backs, pending)
+            VALUES (NEW.followed_id, 1, NEW.confirmed = 1, NEW.responded = 0)
+            ON CONFLICT (telegram_id) DO UPDATE SET
+                followers = followers + 1,
+                follow_backs = follow_backs + (NEW.confirmed = 1),
+                pending = pending + (NEW.responded = 0);
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS follow_stats_update
+        AFTER UPDATE OF followed_id, confirmed, responded ON follow_actions
+        BEGIN
+            UPDATE follow_stats SET
+                followers = followers - 1,
+                follow_backs = follow_backs - (OLD.confirmed = 1),
+                pending = pending - (OLD.responded = 0)
+            WHERE telegram_id = OLD.followed_id;
+            INSERT INTO follow_stats (telegram_id, followers, follow_backs, pending)
+            VALUES (NEW.followed_id, 1, NEW.confirmed = 1, NEW.responded = 0)
+            ON CONFLICT (telegram_id) DO UPDATE SET
+                followers = followers + 1,
+                follow_backs = follow_backs + (NEW.confirmed = 1),
+                pending = pending + (NEW.responded = 0);
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS follow_stats_delete
+        AFTER DELETE ON follow_actions
+        BEGIN
+            UPDATE follow_stats SET
+                followers = followers - 1,
+                follow_backs = follow_backs - (OLD.confirmed = 1),
+                pending = pending - (OLD.responded = 0)
+            WHERE telegram_id = OLD.followed_id;
+        END
+    """)
+    if not had_follow_stats:
+        c.execute("""
+            INSERT INTO follow_stats (telegram_id, followers, follow_backs, pending)
+            SELECT followed_id, COUNT(*), SUM(confirmed = 1), SUM(responded = 0)
+            FROM follow_actions
+            WHERE followed_id IS NOT NULL
+            GROUP BY followed_id
+        """)
+
+    # ───── user_stats table ─────
+    # Profile counters, kept current by triggers on users, posts and slot_logs
+    # in the same transaction as every write to them.
+    had_user_stats = c.execute("""
+        SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_stats'
+    """).fetchone()
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS user_stats (
+            telegram_id     INTEGER PRIMARY KEY,
+            approved_posts  INTEGER NOT NULL DEFAULT 0,  -- posts currently 'approved'
+            rejected_posts  INTEGER NOT NULL DEFAULT 0,  -- posts currently 'rejected'
+            task_slots      REAL NOT NULL DEFAULT 0,     -- SUM(slot_logs.slots) for 'task'
+            referral_slots  REAL NOT NULL DEFAULT 0      -- ... for 'referral'
+        )
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_stats_user_insert
+        AFTER INSERT ON users
+        BEGIN
+            INSERT OR IGNORE INTO user_stats (telegram_id) VALUES (NEW.telegram_id);
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_stats_post_insert
+        AFTER INSERT ON posts
+        BEGIN
+            INSERT INTO user_stats (telegram_id, approved_posts, rejected_posts)
+            VALUES (NEW.telegram_id, NEW.status = 'approved', NEW.status = 'rejected')
+            ON CONFLICT (telegram_id) DO UPDATE SET
+                approved_posts = approved_posts + (NEW.status = 'approved'),
+                rejected_posts = rejected_posts + (NEW.status = 'rejected');
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_stats_post_update
+        AFTER UPDATE OF telegram_id, status ON posts
+        BEGIN
+            UPDATE user_stats SET
+                approved_posts = approved_posts - (OLD.status = 'approved'),
+                rejected_posts = rejected_posts - (OLD.status = 'rejected')
+            WHERE telegram_id = OLD.telegram_id;
+            INSERT INTO user_stats (telegram_id, approved_posts, rejected_posts)
+            VALUES (NEW.telegram_id, NEW.status = 'approved', NEW.status = 'rejected')
+            ON CONFLICT (telegram_id) DO UPDATE SET
+                approved_posts = approved_posts + (NEW.status = 'approved'),
+                rejected_posts = rejected_posts + (NEW.status = 'rejected');
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_stats_post_delete
+        AFTER DELETE ON posts
+        BEGIN
+            UPDATE user_stats SET
+                approved_posts = approved_posts - (OLD.status = 'approved'),
+                rejected_posts = rejected_posts - (OLD.status = 'rejected')
+            WHERE telegram_id = OLD.telegram_id;
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_stats_slot_insert
+        AFTER INSERT ON slot_logs
+        WHEN NEW.reason IN ('task', 'referral')
+        BEGIN
+            INSERT INTO user_stats (telegram_id, task_slots, referral_slots)
+            VALUES (NEW.telegram_id,
+                    IIF(NEW.reason = 'task', IFNULL(NEW.slots, 0), 0),
+                    IIF(NEW.reason = 'referral', IFNULL(NEW.slots, 0), 0))
+            ON CONFLICT (telegram_id) DO UPDATE SET
+                task_slots = task_slots + excluded.task_slots,
+                referral_slots = referral_slots + excluded.referral_slots;
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_stats_slot_delete
+        AFTER DELETE ON slot_logs
+        WHEN OLD.reason IN ('task', 'referral')
+        BEGIN
+            UPDATE user_stats SET
+                task_slots = task_slots - IIF(OLD.reason = 'task', IFNULL(OLD.slots, 0), 0),
+                referral_slots = referral_slots - IIF(OLD.reason = 'referral', IFNULL(OLD.slots, 0), 0)
+            WHERE telegram_id = OLD.telegram_id;
+        END
+    """)
+    if not had_user_stats:
+        c.execute(f"""
+            INSERT INTO user_stats
+                (telegram_id, approved_posts, rejected_posts, task_slots, referral_slots)
+            {USER_STATS_QUERY}
+        """)
+
+    # ───── notification_outbox table ─────
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            id               INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id          INTEGER NOT NULL,
+            text             TEXT NOT NULL,
+            parse_mode       TEXT,
+            dedupe_key       TEXT UNIQUE,
+            status           TEXT DEFAULT 'pending', -- 'sent', 'failed'
+            attempts         INTEGER DEFAULT 0,
+            created_at       INTEGER NOT NULL,      -- epoch seconds
+            next_attempt_at  INTEGER NOT NULL,
+            sent_at          INTEGER,
+            last_error       TEXT
+        )
+    """)
+
+    # create_verification used to create verifications itself, without the
+    # status/updated_at columns; give such tables the missing columns.
+    columns = {row[1] for row in c.execute("PRAGMA table_info(verifications)")}
+    if "status" not in columns:
+        c.execute("ALTER TABLE verifications ADD COLUMN status TEXT DEFAULT 'pending'")
+        c.execute("UPDATE verifications SET status = 'confirmed' WHERE confirmed = 1")
+    if "updated_at" not in columns:
+        c.execute("ALTER TABLE verifications ADD COLUMN updated_at INTEGER")
+
+    # ───── indexes ─────
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_posts_status ON posts(status)")
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_posts_telegram_id ON posts(telegram_id)")
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_posts_status_expires
+        ON posts(status, expires_at)
+    """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_verifications_post_status
+        ON verifications(post_id, status)
+    """)
+    # One follow_actions row per (follower, followed). Older databases may hold
+    # duplicates from repeated "Done" taps: fold their flags into the first
+    # row and drop the rest (the follow_stats triggers adjust the counters).
+    has_unique_follow = c.execute("""
+        SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_follow_actions_pair'
+    """).fetchone()
+    if not has_unique_follow:
+        c.execute("""
+            UPDATE follow_actions
+            SET confirmed = (SELECT MAX(f.confirmed) FROM follow_actions f
+                             WHERE f.follower_id = follow_actions.follower_id
+                             AND f.followed_id = follow_actions.followed_id),
+                responded = (SELECT MAX(f.responded) FROM follow_actions f
+                             WHERE f.follower_id = follow_actions.follower_id
+                             AND f.followed_id = follow_actions.followed_id)
+            WHERE id IN (SELECT MIN(id) FROM follow_actions
+                         GROUP BY follower_id, followed_id HAVING COUNT(*) > 1)
+        """)
+        c.execute("""
+            DELETE FROM follow_actions
+            WHERE id NOT IN (SELECT MIN(id) FROM follow_actions
+                             GROUP BY follower_id, followed_id)
+        """)
+    c.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_follow_actions_pair
+        ON follow_actions(follower_id, followed_id)
+    """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_follow_pool_joined
+        ON follow_pool(joined_at, telegram_id)
+    """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_follow_actions_followed
+        ON follow_actions(followed_id, responded)
+    """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_slot_logs_user_reason
+        ON slot_logs(telegram_id, reason)
+    """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_outbox_due
+        ON notification_outbox(status, next_attempt_at)
+    """)
+
+    # ───── backfill ─────
+    # Older databases hold text timestamps in four formats (CURRENT_TIMESTAMP,
+    # str(datetime), isoformat(), datetime('now', ...)); all are UTC and all
+    # parse with strftime('%s'). Convert them to epoch seconds once.
+    for table, columns in TIMESTAMP_COLUMNS.items():
+        for column in columns:
+            c.execute(f"""
+                UPDATE {table}
+                SET {column} = CAST(strftime('%s', {column}) AS INTEGER)
+                WHERE typeof({column}) = 'text' AND strftime('%s', {column}) IS NOT NULL
+            """)
+
+    # Raids approved before expires_at was populated get the 24h deadline.
+    c.execute("""
+        UPDATE posts SET expires_at = approved_at + ?
+        WHERE status = 'approved' AND expires_at IS NULL AND approved_at IS NOT NULL
+    """, (RAID_DURATION,))
+
+
+
+def _composite_indexes(c: sqlite3.Cursor):
+    """Indexes shaped like the queries that use them (see query_plans.py)."""
+    # telegram_id is the rowid alias; this duplicated the primary key.
+    c.execute("DROP INDEX IF EXISTS idx_users_telegram_id")
+    # Review queue: status = 'pending' ORDER BY / <= submitted_at, and COUNT(*).
+    c.execute("DROP INDEX IF EXISTS idx_posts_status")
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_posts_status_submitted
+        ON posts(status, submitted_at)
+    """)
+    # Recent raids: status = ? AND approved_at range, group_id filtered in the index.
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_posts_status_approved
+        ON posts(status, approved_at, group_id)
+    """)
+    # A user's active raids: telegram_id = ? AND status = ? AND expires_at > ?.
+    c.execute("DROP INDEX IF EXISTS idx_posts_telegram_id")
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_posts_owner_status
+        ON posts(telegram_id, status, expires_at)
+    """)
+    # One doer's verification of a post: close/confirm/reject_raid.
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_verifications_post_doer
+        ON verifications(post_id, doer_id)
+    """)
+    # Delivered-notification pruning: status = 'sent' AND sent_at < ?.
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_outbox_sent
+        ON notification_outbox(status, sent_at)
+    """)
+
+
+def _page_order_indexes(c: sqlite3.Cursor):
+    """Keyset pages order by id after their equality filters; these indexes
+    end in id so a page is an index walk with no sort (see query_plans.py)."""
+    # Review queue page: status = 'pending' ORDER BY id.
+    # Raid feed page: status = 'approved' ORDER BY id DESC, expires_at checked per row.
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_posts_status_id
+        ON posts(status, id)
+    """)
+    # Group raid feed page: status = 'approved' AND group_id = ? ORDER BY id DESC.
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_posts_status_group_id
+        ON posts(status, group_id, id)
+    """)
+    # A user's active raids page: telegram_id = ? AND status = ? ORDER BY id DESC.
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_posts_owner_status_id
+        ON posts(telegram_id, status, id)
+    """)
+    # Raid responses page: post_id = ? ORDER BY id.
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_verifications_post_id
+        ON verifications(post_id, id)
+    """)
+
+
+# (version, name, migration), in order. Append only.
+MIGRATIONS = [
+    (1, "baseline", _baseline),
+    (2, "composite_indexes", _composite_indexes),
+    (3, "page_order_indexes", _page_order_indexes),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(path: str | None = None) -> int:
+    conn = sqlite3.connect(path or db.DB_FILE)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def run_migrations(path: str | None = None) -> list[int]:
+    """Bring the database at `path` (db.DB_FILE) up to LATEST_VERSION.
+
+    Returns the versions applied, [] when it was already up to date. Safe to
+    run from several processes at once: the version is re-read under the
+    write lock before anything is applied.
+    """
+    conn = sqlite3.connect(path or db.DB_FILE, isolation_level=None,
+                           timeout=db.DB_POOL_TIMEOUT)
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version == LATEST_VERSION:
+            return []
+        if version > LATEST_VERSION:
+            raise RuntimeError(
+                f"Database schema is version {version}, newer than this code "
+                f"(version {LATEST_VERSION}); refusing to start")
+
+        db.apply_storage_profile(conn)
+        applied = []
+        for target, name, migration in MIGRATIONS:
+            c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                version = c.execute("PRAGMA user_version").fetchone()[0]
+                if target <= version:
+                    c.execute("COMMIT")
+                    continue
+                started = time.perf_counter()
+                c.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version      INTEGER PRIMARY KEY,
+                        name         TEXT NOT NULL,
+                        applied_at   INTEGER NOT NULL,
+                        duration_ms  REAL
+                    )
+                """)
+                migration(c)
+                duration_ms = (time.perf_counter() - started) * 1000
+                c.execute(
+                    "INSERT INTO schema_version (version, name, applied_at, duration_ms) "
+                    "VALUES (?, ?, ?, ?)",
+                    (target, name, db.now_ts(), duration_ms))
+                c.execute(f"PRAGMA user_version = {target}")
+                c.execute("COMMIT")
+            except BaseException:
+                c.execute("ROLLBACK")
+                raise
+            applied.append(target)
+            logger.info("🗄️ Applied migration %d (%s) in %.1f ms", target, name, duration_ms)
+        return applied
+    finally:
+        conn.close()
@@ -0,0 +1,118 @@
+"""Background worker that delivers the notification_outbox table.
+
+State changes in db.py queue their notifications in the same transaction
+(see db._enqueue_notification). This worker claims due rows in batches, hands
+them to the outbound dispatcher and acknowledges each one only after Telegram
+accepted it, so a crash or restart resends rather than loses messages.
+"""
+import asyncio
+import logging
+import os
+import time
+
+from telegram.error import BadRequest, Forbidden
+
+import db
+from async_db import (
+    claim_notifications, mark_notifications_sent, retry_notification,
+    fail_notification, prune_outbox
+)
+from dispatcher import outbound
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))
+OUTBOX_RETRY_BASE = 5           # seconds; doubled per attempt
+OUTBOX_RETRY_MAX = 3600
+OUTBOX_PRUNE_INTERVAL = 3600
+
+
+class OutboxWorker:
+    def __init__(self, batch_size: int = OUTBOX_BATCH_SIZE,
+                 poll_interval: float = OUTBOX_POLL_INTERVAL):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+        self._last_prune = 0.0
+        self._stats = {"batches": 0, "delivered": 0, "retried": 0, "failed": 0}
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        db.add_outbox_listener(self._wake_threadsafe)
+        self._task = asyncio.create_task(self._run(), name="outbox-worker")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def _wake_threadsafe(self):
+        # Runs on the db writer thread right after a commit.
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self):
+        while True:
+            try:
+                delivered = await self.drain_once()
+            except Exception:
+                logger.exception("Outbox batch failed")
+                delivered = 0
+
+            if time.monotonic() - self._last_prune > OUTBOX_PRUNE_INTERVAL:
+                self._last_prune = time.monotonic()
+                removed = await prune_outbox()
+                if removed:
+                    logger.info("Pruned %d delivered notification(s)", removed)
+
+            if delivered < self.batch_size:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def drain_once(self) -> int:
+        """Claim and deliver one batch. Returns the number of rows claimed."""
+        rows = await claim_notifications(self.batch_size)
+        if not rows:
+            return 0
+
+        self._stats["batches"] += 1
+        results = await asyncio.gather(
+            *(outbound.send_message(row["chat_id"], row["text"],
+                                    parse_mode=row["parse_mode"])
+              for row in rows),
+            return_exceptions=True)
+
+        sent = []
+        for row, result in zip(rows, results):
+            if not isinstance(result, Exception):
+                sent.append(row["id"])
+            elif isinstance(result, (Forbidden, BadRequest)):
+                # Blocked the bot, chat gone, bad markup: retrying won't help.
+                self._stats["failed"] += 1
+                await fail_notification(row["id"], str(result))
+            else:
+                self._stats["retried"] += 1
+                delay = min(OUTBOX_RETRY_BASE * 2 ** row["attempts"], OUTBOX_RETRY_MAX)
+                await retry_notification(row["id"], str(result), delay)
+
+        if sent:
+            self._stats["delivered"] += len(sent)
+            await mark_notifications_sent(sent)
+        return len(rows)
+
+    def stats(self) -> dict:
+        return dict(self._stats)
+
+
+outbox_worker = OutboxWorker()
@@ -0,0 +1,114 @@
+"""On-demand sampling profiler for the running bot.
+
+`profiler.sample(seconds)` wakes up every PROFILE_INTERVAL seconds on a
+thread of its own, reads the stack of every other thread through
+sys._current_frames() and counts identical stacks. The threads being
+sampled are never paused or traced, so the bot keeps serving real load
+while it runs. Its cost is one stack walk per thread per tick.
+
+The result is in the collapsed-stack format, one line per distinct stack:
+
+    MainThread;run_polling (...);... ;handle_raid_participation (bot.py:612) 37
+
+Each stack starts with the thread name (the event loop, APScheduler, the DB
+executor and writer, Flask), so the file feeds straight into flamegraph.pl
+or speedscope.app. Admins start it with /profiler [seconds].
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.01"))
+PROFILE_MAX_SECONDS = 300
+
+
+def _label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._running = False
+        self._stats = {"profiles": 0, "samples_total": 0, "last_overhead": 0.0}
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def sample(self, seconds: float) -> tuple[str, dict]:
+        """Sample every thread for `seconds`; blocks, so call it off the loop.
+
+        Returns the collapsed stacks and a summary of the run.
+        """
+        seconds = min(seconds, PROFILE_MAX_SECONDS)
+        with self._lock:
+            if self._running:
+                raise RuntimeError("A profile is already running.")
+            self._running = True
+        try:
+            return self._sample(seconds)
+        finally:
+            self._running = False
+
+    def _sample(self, seconds: float) -> tuple[str, dict]:
+        me = threading.get_ident()
+        labels = {}                   # code object -> frame label
+        stacks = Counter()
+        ticks = 0
+        busy = 0.0
+        started = time.perf_counter()
+        deadline = started + seconds
+        next_tick = started
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _label(code)
+                    stack.append(label)
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                stacks[";".join(reversed(stack))] += 1
+            ticks += 1
+            busy += time.perf_counter() - now
+            next_tick += self.interval
+            time.sleep(max(0.0, next_tick - time.perf_counter()))
+
+        elapsed = time.perf_counter() - started
+        summary = {
+            "seconds": elapsed,
+            "ticks": ticks,
+            "samples": sum(stacks.values()),
+            "stacks": len(stacks),
+            # Share of one core the sampler itself used.
+            "overhead": busy / elapsed if elapsed else 0.0,
+        }
+        self._stats["profiles"] += 1
+        self._stats["samples_total"] += summary["samples"]
+        self._stats["last_overhead"] = summary["overhead"]
+        logger.info("🔬 Profiled %.0fs: %d samples over %d ticks, %d distinct stacks, "
+                    "sampler used %.1f%% of a core", elapsed, summary["samples"], ticks,
+                    summary["stacks"], summary["overhead"] * 100)
+        collapsed = "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        return collapsed, summary
+
+    def stats(self) -> dict:
+        return dict(self._stats, running=int(self._running))
+
+
+profiler = SamplingProfiler()
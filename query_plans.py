@@ -0,0 +1,243 @@
+"""EXPLAIN QUERY PLAN check for every query db.py runs.
+
+Walks db.py's public functions against a scratch database built by the
+migrations, records each statement they execute (including the ones they run
+indirectly, such as user cache loads and keyset cursor lookups) through a
+connection trace hook, and asks SQLite for the plan of each one. The check
+fails when:
+
+* a statement reads a whole table or a whole index, unless it is an index-order
+  walk cut short by a LIMIT, or the function is a bulk read in BULK_READS;
+* a keyset page function (*_page) sorts in a temp B-tree, i.e. no index
+  yields its ORDER BY and every page would sort all its matching rows;
+* a public db.py query function is missing from _tour, so new queries cannot
+  slip past unchecked.
+
+    python db_setup.py check-plans [-v]
+
+tests/test_query_plans.py runs the same check under pytest.
+"""
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+
+import db
+from migrations import run_migrations
+
+# Functions whose job is to read a whole table; a full scan is the plan.
+BULK_READS = {
+    "get_follow_suggestions",   # whole pool; the bot pages with *_page instead
+    "get_follow_graph",         # matchmaking snapshot of every follow edge
+    "rebuild_user_stats",       # USER_STATS_QUERY over posts and slot_logs
+    "find_user_stats_drift",    # ... and all of user_stats
+    "outbox_stats",             # counts the outbox by status; pruned to a week
+}
+
+_FULL_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX \w+)?$")
+_INDEX_WALK = re.compile(r" USING (?:COVERING )?INDEX ")
+_LIMIT = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+_TEMP_SORT = "USE TEMP B-TREE FOR ORDER BY"
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b-?\d+(?:\.\d+)?\b")
+_PLANNED = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+
+
+class _Recorder:
+    """Collects traced statements under the name of the db.py function that
+    is currently running. Mutations run on the writer thread, but every call
+    blocks until it commits, so one current name is enough."""
+
+    def __init__(self):
+        self.current = None
+        self.called = set()       # every function _tour ran, queries or not
+        self.statements = {}      # function name -> {shape: first sql seen}
+        self._lock = threading.Lock()
+
+    def hook(self, conn: sqlite3.Connection):
+        conn.set_trace_callback(self._trace)
+
+    def _trace(self, sql: str):
+        sql = sql.strip()
+        if self.current is None or not sql.upper().startswith(_PLANNED):
+            return
+        # Traced SQL has its parameters inlined; one plan per statement shape.
+        shape = _LITERAL.sub("?", sql)
+        with self._lock:
+            self.statements.setdefault(self.current, {}).setdefault(shape, sql)
+
+    def call(self, fn, *args, **kwargs):
+        self.current = fn.__name__
+        self.called.add(fn.__name__)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.current = None
+
+
+def _tour(call):
+    """Run every public query function of db.py at least once."""
+    for uid in range(1, 21):
+        call(db.add_user, uid, f"user{uid}", 1 if uid > 1 else None)
+    call(db.save_tokens, 2, "handle2", "x-2", "access-2", "refresh-2")
+    call(db.set_twitter_handle, 3, "handle3")
+    call(db.get_user, 4)
+    call(db.get_user_slots, 4)
+    call(db.get_twitter_handle, 5)
+    call(db.add_task_slot, 4, 1.0)
+    call(db.is_user_banned, 4)
+
+    for uid in range(1, 11):
+        call(db.save_post, uid, f"https://x.com/user{uid}/status/{uid}", -100 if uid % 2 else None)
+    call(db.update_last_post_time, 6)
+    call(db.is_in_cooldown, 6, 3)
+    call(db.get_cooldown_remaining, 6, 3)
+    call(db.get_post_link_by_id, 1)
+    call(db.get_post_owner_id, 1)
+    call(db.get_pending_count)
+    call(db.get_pending_posts)
+    page = call(db.get_pending_posts_page, 3)
+    call(db.get_pending_posts_page, 3, after=page.rows[-1][0])
+    call(db.get_pending_posts_page, 3, before=page.rows[-1][0])
+    for post_id in (1, 2, 3, 4):
+        call(db.approve_post, post_id)
+    call(db.reject_post, 5)
+    call(db.transition_post, 6, "pending", "rejected")
+    call(db.auto_approve_stale_posts)
+
+    call(db.get_recent_approved_posts)
+    call(db.get_recent_approved_posts, -100, with_time=True)
+    call(db.get_active_raids_for_user, 7)
+    call(db.get_active_raids_for_user, 7, -100)
+    call(db.get_active_raids_page, 7, limit=2)
+    call(db.get_active_raids_page, 7, -100, limit=2, after=4)
+    call(db.get_user_active_posts, 1)
+    call(db.get_user_active_posts_page, 1, after=5)
+    call(db.get_raid_deadlines)
+
+    call(db.mark_post_completed, 7, 1)
+    call(db.has_completed_post, 7, 1)
+    for doer in (7, 8, 9):
+        call(db.create_verification, 1, doer, 1)
+    call(db.get_verifications_for_post, 1)
+    call(db.get_verifications_page, 1, 2)
+    call(db.get_verifications_page, 1, 2, after=1)
+    call(db.confirm_raid, 1, 7)
+    call(db.reject_raid, 1, 8)
+    call(db.close_verification, 1, 9)
+    call(db.update_verification_status, 1, 9, "confirmed")
+
+    call(db.expire_posts, [1, 2])
+    call(db.expire_old_posts)
+    call(db.get_expired_unconfirmed_verifications)
+    call(db.ban_unresponsive_post_owners)
+    call(db.ban_user_from_posting, 8)
+
+    for uid in range(1, 11):
+        call(db.join_follow_pool, uid, f"handle{uid}")
+    call(db.is_in_follow_pool, 1)
+    call(db.create_follow_action, 2, 1)
+    call(db.create_follow_action, 3, 1)
+    call(db.confirm_follow_back, 1, 2)
+    call(db.ignore_follow, 1, 3)
+    call(db.get_pending_followers, 1)
+    call(db.get_follow_stats, 1)
+    call(db.count_followers, 1)
+    call(db.count_follow_backs, 1)
+    call(db.get_follow_suggestions, 2)
+    call(db.get_follow_suggestions_page, 2, 3)
+    call(db.get_follow_suggestions_page, 2, 3, after=4)
+    call(db.get_follow_cards, [1, 3, 5])
+    call(db.get_follow_graph)
+    call(db.leave_follow_pool, 10)
+
+    call(db.get_user_stats, 1)
+    call(db.rebuild_user_stats)
+    call(db.find_user_stats_drift)
+
+    call(db.enqueue_notification, 1, "hello", dedupe_key="plans:1")
+    claimed = call(db.claim_notifications)
+    call(db.mark_notifications_sent, [row["id"] for row in claimed[:1]])
+    call(db.retry_notification, claimed[1]["id"], "timeout", 1)
+    call(db.fail_notification, claimed[2]["id"], "blocked")
+    call(db.prune_outbox)
+    call(db.outbox_stats)
+
+    call(db.backup_database, os.path.join(os.path.dirname(db.DB_FILE), "backup.db"))
+
+
+def query_functions() -> set[str]:
+    """Every public db.py function that runs a query (all but db._NOT_QUERIES)."""
+    return {name for name, fn in vars(db).items()
+            if callable(fn) and not isinstance(fn, type) and not name.startswith("_")
+            and getattr(fn, "__module__", None) == "db" and name not in db._NOT_QUERIES}
+
+
+def collect_plans() -> tuple[dict, set[str]]:
+    """({function name: [(sql, [plan detail, ...]), ...]}, functions the tour
+    never called) for a fresh database."""
+    saved_file = db.DB_FILE
+    workdir = tempfile.mkdtemp(prefix="bot-plans-")
+    recorder = _Recorder()
+    db.close_writer()
+    db.close_pool()
+    db.DB_FILE = os.path.join(workdir, "bot_data.db")
+    try:
+        run_migrations()
+        db.add_connection_hook(recorder.hook)
+        try:
+            _tour(recorder.call)
+        finally:
+            db._connection_hooks.remove(recorder.hook)
+            db.close_writer()
+            db.close_pool()
+
+        plans = {}
+        conn = sqlite3.connect(db.DB_FILE)
+        try:
+            for name, statements in recorder.statements.items():
+                plans[name] = [
+                    (sql, [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")])
+                    for sql in statements.values()]
+        finally:
+            conn.close()
+        return plans, query_functions() - recorder.called
+    finally:
+        db.DB_FILE = saved_file
+
+
+def full_scans(sql: str, plan: list[str]) -> list[str]:
+    """Plan steps that read a whole table or index. Walking an index in order
+    under a LIMIT stops after the page, so it only counts without one."""
+    limited = bool(_LIMIT.search(sql))
+    return [detail for detail in plan if _FULL_SCAN.match(detail)
+            and not (limited and _INDEX_WALK.search(detail))]
+
+
+def sorts(name: str, plan: list[str]) -> list[str]:
+    """Temp B-tree sorts in a keyset page function's plan."""
+    return [detail for detail in plan if name.endswith("_page") and detail == _TEMP_SORT]
+
+
+def check_query_plans(verbose: bool = False) -> bool:
+    """Print every statement that scans or page-sorts, and every query function
+    missing from the tour; True if there are none."""
+    plans, untoured = collect_plans()
+    failures = 0
+    for name, statements in plans.items():
+        for sql, plan in statements:
+            scans = full_scans(sql, plan)
+            bad = bool(scans) and name not in BULK_READS or bool(sorts(name, plan))
+            failures += bad
+            if bad or verbose:
+                mark = "❌" if bad else ("⚠️" if scans else "✅")
+                print(f"{mark} {name}: {' '.join(sql.split())[:120]}")
+                for detail in plan:
+                    print(f"      {detail}")
+    for name in sorted(untoured):
+        print(f"❌ {name}: not exercised by query_plans._tour, so its plans go unchecked")
+    total = sum(len(statements) for statements in plans.values())
+    print(f"{'❌' if failures or untoured else '✅'} query plans: {failures} full scan(s) or "
+          f"page sort(s) in {total} statement(s) from {len(plans)} function(s); "
+          f"{len(untoured)} query function(s) not in the tour.")
+    return not failures and not untoured
@@ -0,0 +1,179 @@
+"""Replay recorded Telegram updates against a bot running in webhook mode.
+
+Stands in for Telegram on both sides of a local run:
+
+* a Bot API stand-in on --api-port that answers every method the bot calls
+  (getMe, setWebhook, sendMessage, ...) with a plausible success, so handlers
+  run end to end without touching real chats;
+* a client that POSTs each recorded update (one JSON object per line, as
+  written by UPDATE_RECORD_FILE) to the webhook the bot registered, with the
+  secret token it registered, at --rate updates/s over --concurrency
+  connections.
+
+    TELEGRAM_API_BASE_URL=http://127.0.0.1:8081 BOT_MODE=webhook \\
+        WEBHOOK_URL=http://127.0.0.1:8080 WEBHOOK_SECRET=local python bot.py
+    python replay_updates.py updates.jsonl --rate 200
+
+Update ids are renumbered so a file can be replayed more than once.
+"""
+import argparse
+import itertools
+import json
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+import requests
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Replay", "username": "replay_bot"}
+
+
+class FakeBotAPI(BaseHTTPRequestHandler):
+    """Answers /bot<token>/<method> like the Bot API would on success."""
+    webhook = {}                  # url and secret_token from the last setWebhook
+    registered = threading.Event()
+    calls = Counter()
+    message_ids = itertools.count(1)
+    lock = threading.Lock()
+
+    def do_POST(self):
+        method = self.path.rsplit("/", 1)[-1]
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            params = json.loads(body or b"{}")
+        else:
+            params = dict(parse_qsl(body.decode()))
+        with self.lock:
+            self.calls[method] += 1
+        if method == "setWebhook":
+            FakeBotAPI.webhook = {"url": params.get("url"), "secret": params.get("secret_token")}
+            self.registered.set()
+        self._reply(self._result(method, params))
+
+    do_GET = do_POST
+
+    def _result(self, method: str, params: dict):
+        if method == "getMe":
+            return BOT_USER
+        if method == "getChatMember":
+            return {"status": "member",
+                    "user": {"id": int(params.get("user_id", 0)), "is_bot": False,
+                             "first_name": "user"}}
+        if method.startswith(("send", "edit", "copy", "forward")):
+            chat_id = params.get("chat_id") or 0
+            return {"message_id": next(self.message_ids), "date": int(time.time()),
+                    "chat": {"id": int(chat_id), "type": "private"},
+                    "from": BOT_USER, "text": params.get("text", "")}
+        return True
+
+    def _reply(self, result):
+        data = json.dumps({"ok": True, "result": result}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def load_updates(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def replay(updates: list[dict], url: str, secret: str, rate: float,
+           concurrency: int, first_id: int) -> dict:
+    """POST every update, paced at `rate`/s; a 503 is retried after Retry-After."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret or ""}
+    statuses = Counter()
+    latencies = []
+    lock = threading.Lock()
+
+    def post(update: dict):
+        while True:
+            started = time.perf_counter()
+            try:
+                res = session.post(url, json=update, headers=headers, timeout=30)
+                status = res.status_code
+            except requests.RequestException:
+                status, res = "error", None
+            with lock:
+                statuses[status] += 1
+                latencies.append(time.perf_counter() - started)
+            if status != 503:
+                return
+            time.sleep(float(res.headers.get("Retry-After", 1)))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for n, update in enumerate(updates):
+            update = dict(update, update_id=first_id + n)
+            if rate:
+                delay = started + n / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(post, update)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "updates": len(updates),
+        "seconds": elapsed,
+        "statuses": dict(statuses),
+        "post_p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "post_p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("updates", help="JSON-lines file of recorded updates")
+    parser.add_argument("--api-port", type=int, default=8081,
+                        help="port for the Bot API stand-in (0 to skip it)")
+    parser.add_argument("--url", help="webhook URL (default: the one the bot registers)")
+    parser.add_argument("--secret", help="secret token (default: the one the bot registers)")
+    parser.add_argument("--rate", type=float, default=50, help="updates per second, 0 for no pacing")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--wait", type=float, default=60,
+                        help="seconds to wait for the bot to register its webhook")
+    parser.add_argument("--linger", type=float, default=2,
+                        help="seconds to keep answering Bot API calls after the last update")
+    args = parser.parse_args()
+
+    updates = load_updates(args.updates)
+    if args.api_port:
+        server = ThreadingHTTPServer(("127.0.0.1", args.api_port), FakeBotAPI)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"🧪 Bot API stand-in on http://127.0.0.1:{args.api_port}")
+
+    url, secret = args.url, args.secret
+    if url is None:
+        print("⏳ Waiting for the bot to call setWebhook...")
+        if not FakeBotAPI.registered.wait(args.wait):
+            sys.exit("❌ The bot never registered a webhook; pass --url/--secret.")
+        url = FakeBotAPI.webhook["url"]
+        secret = secret or FakeBotAPI.webhook["secret"]
+
+    result = replay(updates, url, secret, args.rate, args.concurrency,
+                    first_id=int(time.time() * 1000))
+    time.sleep(args.linger)
+    print(f"✅ Replayed {result['updates']} update(s) in {result['seconds']:.2f}s "
+          f"to {url}: {result['statuses']}")
+    print(f"   POST latency p50 {result['post_p50_ms']:.2f} ms, p99 {result['post_p99_ms']:.2f} ms")
+    if args.api_port:
+        print(f"   Bot API calls: {dict(FakeBotAPI.calls.most_common())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+# The bot is a flat set of modules at the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+
+
+@pytest.fixture
+def fresh_db(tmp_path):
+    """Point db.py at a migrated scratch database for one test."""
+    saved_file = db.DB_FILE
+    db.close_writer()
+    db.close_pool()
+    db.DB_FILE = str(tmp_path / "bot_data.db")
+    db._user_cache.clear()
+    run_migrations()
+    try:
+        yield db
+    finally:
+        db.close_writer()
+        db.close_pool()
+        db.DB_FILE = saved_file
+        db._user_cache.clear()
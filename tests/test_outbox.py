@@ -0,0 +1,49 @@
+def _status(db, notification_id):
+    with db._connect() as conn:
+        return conn.execute(
+            "SELECT status, attempts FROM notification_outbox WHERE id = ?",
+            (notification_id,)).fetchone()
+
+
+def test_claimed_row_is_hidden_until_retried(fresh_db):
+    db = fresh_db
+    assert db.enqueue_notification(1, "hello", dedupe_key="t:1")
+    assert not db.enqueue_notification(1, "hello", dedupe_key="t:1")
+
+    claimed = db.claim_notifications()
+    assert [(row["chat_id"], row["attempts"]) for row in claimed] == [(1, 1)]
+    notification_id = claimed[0]["id"]
+
+    # The lease is live: another worker (or the next tick) must not resend it.
+    assert db.claim_notifications() == []
+
+    db.retry_notification(notification_id, "timeout", 0)
+    assert _status(db, notification_id) == ("pending", 1)
+    reclaimed = db.claim_notifications()
+    assert [(row["id"], row["attempts"]) for row in reclaimed] == [(notification_id, 2)]
+
+    db.mark_notifications_sent([notification_id])
+    assert _status(db, notification_id) == ("sent", 2)
+    assert db.claim_notifications() == []
+
+
+def test_expired_lease_is_claimed_again(fresh_db, monkeypatch):
+    db = fresh_db
+    monkeypatch.setattr(db, "OUTBOX_LEASE_SECONDS", 0)
+    db.enqueue_notification(1, "hello")
+    first = db.claim_notifications()
+    # The worker died without acknowledging; the row is due again.
+    again = db.claim_notifications()
+    assert [row["id"] for row in again] == [row["id"] for row in first]
+    assert again[0]["attempts"] == 2
+
+
+def test_retry_gives_up_after_max_attempts(fresh_db, monkeypatch):
+    db = fresh_db
+    monkeypatch.setattr(db, "OUTBOX_MAX_ATTEMPTS", 2)
+    db.enqueue_notification(1, "hello")
+    for _ in range(2):
+        notification_id = db.claim_notifications()[0]["id"]
+        db.retry_notification(notification_id, "timeout", 0)
+    assert _status(db, notification_id) == ("failed", 2)
+    assert db.claim_notifications() == []
@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+
+
+def _race(*calls):
+    """Start every call at the same moment and return their results in order."""
+    barrier = Barrier(len(calls))
+
+    def run(call):
+        barrier.wait()
+        return call()
+
+    with ThreadPoolExecutor(len(calls)) as pool:
+        return list(pool.map(run, calls))
+
+
+def _pending_post(db):
+    db.add_user(1, "owner")  # new users start with two slots
+    db.save_post(1, "https://x.com/owner/status/1")
+    return db.get_pending_posts()[0][0]
+
+
+def test_concurrent_approvals_charge_one_slot(fresh_db):
+    db = fresh_db
+    post_id = _pending_post(db)
+
+    outcomes = _race(lambda: db.approve_post(post_id), lambda: db.approve_post(post_id))
+
+    assert sorted(outcomes, key=str) == [None, "approved"]
+    assert db.get_user_slots(1) == 1
+    with db._connect() as conn:
+        assert conn.execute(
+            "SELECT COUNT(*) FROM notification_outbox WHERE chat_id = 1").fetchone()[0] == 1
+
+
+def test_approve_and_reject_race_has_one_winner(fresh_db):
+    db = fresh_db
+    post_id = _pending_post(db)
+
+    approved, rejected = _race(lambda: db.approve_post(post_id), lambda: db.reject_post(post_id))
+
+    with db._connect() as conn:
+        status = conn.execute("SELECT status FROM posts WHERE id = ?", (post_id,)).fetchone()[0]
+    if approved == "approved":
+        assert (status, rejected, db.get_user_slots(1)) == ("approved", False, 1)
+    else:
+        assert (status, approved, rejected, db.get_user_slots(1)) == ("rejected", None, True, 2)
+
+
+def test_approve_without_slots_rejects(fresh_db):
+    db = fresh_db
+    post_id = _pending_post(db)
+    db.add_task_slot(1, -2)
+    assert db.approve_post(post_id) == "rejected"
+    assert db.approve_post(post_id) is None
@@ -0,0 +1,6 @@
+from query_plans import check_query_plans
+
+
+def test_every_query_plan_passes():
+    # Prints the offending plans on failure; pytest shows them with the error.
+    assert check_query_plans()
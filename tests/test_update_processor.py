@@ -0,0 +1,64 @@
+import asyncio
+
+from telegram import Update
+
+from update_processor import KeyedUpdateProcessor, update_keys
+
+_next_update_id = iter(range(1, 1_000_000))
+
+
+def _message(user_id):
+    return Update.de_json({
+        "update_id": next(_next_update_id),
+        "message": {
+            "message_id": 1, "date": 0, "text": "/start",
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "u"},
+        },
+    }, None)
+
+
+def _callback(user_id, data):
+    return Update.de_json({
+        "update_id": next(_next_update_id),
+        "callback_query": {
+            "id": "1", "chat_instance": "1", "data": data,
+            "from": {"id": user_id, "is_bot": False, "first_name": "u"},
+        },
+    }, None)
+
+
+def test_same_user_updates_run_in_order():
+    events = []
+
+    async def handler(name, delay):
+        events.append(("start", name))
+        await asyncio.sleep(delay)
+        events.append(("end", name))
+
+    async def main():
+        processor = KeyedUpdateProcessor(concurrency=4, max_waiting=16)
+        await processor.initialize()
+        first = asyncio.create_task(processor.do_process_update(_message(1), handler("1a", 0.05)))
+        await asyncio.sleep(0)  # 1a takes user 1's lock before 1b arrives
+        await asyncio.gather(
+            first,
+            processor.do_process_update(_message(1), handler("1b", 0)),
+            processor.do_process_update(_message(2), handler("2a", 0)),
+        )
+        return processor.stats()
+
+    stats = asyncio.run(main())
+
+    assert events.index(("end", "1a")) < events.index(("start", "1b"))
+    # Another user is not held up behind user 1's slow handler.
+    assert events.index(("end", "2a")) < events.index(("end", "1a"))
+    assert stats["processed"] == 3
+    assert stats["contended"] == 1
+
+
+def test_review_callbacks_also_lock_the_post():
+    assert update_keys(_message(7)) == [("user", 7)]
+    assert update_keys(_callback(7, "approve|42|9")) == [("post", 42), ("user", 7)]
+    assert update_keys(_callback(7, "reject|42|9|1700000000:5")) == [("post", 42), ("user", 7)]
+    assert update_keys(_callback(7, "menu|42")) == [("user", 7)]
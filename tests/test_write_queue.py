@@ -0,0 +1,60 @@
+import threading
+
+import pytest
+
+
+def _rows(db):
+    with db._connect() as conn:
+        return [x for x, in conn.execute("SELECT x FROM t ORDER BY x")]
+
+
+def test_failing_mutation_rolls_back_only_its_savepoint(fresh_db):
+    db = fresh_db
+    db._write(lambda conn: conn.execute("CREATE TABLE t (x INTEGER)"))
+
+    # Hold the writer inside a batch so the next three mutations queue up
+    # and are applied together in the following one.
+    started, release = threading.Event(), threading.Event()
+
+    def hold(conn):
+        started.set()
+        release.wait(5)
+
+    def fail(conn):
+        conn.execute("INSERT INTO t VALUES (2)")
+        raise ValueError("boom")
+
+    blocker = db._writer.submit(hold)
+    assert started.wait(5)
+    first = db._writer.submit(lambda conn: conn.execute("INSERT INTO t VALUES (1)").rowcount)
+    failed = db._writer.submit(fail)
+    last = db._writer.submit(lambda conn: conn.execute("INSERT INTO t VALUES (3)").rowcount)
+    before = db.writer_stats()
+    release.set()
+
+    blocker.result(5)
+    assert first.result(5) == 1
+    assert last.result(5) == 1
+    with pytest.raises(ValueError):
+        failed.result(5)
+
+    # The held batch commits, then one group commit carries all three.
+    after = db.writer_stats()
+    assert after["commits"] - before["commits"] == 2
+    assert after["applied"] - before["applied"] == 3     # hold, first, last
+    assert after["failed"] - before["failed"] == 1
+    assert _rows(db) == [1, 3]
+
+
+def test_nested_mutation_joins_the_callers_transaction(fresh_db):
+    db = fresh_db
+    db._write(lambda conn: conn.execute("CREATE TABLE t (x INTEGER)"))
+
+    def outer(conn):
+        conn.execute("INSERT INTO t VALUES (1)")
+        db._write(lambda inner: inner.execute("INSERT INTO t VALUES (2)"))
+        raise ValueError("undo both")
+
+    with pytest.raises(ValueError):
+        db._write(outer)
+    assert _rows(db) == []
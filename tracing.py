@@ -0,0 +1,237 @@
+"""Per-update trace spans: where the time of one Telegram update went.
+
+A trace opens when the update processor picks an update up and follows it
+through its handlers:
+
+* lock/slot  waiting for the user's lock and for a handler slot;
+* handler    each handler callback that ran;
+* db         each async_db call, labelled by db.py function, with rows returned;
+* queue/bot  each outbound message: its wait in the dispatcher queue, then the
+             Bot API request itself. Sends usually finish after the handler
+             returns, and still land in the update's trace.
+
+Every update is traced while it runs; afterwards a trace is kept in a ring
+buffer of TRACE_BUFFER if it was sampled (TRACE_SAMPLE_RATE) or took longer
+than TRACE_SLOW_MS, so tracing can stay on in production and a slow "Done"
+is always there to look at. Admins read the buffer with /traces, and
+GET /traces on the Flask app returns it when TRACES_TOKEN is set.
+"""
+import contextvars
+import functools
+import hmac
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from flask import Blueprint, Response, abort, request
+from telegram import Update
+from telegram.request import HTTPXRequest
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.05"))
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "1000"))
+TRACE_BUFFER = int(os.getenv("TRACE_BUFFER", "200"))
+TRACES_TOKEN = os.getenv("TRACES_TOKEN")
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+class Span:
+    __slots__ = ("trace", "kind", "name", "started", "duration", "rows")
+
+    def __init__(self, trace, kind: str, name: str):
+        self.trace = trace
+        self.kind = kind
+        self.name = name
+        self.started = 0.0
+        self.duration = None
+        self.rows = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.duration = time.perf_counter() - self.started
+        self.trace.spans.append(self)
+
+
+class _NullSpan:
+    """Stands in for a span when no trace is active."""
+    __slots__ = ()
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    __slots__ = ("update_id", "user_id", "kind", "sampled", "wall_time",
+                 "started", "duration", "spans")
+
+    def __init__(self, update, sampled: bool):
+        self.update_id = getattr(update, "update_id", None)
+        user = update.effective_user if isinstance(update, Update) else None
+        self.user_id = user.id if user else None
+        self.kind = _update_kind(update)
+        self.sampled = sampled
+        self.wall_time = time.time()
+        self.started = time.perf_counter()
+        self.duration = None
+        self.spans = []
+
+    def waterfall(self) -> str:
+        """One line per span: offset, duration, indented when inside a handler."""
+        total = self.duration or (time.perf_counter() - self.started)
+        lines = [f"update {self.update_id} from {self.user_id} ({self.kind}) at "
+                 f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.wall_time))}: "
+                 f"{total * 1000:.1f} ms{'' if self.sampled else ' [slow]'}"]
+        spans = sorted(self.spans, key=lambda s: (s.started, -s.duration))
+        handlers = [(s.started, s.started + s.duration) for s in spans if s.kind == "handler"]
+        for span in spans:
+            inside = span.kind != "handler" and any(
+                start <= span.started and span.started + span.duration <= end
+                for start, end in handlers)
+            rows = f" ({span.rows} rows)" if span.rows is not None else ""
+            lines.append(f"  +{(span.started - self.started) * 1000:8.1f} ms "
+                         f"{span.duration * 1000:8.1f} ms  {'  ' if inside else ''}"
+                         f"{span.kind} {span.name}{rows}")
+        return "\n".join(lines)
+
+
+def _update_kind(update) -> str:
+    if not isinstance(update, Update):
+        return type(update).__name__
+    if update.callback_query:
+        return f"callback {(update.callback_query.data or '').split('|', 1)[0]}"
+    message = update.effective_message
+    if message and message.text:
+        return "command" if message.text.startswith("/") else "text"
+    return "other"
+
+
+def row_count(result):
+    if isinstance(result, (list, tuple)):
+        # db.Page is a namedtuple whose first field is the rows.
+        return len(result[0]) if getattr(result, "_fields", ("",))[0] == "rows" else len(result)
+    if isinstance(result, dict):
+        return 1
+    if result is None:
+        return 0
+    return None
+
+
+class Tracer:
+    def __init__(self, sample_rate: float = TRACE_SAMPLE_RATE,
+                 slow_ms: float = TRACE_SLOW_MS, size: int = TRACE_BUFFER):
+        self.sample_rate = sample_rate
+        self.slow = slow_ms / 1000
+        self._traces = deque(maxlen=size)
+        self._lock = threading.Lock()     # the Flask thread reads the buffer
+        self._stats = {"traced": 0, "kept": 0, "kept_slow": 0}
+
+    # ───── Traces ─────
+
+    def begin(self, update):
+        """Start tracing `update` in the current task; pass the token to end()."""
+        trace = Trace(update, random.random() < self.sample_rate)
+        return trace, _current.set(trace)
+
+    def end(self, trace: Trace, token):
+        _current.reset(token)
+        trace.duration = time.perf_counter() - trace.started
+        self._stats["traced"] += 1
+        if trace.sampled or trace.duration >= self.slow:
+            self._stats["kept"] += 1
+            self._stats["kept_slow"] += not trace.sampled
+            with self._lock:
+                self._traces.append(trace)
+
+    def current(self) -> Trace | None:
+        return _current.get()
+
+    def activate(self, trace: Trace | None):
+        """Re-enter `trace` from another task (the outbound dispatcher)."""
+        return _current.set(trace)
+
+    def deactivate(self, token):
+        _current.reset(token)
+
+    # ───── Spans ─────
+
+    def span(self, kind: str, name: str):
+        trace = _current.get()
+        return _NULL_SPAN if trace is None else Span(trace, kind, name)
+
+    def record(self, trace: Trace | None, kind: str, name: str, started: float):
+        """Add a span to `trace` that ran from `started` (perf_counter) until now."""
+        if trace is not None:
+            span = Span(trace, kind, name)
+            span.started = started
+            span.duration = time.perf_counter() - started
+            trace.spans.append(span)
+
+    def instrument_application(self, app):
+        """Give every handler registered on `app` a span."""
+        for handlers in app.handlers.values():
+            for handler in handlers:
+                handler.callback = self._handler_span(handler.callback)
+
+    def _handler_span(self, callback):
+        @functools.wraps(callback)
+        async def handler(update, context):
+            with self.span("handler", callback.__name__):
+                return await callback(update, context)
+        return handler
+
+    # ───── Reading ─────
+
+    def traces(self, limit: int = None, slowest: bool = False) -> list[Trace]:
+        with self._lock:
+            traces = list(self._traces)
+        if slowest:
+            traces.sort(key=lambda t: t.duration, reverse=True)
+        else:
+            traces.reverse()
+        return traces[:limit]
+
+    def dump(self, limit: int = 20, slowest: bool = False) -> str:
+        traces = self.traces(limit, slowest)
+        if not traces:
+            return "No traces kept yet.\n"
+        return "\n\n".join(t.waterfall() for t in traces) + "\n"
+
+    def stats(self) -> dict:
+        return dict(self._stats, buffered=len(self._traces))
+
+
+class TracedRequest(HTTPXRequest):
+    """HTTPXRequest that records every Bot API call in the active trace."""
+
+    async def do_request(self, url, method, request_data=None, *args, **kwargs):
+        with tracer.span("bot", url.rsplit("/", 1)[-1]):
+            return await super().do_request(url, method, request_data, *args, **kwargs)
+
+
+tracer = Tracer()
+traces_blueprint = Blueprint("traces", __name__)
+
+
+@traces_blueprint.route("/traces")
+def render_traces():
+    token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    if not TRACES_TOKEN or not hmac.compare_digest(token, TRACES_TOKEN):
+        abort(404)
+    limit = request.args.get("limit", default=20, type=int)
+    slowest = request.args.get("sort") == "slowest"
+    return Response(tracer.dump(limit, slowest), mimetype="text/plain")
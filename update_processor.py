@@ -0,0 +1,137 @@
+"""Concurrent update processing with per-user ordering.
+
+PTB hands every update to `update_processor`. Updates from different users
+run in parallel, up to UPDATE_CONCURRENCY handlers at once, so one slow
+handler (an F4F board sending a hundred messages) no longer holds up
+everybody else. Each update first takes a keyed lock per telegram_id, which
+keeps a user's own updates in the order they arrived: the next tap of the
+same user waits for the previous one to finish, as it did when the whole
+bot ran one update at a time. Admin review callbacks (approve|/reject|) also
+lock their post_id, so two admins acting on one post are serialised.
+
+Updates waiting on their user's lock do not occupy a handler slot; up to
+UPDATE_MAX_WAITING of them may be admitted before PTB stops taking more.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from tracing import tracer
+
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "16"))
+UPDATE_MAX_WAITING = int(os.getenv("UPDATE_MAX_WAITING", "1024"))
+
+# Callback actions whose second field is a post id.
+POST_ACTIONS = {"approve", "reject"}
+
+
+def update_keys(update: object) -> list[tuple]:
+    """The locks an update must hold, in acquisition order."""
+    keys = []
+    if isinstance(update, Update):
+        if update.effective_user:
+            keys.append(("user", update.effective_user.id))
+        query = update.callback_query
+        if query and query.data:
+            # approve|{post_id}|{owner}[|{anchor}]: older buttons have no anchor.
+            action, *fields = query.data.split("|")
+            if action in POST_ACTIONS and fields and fields[0].isdigit():
+                keys.append(("post", int(fields[0])))
+    return sorted(keys)
+
+
+class KeyedUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, concurrency: int = UPDATE_CONCURRENCY,
+                 max_waiting: int = UPDATE_MAX_WAITING):
+        # PTB's own semaphore bounds admitted updates (running + waiting);
+        # _slots bounds the ones actually running a handler.
+        super().__init__(concurrency + max_waiting)
+        self.concurrency = concurrency
+        self._slots = None
+        self._locks = {}              # key -> [asyncio.Lock, holders + waiters]
+        self._running = 0
+        self._lock_waits = deque(maxlen=1000)
+        self._slot_waits = deque(maxlen=1000)
+        self._stats = {"processed": 0, "contended": 0, "max_lock_wait": 0.0}
+
+    async def initialize(self):
+        self._slots = asyncio.Semaphore(self.concurrency)
+
+    async def shutdown(self):
+        pass
+
+    async def do_process_update(self, update, coroutine):
+        keys = update_keys(update)
+        trace, token = tracer.begin(update)
+        started = time.perf_counter()
+        held = []
+        try:
+            for key in keys:
+                await self._acquire(key)
+                held.append(key)
+            locked = time.perf_counter()
+            if keys:
+                tracer.record(trace, "lock", " ".join(f"{k}:{v}" for k, v in keys), started)
+            async with self._slots:
+                running = time.perf_counter()
+                tracer.record(trace, "slot", "handler slot", locked)
+                self._running += 1
+                try:
+                    await coroutine
+                finally:
+                    self._running -= 1
+        finally:
+            for key in reversed(held):
+                self._release(key)
+            tracer.end(trace, token)
+
+        lock_wait = locked - started
+        self._lock_waits.append(lock_wait)
+        self._slot_waits.append(running - locked)
+        self._stats["processed"] += 1
+        if lock_wait > 0.001:
+            self._stats["contended"] += 1
+        self._stats["max_lock_wait"] = max(self._stats["max_lock_wait"], lock_wait)
+
+    async def _acquire(self, key):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            await entry[0].acquire()
+        except BaseException:
+            self._forget(key, entry)
+            raise
+
+    def _release(self, key):
+        entry = self._locks[key]
+        entry[0].release()
+        self._forget(key, entry)
+
+    def _forget(self, key, entry):
+        entry[1] -= 1
+        if not entry[1]:
+            del self._locks[key]
+
+    def stats(self) -> dict:
+        def pct(samples, p):
+            samples = sorted(samples)
+            return samples[min(len(samples) - 1, int(len(samples) * p))] if samples else 0.0
+
+        return dict(
+            self._stats,
+            running=self._running,
+            admitted=self.current_concurrent_updates,
+            locked_keys=len(self._locks),
+            lock_wait_p50=pct(self._lock_waits, 0.50),
+            lock_wait_p99=pct(self._lock_waits, 0.99),
+            slot_wait_p99=pct(self._slot_waits, 0.99),
+        )
+
+
+update_processor = KeyedUpdateProcessor()
@@ -0,0 +1,194 @@
+"""Webhook ingestion for Telegram updates (BOT_MODE=webhook).
+
+Telegram POSTs each update to WEBHOOK_PATH on the Flask app that already
+serves the OAuth routes. The view checks the secret token Telegram echoes
+back (WEBHOOK_SECRET, required in this mode, so every replica and restart
+checks the same token), decodes the update and hands it to the PTB event
+loop, so an update reaches its handler one HTTP request after it happened
+instead of waiting out a long-poll round trip.
+
+Ingress is bounded: at most WEBHOOK_MAX_PENDING accepted updates may be
+waiting for a handler. Past that the view answers 503 and Telegram
+redelivers later, so a burst backs up at Telegram rather than in our memory.
+Flask serves requests on a thread each, and the endpoint sits behind any
+load balancer, which long polling (one getUpdates consumer per token)
+cannot.
+
+UPDATE_RECORD_FILE, in either mode, appends every incoming update as a JSON
+line; replay_updates.py plays such a file back against this endpoint.
+"""
+import asyncio
+import hmac
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from collections import deque
+
+from flask import Blueprint, request
+from telegram import Update
+from telegram.ext import TypeHandler
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")     # public base URL of the Flask app
+WEBHOOK_PATH = "/telegram/webhook"
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_MAX_PENDING = int(os.getenv("WEBHOOK_MAX_PENDING", "1000"))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+WEBHOOK_MAX_BODY = 1024 * 1024
+UPDATE_RECORD_FILE = os.getenv("UPDATE_RECORD_FILE")
+
+# Runs before every other handler group.
+INGRESS_GROUP = -100
+
+
+class WebhookIngress:
+    def __init__(self, max_pending: int = WEBHOOK_MAX_PENDING):
+        self.max_pending = max_pending
+        self._app = None
+        self._loop = None
+        self._lock = threading.Lock()
+        self._received_at = {}        # update_id -> perf_counter() when accepted
+        self._latencies = deque(maxlen=1000)
+        self._stats = {
+            "accepted": 0,
+            "rejected_full": 0,
+            "rejected_secret": 0,
+            "bad_request": 0,
+            "max_pending": 0,
+        }
+
+    # ───── Lifecycle ─────
+
+    async def start(self, app):
+        if not WEBHOOK_URL:
+            raise RuntimeError("BOT_MODE=webhook needs WEBHOOK_URL (the public base URL)")
+        if not WEBHOOK_SECRET:
+            raise RuntimeError("BOT_MODE=webhook needs WEBHOOK_SECRET (the token Telegram sends back)")
+        self._app = app
+        self._loop = asyncio.get_running_loop()
+        app.add_handler(TypeHandler(Update, self._started), group=INGRESS_GROUP)
+        await app.bot.set_webhook(
+            f"{WEBHOOK_URL}{WEBHOOK_PATH}", secret_token=WEBHOOK_SECRET,
+            max_connections=WEBHOOK_MAX_CONNECTIONS, allowed_updates=Update.ALL_TYPES)
+        logger.info("🪝 Receiving updates at %s%s", WEBHOOK_URL, WEBHOOK_PATH)
+
+    def stop(self):
+        # The webhook stays registered: Telegram holds updates for us until
+        # the next start instead of dropping them.
+        self._loop = None
+        stats = self.stats()
+        logger.info("🪝 Webhook ingress: %d accepted, %d turned away (full), "
+                    "handler latency p50 %.1f ms / p99 %.1f ms",
+                    stats["accepted"], stats["rejected_full"],
+                    stats["handler_latency_p50"] * 1000, stats["handler_latency_p99"] * 1000)
+
+    # ───── Ingress (Flask threads) ─────
+
+    def submit(self, payload: dict) -> bool:
+        """Hand one decoded update to the event loop; False when full."""
+        loop = self._loop
+        if loop is None:
+            return False
+        update = Update.de_json(payload, self._app.bot)
+        with self._lock:
+            pending = len(self._received_at)
+            if pending >= self.max_pending:
+                self._stats["rejected_full"] += 1
+                return False
+            self._received_at[update.update_id] = time.perf_counter()
+            self._stats["accepted"] += 1
+            self._stats["max_pending"] = max(self._stats["max_pending"], pending + 1)
+        loop.call_soon_threadsafe(self._app.update_queue.put_nowait, update)
+        return True
+
+    def reject(self, reason: str):
+        """Count a request turned away before submit(): "rejected_secret" or "bad_request"."""
+        with self._lock:
+            self._stats[reason] += 1
+
+    async def _started(self, update: Update, context):
+        # First handler group: the update has left the queue and reached the
+        # handlers, so it no longer counts against max_pending.
+        with self._lock:
+            received = self._received_at.pop(update.update_id, None)
+        if received is not None:
+            self._latencies.append(time.perf_counter() - received)
+
+    # ───── Metrics ─────
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else 0.0
+
+        with self._lock:
+            pending = len(self._received_at)
+            stats = dict(self._stats)
+        return dict(stats, pending=pending,
+                    handler_latency_p50=pct(0.50), handler_latency_p99=pct(0.99))
+
+
+ingress = WebhookIngress()
+webhook_blueprint = Blueprint("telegram_webhook", __name__)
+
+
+@webhook_blueprint.route(WEBHOOK_PATH, methods=["POST"])
+def receive_update():
+    token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not WEBHOOK_SECRET or not hmac.compare_digest(token, WEBHOOK_SECRET):
+        ingress.reject("rejected_secret")
+        return "", 403
+    if (request.content_length or 0) > WEBHOOK_MAX_BODY:
+        ingress.reject("bad_request")
+        return "", 413
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or "update_id" not in payload:
+        ingress.reject("bad_request")
+        return "", 400
+    if not ingress.submit(payload):
+        return "", 503, {"Retry-After": "1"}
+    return "", 200
+
+
+async def run_webhook(app):
+    """Webhook-mode counterpart of app.run_polling(): the same hooks in the
+    same order, with updates fed by the Flask view instead of an Updater."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await app.initialize()
+    try:
+        if app.post_init:
+            await app.post_init(app)
+        await ingress.start(app)
+        await app.start()
+        await stop.wait()
+    finally:
+        ingress.stop()
+        if app.running:
+            await app.stop()
+            if app.post_stop:
+                await app.post_stop(app)
+        await app.shutdown()
+        if app.post_shutdown:
+            await app.post_shutdown(app)
+
+
+def record_updates(app, path: str = UPDATE_RECORD_FILE):
+    """Append every update `app` receives to `path` as one JSON line."""
+    if not path:
+        return
+    out = open(path, "a", buffering=1, encoding="utf-8")
+
+    async def record(update: Update, context):
+        out.write(json.dumps(update.to_dict(), ensure_ascii=False) + "\n")
+
+    app.add_handler(TypeHandler(Update, record), group=INGRESS_GROUP - 1)
+    logger.info("📼 Recording updates to %s", path)